@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+# Dimensões do cubo de acurácia (janela × ano × mesorregião × porte × classe real)
+DIMENSOES_CUBO = ["Janela", "Ano", "Mesorregião", "Porte", "y_real"]
+
+
+def construir_cubo_acuracia(df):
+    """
+    Agrega o histórico de previsões em células do cubo de acurácia.
+
+    Cada linha do resultado é uma combinação das `DIMENSOES_CUBO` presentes
+    nos dados, com o número de previsões (`n`) e de acertos (`acertos`).
+    """
+    return (
+        df.groupby(DIMENSOES_CUBO, observed=True, dropna=False)["acerto"]
+        .agg(n="size", acertos="sum")
+        .reset_index()
+    )
+
+
+def fatiar_cubo(cubo, **filtros):
+    """
+    Seleciona as células do cubo que satisfazem os filtros.
+
+    Cada filtro é `dimensao=valor` ou `dimensao=[valores]` (use o nome da
+    coluna com acento, via `**{"Mesorregião": [...]}`).
+    """
+    mascara = pd.Series(True, index=cubo.index)
+    for dimensao, valor in filtros.items():
+        if isinstance(valor, (list, tuple, set)):
+            mascara &= cubo[dimensao].isin(valor)
+        else:
+            mascara &= cubo[dimensao] == valor
+    return cubo[mascara]
+
+
+def acuracia(cubo, por=None):
+    """
+    Acurácia (acertos / n) das células, agregada pelas dimensões em `por`.
+
+    Sem `por`, retorna um único número (NaN se não houver previsões).
+    """
+    if por is None:
+        total = cubo["n"].sum()
+        return cubo["acertos"].sum() / total if total else float("nan")
+    agregado = cubo.groupby(por, observed=True)[["n", "acertos"]].sum().reset_index()
+    agregado["acerto"] = agregado["acertos"] / agregado["n"]
+    return agregado
+
+
+def construir_acuracia_municipios(df):
+    """
+    Acurácia de cada município no período: anos avaliados (`Anos`), acertos
+    (`Acertos`), `Acerto (%)` e o nome (`Municípios`), indexada pelo código
+    IBGE como texto (a mesma chave das features do GeoJSON). Anos sem a
+    classe real não entram na conta.
+    """
+    avaliados = df[df["y_real"].notna()]
+    por_municipio = avaliados.groupby("id", observed=True)["acerto"].agg(Acertos="sum", Anos="size")
+    por_municipio["Acerto (%)"] = por_municipio["Acertos"] / por_municipio["Anos"] * 100
+    if "Municípios" in df.columns:
+        nomes = df.drop_duplicates(subset=["id"]).set_index("id")["Municípios"].astype(str)
+        por_municipio["Municípios"] = nomes.reindex(por_municipio.index).to_numpy()
+    por_municipio.index = por_municipio.index.astype(str).rename("id")
+    return por_municipio
+
+
+def construir_histogramas(df, variaveis, n_bins=19, manter_outliers=False):
+    """
+    Calcula os histogramas A/B de todas as (ano, variável) de uma só vez.
+
+    Para cada ano, as variáveis são tratadas como colunas de uma matriz:
+    quartis, limites IQR (1,5 × IQR), mínimo/máximo e contagens por faixa
+    são calculados de forma vetorizada, reproduzindo `np.histogram` com
+    `np.linspace(min, max, n_bins + 1)` como bordas. Retorna um dict
+    {(ano, variavel): dados do histograma}, com None quando não há dados
+    suficientes (sem valores ou min == max).
+    """
+    variaveis = [v for v in variaveis if v in df.columns]
+    histogramas = {}
+    for ano, df_ano in df.groupby("Ano", observed=True, sort=False):
+        classe = df_ano["y_real"].to_numpy()
+        X = df_ano[variaveis].to_numpy(dtype=float)
+        validos = ~np.isnan(X) & pd.notna(classe)[:, None]
+        X_validos = np.where(validos, X, np.nan)
+
+        q1, q3 = np.nanquantile(X_validos, [0.25, 0.75], axis=0) if validos.any() else (np.full(len(variaveis), np.nan),) * 2
+        iqr = q3 - q1
+        inferior, superior = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        mascara = validos if manter_outliers else validos & (X >= inferior) & (X <= superior)
+
+        minimos = np.where(mascara, X, np.inf).min(axis=0)
+        maximos = np.where(mascara, X, -np.inf).max(axis=0)
+        utilizaveis = mascara.any(axis=0) & (minimos < maximos)
+
+        # Bordas por variável (mesmos valores de np.linspace escalar) e índice da faixa de cada valor
+        bordas = np.linspace(np.where(utilizaveis, minimos, 0.0), np.where(utilizaveis, maximos, 1.0), n_bins + 1, axis=1)
+        largura = bordas[:, -1] - bordas[:, 0]
+        indices = ((np.where(mascara, X, bordas[:, 0]) - bordas[:, 0]) * (n_bins / largura)).astype(int)
+        indices = np.clip(indices, 0, n_bins - 1)
+        colunas = np.broadcast_to(np.arange(len(variaveis)), X.shape)
+        # Correção de arredondamento, como no caminho uniforme do np.histogram
+        indices -= np.where(mascara, X, np.inf) < bordas[colunas, indices]
+        indices += (np.where(mascara, X, -np.inf) >= bordas[colunas, indices + 1]) & (indices != n_bins - 1)
+
+        celula = colunas * n_bins + indices
+        contagens = {}
+        for rotulo in ("A", "B"):
+            selecao = mascara & (classe == rotulo)[:, None]
+            contagens[rotulo] = np.bincount(celula[selecao], minlength=len(variaveis) * n_bins).reshape(len(variaveis), n_bins)
+
+        for j, variavel in enumerate(variaveis):
+            if not utilizaveis[j]:
+                histogramas[(ano, variavel)] = None
+                continue
+            histogramas[(ano, variavel)] = {
+                "bordas": bordas[j],
+                "centros": (bordas[j, :-1] + bordas[j, 1:]) / 2,
+                "hist_A": contagens["A"][j],
+                "hist_B": contagens["B"][j],
+                "limites_iqr": (inferior[j], superior[j]),
+                "min": minimos[j],
+                "max": maximos[j],
+            }
+    return histogramas
+
+
+def construir_matriz_classificacoes(df, anos):
+    """
+    Matriz município × ano das classificações, em códigos inteiros.
+
+    Retorna um dict com 'municipios' (nomes, em ordem alfabética), 'ids',
+    'anos', 'classes' e as matrizes int8 'previsto' e 'real' (índice da
+    classe em 'classes'; -1 quando não há dado). Montada uma vez por carga:
+    a seleção de linhas e os rótulos são feitos sobre os códigos.
+    """
+    anos = list(anos)
+    classes = sorted(set(df["y_previsto"].dropna().astype(str)) | set(df["y_real"].dropna().astype(str)))
+    df = df[df["Ano"].isin(anos)]
+    municipios = df.drop_duplicates(subset=["id"]).set_index("id")["Municípios"].astype(str)
+    municipios = municipios.sort_values(kind="stable")
+    linha = pd.Index(municipios.index).get_indexer(df["id"])
+    coluna = pd.Index(anos).get_indexer(df["Ano"])
+
+    matriz = {"municipios": municipios.to_numpy(), "ids": municipios.index.to_numpy(), "anos": anos, "classes": classes}
+    for chave, coluna_classe in (("previsto", "y_previsto"), ("real", "y_real")):
+        codigos = np.full((len(municipios), len(anos)), -1, dtype=np.int8)
+        codigos[linha, coluna] = pd.Categorical(df[coluna_classe].astype(str), categories=classes).codes
+        codigos.flags.writeable = False  # Compartilhada entre sessões
+        matriz[chave] = codigos
+    return matriz
+
+
+def tabela_classificacoes(matriz, municipios=None):
+    """
+    Tabela `Previsto (Real)` da matriz, uma linha por município e uma coluna
+    por ano, com um marcador de acerto (🟢) ou erro (🔴) e a fração de acertos.
+
+    `municipios` restringe as linhas (None = todos). Os rótulos saem de uma
+    tabela pequena indexada pelo código combinado (previsto, real), sem laços
+    por célula nem Styler.
+    """
+    classes = [str(c) for c in matriz["classes"]]
+    rotulos_classe = ["-", *classes]  # Código -1 (sem dado) vira "-"
+    k = len(rotulos_classe)
+    rotulos = np.array([
+        "-" if previsto == 0 and real == 0 else
+        f"{'🟢 ' if previsto == real else '🔴 ' if previsto and real else ''}{rotulos_classe[previsto]} ({rotulos_classe[real]})"
+        for previsto in range(k) for real in range(k)
+    ], dtype=object)
+
+    # Index.isin usa hash; np.isin em arrays de objetos compara par a par
+    selecao = slice(None) if municipios is None else np.flatnonzero(pd.Index(matriz["municipios"]).isin(list(municipios)))
+    previsto, real = matriz["previsto"][selecao], matriz["real"][selecao]
+    codigos = (previsto.astype(np.intp) + 1) * k + (real + 1)
+    tabela = pd.DataFrame(rotulos[codigos], index=pd.Index(matriz["municipios"][selecao], name="Municípios"),
+                          columns=[str(ano) for ano in matriz["anos"]])
+    avaliados = ((previsto >= 0) & (real >= 0)).sum(axis=1)
+    acertos = ((previsto == real) & (real >= 0)).sum(axis=1)
+    tabela["Acerto"] = np.divide(acertos, avaliados, out=np.full(len(acertos), np.nan), where=avaliados > 0)
+    return tabela
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# pyarrow é opcional: sem ele os dados são lidos diretamente das planilhas
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+PASTA_CACHE = ".cache_dados"  # Pasta dos dados compilados (não versionada)
+NOME_MANIFESTO = "manifesto.json"
+
+
+def _hash_arquivo(caminho):
+    """Calcula o SHA-256 do conteúdo de um arquivo."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _caminho_particao(nome, particao):
+    """Monta o caminho Parquet de uma partição no formato `coluna=valor`."""
+    partes = [f"{coluna}={valor}" for coluna, valor in particao]
+    return os.path.join(PASTA_CACHE, nome, *partes, "parte.parquet")
+
+
+def _ler_manifesto(nome):
+    caminho = os.path.join(PASTA_CACHE, nome, NOME_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_manifesto(nome, manifesto):
+    caminho = os.path.join(PASTA_CACHE, nome, NOME_MANIFESTO)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=1, ensure_ascii=False)
+    os.replace(temporario, caminho)  # Troca atômica, seguro com vários workers
+
+
+def _gravar_parquet(df, destino):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporario)
+    os.replace(temporario, destino)
+
+
+def sincronizar_store(nome, fontes, ler_fonte):
+    """
+    Garante que cada partição Parquet do store `nome` esteja atualizada.
+
+    `fontes` é um dict {particao: caminho_da_planilha}, onde `particao` é uma
+    tupla de pares (coluna, valor). Uma partição só é recompilada quando o
+    mtime/tamanho da planilha mudou *e* o hash do conteúdo é diferente do
+    registrado no manifesto. Retorna a lista de (caminho, exceção) das fontes
+    que não puderam ser lidas.
+    """
+    manifesto = _ler_manifesto(nome)
+    erros = []
+    alterado = False
+
+    for particao, caminho_fonte in fontes.items():
+        destino = _caminho_particao(nome, particao)
+        chave = os.path.relpath(destino, os.path.join(PASTA_CACHE, nome))
+        try:
+            info = os.stat(caminho_fonte)
+        except OSError as e:
+            erros.append((caminho_fonte, e))
+            continue
+
+        entrada = manifesto.get(chave)
+        if (entrada and os.path.exists(destino)
+                and entrada.get("mtime_ns") == info.st_mtime_ns
+                and entrada.get("tamanho") == info.st_size):
+            continue  # Nada mudou desde a última compilação
+
+        try:
+            hash_fonte = _hash_arquivo(caminho_fonte)
+            if not (entrada and os.path.exists(destino) and entrada.get("sha256") == hash_fonte):
+                _gravar_parquet(ler_fonte(caminho_fonte, dict(particao)), destino)
+        except Exception as e:
+            erros.append((caminho_fonte, e))
+            continue
+
+        manifesto[chave] = {
+            "fonte": caminho_fonte,
+            "mtime_ns": info.st_mtime_ns,
+            "tamanho": info.st_size,
+            "sha256": hash_fonte,
+        }
+        alterado = True
+
+    if alterado:
+        _gravar_manifesto(nome, manifesto)
+    return erros
+
+
+def _ler_particao(nome, particao, caminho_fonte, ler_fonte):
+    """Lê uma partição do store; se o arquivo estiver corrompido ou truncado, recompila-o da fonte."""
+    destino = _caminho_particao(nome, particao)
+    try:
+        return pq.read_table(destino)
+    except (OSError, pa.ArrowException):
+        _gravar_parquet(ler_fonte(caminho_fonte, dict(particao)), destino)
+        return pq.read_table(destino)
+
+
+def carregar_store(nome, fontes, ler_fonte):
+    """
+    Lê as partições pedidas do store `nome`, compilando-as antes se preciso.
+
+    Uma partição ilegível é recompilada da sua planilha; se o pyarrow não
+    estiver instalado ou a pasta de cache não puder ser usada, lê diretamente
+    as planilhas com `ler_fonte`. Retorna a tupla (DataFrame, erros).
+    """
+    if PYARROW_DISPONIVEL:
+        try:
+            erros = sincronizar_store(nome, fontes, ler_fonte)
+            fontes_com_erro = {caminho for caminho, _ in erros}
+            tabelas = [
+                _ler_particao(nome, particao, caminho, ler_fonte)
+                for particao, caminho in fontes.items()
+                if caminho not in fontes_com_erro
+            ]
+            if not tabelas:
+                return pd.DataFrame(), erros
+            return pa.concat_tables(tabelas, promote_options="default").to_pandas(), erros
+        except (OSError, pa.ArrowException) as e:
+            # Importado aqui: instrumentacao usa PASTA_CACHE deste módulo
+            from instrumentacao import registrar_aviso
+            registrar_aviso("store_indisponivel", store=nome, erro=str(e), acao="lendo planilhas diretamente")
+
+    dfs, erros = [], []
+    for particao, caminho in fontes.items():
+        try:
+            dfs.append(ler_fonte(caminho, dict(particao)))
+        except Exception as e:
+            erros.append((caminho, e))
+    if not dfs:
+        return pd.DataFrame(), erros
+    return pd.concat(dfs, ignore_index=True), erros
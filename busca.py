@@ -0,0 +1,182 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+from instrumentacao import medir
+
+# Busca de municípios por nome ou código IBGE, sem depender de acentos,
+# maiúsculas ou pontuação ("sao joao del rei", "SÃO JOÃO", "3162500"). O
+# índice é montado uma vez (ver `dados.carregar_indice_busca`) e consultado a
+# cada tecla; a ordem dos resultados é:
+#   0. nome ou código igual à consulta;
+#   1. nome ou código começando pela consulta;
+#   2. alguma palavra do nome começando pela consulta ("rei" -> "São João del-Rei");
+#   3. nomes parecidos, por trigramas (tolera erros de digitação: "joao monlevad").
+# Dentro de cada faixa, nomes mais curtos primeiro e depois em ordem alfabética.
+LIMITE_RESULTADOS = 50
+SIMILARIDADE_MINIMA = 0.45  # Coeficiente de Dice mínimo entre os trigramas da consulta e do nome
+ORDEM_PORTES = ["Metrópole", "Grande Porte", "Médio Porte", "Pequeno Porte II", "Pequeno Porte I"]
+_FIM_PREFIXO = "\x7f"  # Maior que qualquer caractere de um texto normalizado
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só letras/dígitos separados por espaço ("São João del-Rei" -> "sao joao del rei")."""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", sem_acentos.lower()))
+
+
+def trigramas(texto):
+    """Trigramas de um texto normalizado, com as bordas das palavras marcadas por espaço."""
+    marcado = f"  {texto} "
+    return {marcado[i:i + 3] for i in range(len(marcado) - 2)}
+
+
+def _sem_uf(nome):
+    """Tira o sufixo da UF dos nomes ("Abaeté - MG" -> "Abaeté")."""
+    return re.sub(r"\s+-\s+[A-Z]{2}$", "", str(nome))
+
+
+class IndiceBusca:
+    """
+    Índice de busca de municípios por nome e código IBGE.
+
+    `municipios` são os nomes como aparecem nas páginas; `codigos`, os
+    códigos IBGE na mesma ordem (7 dígitos; o de 6, sem o verificador,
+    também é aceito na busca); `grupos` mapeia uma dimensão ("Mesorregião",
+    "Porte") para os valores de cada município, para seleção em bloco.
+    """
+
+    def __init__(self, municipios, codigos=None, grupos=None):
+        self.nomes = [str(m) for m in municipios]
+        normalizados = [normalizar(_sem_uf(m)) for m in self.nomes]
+        self._tamanhos = np.array([len(n) for n in normalizados])
+
+        # Prefixos: termos ordenados (nome, código e o nome a partir de cada palavra), com a faixa do acerto
+        termos = []
+        for posicao, nome in enumerate(normalizados):
+            palavras = nome.split()
+            termos.append((nome, 1, posicao))
+            termos.extend((" ".join(palavras[i:]), 2, posicao) for i in range(1, len(palavras)))
+        for posicao, codigo in enumerate(codigos if codigos is not None else []):
+            if codigo is not None and str(codigo).isdigit():
+                termos.append((str(codigo), 1, posicao))
+                termos.append((str(codigo)[:6], 1, posicao))
+        termos.sort()
+        self._termos = termos
+        self._chaves = [t[0] for t in termos]
+        self._exatos = {}
+        for termo, faixa, posicao in termos:
+            if faixa == 1:
+                self._exatos.setdefault(termo, []).append(posicao)
+
+        # Trigramas: lista de municípios de cada trigrama (arrays para somar com bincount)
+        listas = {}
+        for posicao, nome in enumerate(normalizados):
+            for trigrama in trigramas(nome):
+                listas.setdefault(trigrama, []).append(posicao)
+        self._trigramas = {t: np.array(p, dtype=np.int32) for t, p in listas.items()}
+        self._n_trigramas = np.array([len(trigramas(n)) for n in normalizados])
+
+        self.grupos = {}
+        for dimensao, valores in (grupos or {}).items():
+            membros = {}
+            for nome, valor in zip(self.nomes, valores):
+                if valor is not None and valor == valor:  # Ignora ausentes (None/NaN)
+                    membros.setdefault(str(valor), []).append(nome)
+            self.grupos[dimensao] = {valor: sorted(nomes) for valor, nomes in membros.items()}
+
+    def buscar(self, consulta, limite=LIMITE_RESULTADOS, permitidos=None):
+        """
+        Nomes dos municípios que casam com `consulta`, do melhor para o pior
+        (no máximo `limite`). `permitidos` restringe aos nomes do conjunto.
+        """
+        q = normalizar(consulta)
+        if not q:
+            return []
+        faixas = {}
+        for posicao in self._exatos.get(q, []):
+            faixas[posicao] = 0
+        inicio = bisect.bisect_left(self._chaves, q)
+        fim = bisect.bisect_left(self._chaves, q + _FIM_PREFIXO, lo=inicio)
+        for _, faixa, posicao in self._termos[inicio:fim]:
+            if faixa < faixas.get(posicao, 4):
+                faixas[posicao] = faixa
+
+        similaridades = {}
+        if len(q) >= 3 and not q.isdigit():
+            da_consulta = [self._trigramas[t] for t in trigramas(q) if t in self._trigramas]
+            if da_consulta:
+                comuns = np.bincount(np.concatenate(da_consulta), minlength=len(self.nomes))
+                dice = 2 * comuns / (len(trigramas(q)) + self._n_trigramas)
+                for posicao in np.flatnonzero(dice >= SIMILARIDADE_MINIMA):
+                    if int(posicao) not in faixas:
+                        faixas[int(posicao)] = 3
+                        similaridades[int(posicao)] = dice[posicao]
+
+        ordem = sorted(faixas, key=lambda p: (faixas[p], -similaridades.get(p, 0), self._tamanhos[p], self.nomes[p]))
+        nomes = (self.nomes[p] for p in ordem)
+        if permitidos is not None:
+            nomes = (n for n in nomes if n in permitidos)
+        resultado = []
+        for nome in nomes:
+            resultado.append(nome)
+            if len(resultado) == limite:
+                break
+        return resultado
+
+    def opcoes_grupos(self):
+        """Pares (dimensão, valor) dos grupos, na ordem de exibição."""
+        opcoes = []
+        for dimensao, membros in self.grupos.items():
+            chave = (lambda v: (ORDEM_PORTES.index(v) if v in ORDEM_PORTES else len(ORDEM_PORTES), v)) if dimensao == "Porte" else str
+            opcoes.extend((dimensao, valor) for valor in sorted(membros, key=chave))
+        return opcoes
+
+    def selecionar(self, dimensao, valor):
+        """Nomes dos municípios de um grupo (ex.: `selecionar("Mesorregião", "Zona da Mata")`)."""
+        return list(self.grupos.get(dimensao, {}).get(valor, []))
+
+
+def seletor_municipios(indice, rotulo, disponiveis, chave, padrao=None, ajuda=None):
+    """
+    Multiselect de municípios com busca (nome sem acentos ou código IBGE) e
+    seleção de uma mesorregião ou porte inteiro em uma ação. Só oferece os
+    nomes de `disponiveis`; retorna a lista selecionada (estado em `chave`).
+    """
+    import streamlit as st
+
+    permitidos = set(disponiveis)
+    chave_busca, chave_grupo = f"{chave}_busca", f"{chave}_grupo"
+    if chave not in st.session_state:
+        st.session_state[chave] = [m for m in (padrao or []) if m in permitidos]
+
+    def adicionar_grupo():
+        grupo = st.session_state[chave_grupo]
+        if grupo is not None:
+            novos = [m for m in indice.selecionar(*grupo) if m in permitidos]
+            st.session_state[chave] = list(dict.fromkeys([*st.session_state[chave], *novos]))
+            st.session_state[chave_grupo] = None
+
+    col_busca, col_grupo = st.columns([2, 1])
+    with col_busca:
+        consulta = st.text_input("Buscar por nome ou código IBGE:", key=chave_busca,
+                                 placeholder="ex.: sao joao del rei, 3162500",
+                                 help="Sem diferença entre acentos e maiúsculas; tolera erros de digitação.")
+    with col_grupo:
+        st.selectbox("Adicionar todos de:", options=[None, *indice.opcoes_grupos()], key=chave_grupo,
+                     format_func=lambda g: "—" if g is None else f"{g[0]}: {g[1]}", on_change=adicionar_grupo)
+
+    selecionados = [m for m in st.session_state[chave] if m in permitidos]
+    if consulta.strip():
+        with medir("busca_municipios"):
+            encontrados = indice.buscar(consulta, permitidos=permitidos)
+        if not encontrados:
+            st.caption(f"Nenhum município encontrado para “{consulta}”.")
+        opcoes = list(dict.fromkeys([*selecionados, *encontrados]))
+    else:
+        opcoes = list(disponiveis)
+    st.session_state[chave] = selecionados
+    return st.multiselect(rotulo, options=opcoes, key=chave, help=ajuda)
@@ -0,0 +1,612 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from agregacoes import (DIMENSOES_CUBO, construir_acuracia_municipios, construir_cubo_acuracia, construir_histogramas,
+                        construir_matriz_classificacoes)
+from armazenamento import PASTA_CACHE, carregar_store
+from busca import IndiceBusca
+from indices import construir_indice
+from instrumentacao import instrumentar_carregador, registrar_aviso, registrar_falta_cache
+from geometria import (TOLERANCIAS_MAPA, TOLERANCIA_MAPA_PADRAO, compactar_geometrias,
+                       geojson_de_compactado, simplificar_geojson, tolerancia_para_zoom)
+from tardio import importar_tardio
+
+gpd = importar_tardio("geopandas")  # Só é usado para ler os GeoJSON quando o cache em disco falta
+
+try:
+    from extra import mesoregiao
+except ImportError:
+    # Fallback: lê a planilha diretamente, sem os nomes das mesorregiões
+    def mesoregiao():
+        return pd.read_excel("Mesorregiao.xlsx")
+
+try:
+    from extra import variaveis
+except ImportError:
+    variaveis = []
+
+# --- Constantes compartilhadas entre as páginas ---
+ANOS_INT = [17, 18, 19, 20, 21, 22]
+PASTA_RESULTADOS = "resultados"
+PREFIXOS_JANELA = {"janela_fixa": "", "janela_extendida": "ext_"}
+# Explicações do modelo de referência refeito (ver explicacoes.py): ficam fora de resultados/
+PASTA_EXPLICACOES = os.path.join(PASTA_CACHE, "explicacoes_referencia")
+GEOJSON_PATH = "pages/MG_Mesorregioes_Contorno.geojson"
+GEOJSON_MUNICIPIOS_PATH = "pages/MG_Municipios.geojson"  # Malha municipal do IBGE (853 municípios)
+COLUNAS_ID_MUNICIPIO = ['CD_MUN', 'CD_GEOCMU', 'id']  # Código IBGE de 7 dígitos, conforme a versão da malha
+COLUNAS_MESO = ['v21', 'Municípios', 'Mesorregião', 'id']
+ARQUIVO_MESORREGIAO = "Mesorregiao.xlsx"
+ARQUIVO_POPULACAO = "Mesorregiao_com_populacao.xlsx"
+PADRAO_RECEITAS = "receitas_anuais_dca_*.xlsx"  # Um arquivo DCA por ano
+TIPOS_RECEITA = ['IPTU', 'ISSQN', 'ITBI', 'FPM', 'ICMS (Cota-Parte)', 'IPVA (Cota-Parte)']
+
+# Os dados ficam em `st.cache_resource`: uma única cópia por processo,
+# compartilhada por todas as páginas e sessões. As funções públicas entregam
+# visões rasas (`copy(deep=False)`), que não duplicam os dados; as páginas
+# podem criar ou substituir colunas, mas não devem alterar valores in-place.
+# Cada função cacheada recebe a `versao` (mtime/tamanho) das planilhas de
+# origem: quando um arquivo muda, a próxima chamada monta uma nova cópia.
+
+
+def _visao(obj):
+    """Entrega uma visão rasa do objeto compartilhado (sem copiar os dados)."""
+    return None if obj is None else obj.copy(deep=False)
+
+
+# Esquema dos resultados em memória: tipos compactos em vez de objetos Python
+COLUNAS_CATEGORICAS = ['Janela', 'Municípios', 'Mesorregião', 'Porte', 'y_real', 'y_previsto']
+
+
+def _codigo(serie):
+    """Códigos numéricos (IBGE, v21) no menor inteiro que os comporta (ex.: int32, int8)."""
+    return pd.to_numeric(serie, errors="coerce", downcast="integer")
+
+
+def tipar_resultados(df):
+    """
+    Aplica o esquema tipado aos resultados (in-place) e retorna o DataFrame.
+
+    'Ano' inteiro (ex.: 2022), 'id' e 'v21' inteiros compactos, textos
+    repetidos (município, mesorregião, classes, janela) como `category`,
+    indicadores numéricos em float32 e 'acerto' booleano.
+    """
+    if "Ano" in df.columns: df["Ano"] = df["Ano"].astype("int16")
+    if "id" in df.columns: df["id"] = _codigo(df["id"])
+    if "v21" in df.columns: df["v21"] = _codigo(df["v21"])
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns: df[coluna] = df[coluna].astype("category")
+    for coluna in df.columns:
+        if pd.api.types.is_float_dtype(df[coluna]) and df[coluna].dtype != "float32":
+            df[coluna] = df[coluna].astype("float32")
+    if "acerto" in df.columns: df["acerto"] = df["acerto"].astype(bool)
+    return df
+
+
+def assinatura_arquivos(*caminhos):
+    """(caminho, mtime, tamanho) de cada arquivo; identifica a versão dos dados."""
+    assinatura = []
+    for caminho in caminhos:
+        info = os.stat(caminho) if os.path.exists(caminho) else None
+        assinatura.append((caminho, info.st_mtime_ns if info else None, info.st_size if info else None))
+    return tuple(assinatura)
+
+
+def versao_resultados(anos, janela="janela_fixa"):
+    """Versão das planilhas de resultados de uma janela."""
+    return assinatura_arquivos(*(caminho_resultado(janela, ano) for ano in anos))
+
+
+def versao_referencias():
+    """Versão das planilhas de referência (mesorregiões e população)."""
+    return assinatura_arquivos(ARQUIVO_MESORREGIAO, ARQUIVO_POPULACAO)
+
+
+def caminho_resultado(janela, ano):
+    """Caminho da planilha `resultado_final` de uma janela e ano (ex.: 22)."""
+    prefixo = PREFIXOS_JANELA[janela]
+    return os.path.join(PASTA_RESULTADOS, janela, str(ano), f"{prefixo}resultado_final{ano}.xlsx")
+
+
+def _ler_resultado_final(caminho, particao):
+    """Lê uma planilha de resultados, anotando janela e ano da partição."""
+    df = pd.read_excel(caminho)
+    df["Janela"] = particao["janela"]
+    df["Ano"] = particao["ano"]
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _resultados_compartilhados(anos, janela, versao):
+    """
+    Carrega e concatena os resultados de todos os anos de uma janela.
+
+    Os dados vêm do store Parquet compilado a partir de `resultados/` (ver
+    `armazenamento.py`); as planilhas só são relidas quando mudam.
+    """
+    registrar_falta_cache("carregar_resultados", janela=janela)
+    fontes = {}
+    for ano in anos:
+        caminho = caminho_resultado(janela, ano)
+        if os.path.exists(caminho):
+            fontes[(("janela", janela), ("ano", 2000 + ano))] = caminho
+        else:
+            st.warning(f"Arquivo não encontrado para 20{ano}: {caminho}")
+
+    df, erros = carregar_store("resultados", fontes, _ler_resultado_final)
+    for caminho, e in erros:
+        st.warning(f"Erro ao carregar dados de {caminho}: {e}")
+    if df.empty:
+        return df
+
+    df["acerto"] = df["y_real"] == df["y_previsto"]
+    return tipar_resultados(df)
+
+
+@instrumentar_carregador("carregar_resultados")
+def carregar_resultados(anos, janela="janela_fixa"):
+    """Resultados (`resultado_final*.xlsx`) de uma janela, como visão somente leitura."""
+    anos = tuple(anos)
+    return _visao(_resultados_compartilhados(anos, janela, versao_resultados(anos, janela)))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _mesorregioes_compartilhadas(versao):
+    """Carrega e prepara os dados de mesorregião (de 'extra' ou fallback)."""
+    registrar_falta_cache("carregar_mesorregioes")
+    try:
+        df_meso = mesoregiao()
+    except Exception as e:
+        st.error(f"Erro ao executar a função mesoregiao(): {e}")
+        return pd.DataFrame(columns=COLUNAS_MESO)
+
+    # Garante que as colunas 'id' e 'v21' sejam códigos inteiros, como nos resultados
+    if 'id' in df_meso.columns:
+        df_meso['id'] = _codigo(df_meso['id'])
+    else:
+        st.error("Coluna 'id' não encontrada nos dados de mesoregião.")
+        df_meso['id'] = None
+
+    if 'v21' in df_meso.columns:
+        df_meso['v21'] = _codigo(df_meso['v21'])
+    elif df_meso['id'].notna().any():
+        st.warning("Coluna 'v21' não encontrada nos dados de mesoregião. Usando 'id' como substituto para 'v21'.")
+        df_meso['v21'] = df_meso['id']
+    else:
+        st.error("Colunas 'v21' e 'id' não encontradas nos dados de mesoregião.")
+        df_meso['v21'] = None
+
+    if 'Municípios' not in df_meso.columns:
+        st.error("Coluna 'Municípios' não encontrada nos dados de mesoregião.")
+        df_meso['Municípios'] = "Nome Indisponível"
+    if 'Mesorregião' not in df_meso.columns:
+        st.warning("Coluna 'Mesorregião' não encontrada nos dados de mesoregião.")
+        df_meso['Mesorregião'] = "Mesorregião Indisponível"
+    return df_meso
+
+
+@instrumentar_carregador("carregar_mesorregioes")
+def carregar_mesorregioes():
+    """Municípios com código IBGE ('id'), 'v21' e nome da mesorregião."""
+    return _visao(_mesorregioes_compartilhadas(versao_referencias()))
+
+
+@st.cache_resource(show_spinner=False)
+def _geojson_compartilhado(path):
+    """Carrega o arquivo GeoJSON das mesorregiões."""
+    registrar_falta_cache("carregar_geojson", path=path)
+    if not os.path.exists(path): st.error(f"Arquivo GeoJSON não encontrado: {path}"); return None
+    try: return gpd.read_file(path)
+    except Exception as e: st.error(f"Erro ao carregar GeoJSON: {e}"); return None
+
+
+@instrumentar_carregador("carregar_geojson")
+def carregar_geojson(path=GEOJSON_PATH):
+    """GeoDataFrame das mesorregiões de MG (ou None se indisponível)."""
+    return _visao(_geojson_compartilhado(path))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _populacao_compartilhada(versao):
+    """Carrega população e classificação de porte por município (código IBGE)."""
+    registrar_falta_cache("carregar_populacao")
+    if not os.path.exists(ARQUIVO_POPULACAO):
+        st.warning(f"Arquivo de classificação '{ARQUIVO_POPULACAO}' não encontrado. Porte dos municípios indisponível.")
+        return pd.DataFrame(columns=['id', 'Populacao', 'Classificação do Município'])
+    df_pop = pd.read_excel(ARQUIVO_POPULACAO)
+    df_pop['id'] = _codigo(df_pop['IBGE'])
+    return df_pop[['id', 'Populacao', 'Classificação do Município']].drop_duplicates(subset=['id'])
+
+
+@instrumentar_carregador("carregar_populacao")
+def carregar_populacao():
+    """População ('Populacao') e porte ('Classificação do Município') por 'id' IBGE."""
+    return _visao(_populacao_compartilhada(versao_referencias()))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_busca_compartilhado(versao):
+    """Índice de busca dos municípios (nome e código IBGE), com mesorregião e porte para seleção em bloco."""
+    registrar_falta_cache("carregar_indice_busca")
+    df_meso = _mesorregioes_compartilhadas(versao).drop_duplicates(subset=['Municípios'])
+    porte_por_id = _populacao_compartilhada(versao).set_index('id')['Classificação do Município']
+    return IndiceBusca(
+        df_meso['Municípios'],
+        codigos=[None if pd.isna(c) else str(int(c)) for c in df_meso['id']],
+        grupos={"Mesorregião": df_meso['Mesorregião'], "Porte": df_meso['id'].map(porte_por_id)},
+    )
+
+
+@instrumentar_carregador("carregar_indice_busca")
+def carregar_indice_busca():
+    """`busca.IndiceBusca` dos municípios, compartilhado por todas as páginas e sessões (não alterar)."""
+    return _indice_busca_compartilhado(versao_referencias())
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _enriquecidos_compartilhados(anos, janela, versao):
+    """
+    Resultados de uma janela prontos para análise, montados uma vez por versão dos dados.
+
+    Acrescenta aos resultados o nome da mesorregião (via 'v21'), o nome do
+    município (se ausente) e o porte ('Porte', via 'id'); a coluna 'Janela'
+    já vem do store.
+    """
+    registrar_falta_cache("carregar_resultados_enriquecidos", janela=janela)
+    versao_res, versao_ref = versao
+    df = _resultados_compartilhados(anos, janela, versao_res)
+    df_meso = _mesorregioes_compartilhadas(versao_ref)
+    if df.empty:
+        return df
+    df = df.copy(deep=False)
+
+    if 'v21' in df.columns and not df_meso.empty:
+        meso_por_v21 = df_meso.drop_duplicates(subset=['v21']).set_index('v21')['Mesorregião']
+        df['Mesorregião'] = df['v21'].map(meso_por_v21)
+    if 'Mesorregião' not in df.columns:
+        df['Mesorregião'] = 'Desconhecida'
+    df['Mesorregião'] = df['Mesorregião'].fillna('Desconhecida')
+
+    if 'Municípios' not in df.columns:
+        if 'id' in df.columns and not df_meso.empty:
+            municipio_por_id = df_meso.drop_duplicates(subset=['id']).set_index('id')['Municípios']
+            df['Municípios'] = df['id'].map(municipio_por_id).fillna('Desconhecido')
+        else:
+            df['Municípios'] = 'Desconhecido'
+
+    porte_por_id = _populacao_compartilhada(versao_ref).set_index('id')['Classificação do Município']
+    df['Porte'] = df['id'].map(porte_por_id).fillna('Não Classificado') if 'id' in df.columns else 'Não Classificado'
+    return tipar_resultados(df)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _indice_compartilhado(anos, janela, versao):
+    """Índices de fatias (ano, mesorregião, município) dos resultados enriquecidos."""
+    registrar_falta_cache("carregar_indice_resultados", janela=janela)
+    return construir_indice(_enriquecidos_compartilhados(anos, janela, versao))
+
+
+@instrumentar_carregador("carregar_indice_resultados")
+def carregar_indice_resultados(anos, janela="janela_fixa"):
+    """
+    Índice dos resultados enriquecidos por 'Ano', 'Mesorregião' e 'Municípios'.
+
+    Use com `indices.fatiar(indice, coluna, valores)`: cada fatia copia só as
+    linhas pedidas da tabela compartilhada (`indice["dados"]`, que não deve
+    ser alterada in-place).
+    """
+    anos = tuple(anos)
+    return _indice_compartilhado(anos, janela, _versao_enriquecidos(anos, janela))
+
+
+def caminho_explicacoes(janela, ano, pasta=PASTA_EXPLICACOES):
+    """Caminho da planilha `explicacoes` (ver explicacoes.py) de uma janela e ano."""
+    prefixo = PREFIXOS_JANELA[janela]
+    return os.path.join(pasta, janela, str(ano), f"{prefixo}explicacoes{ano}.xlsx")
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _explicacoes_compartilhadas(anos, janela, versao):
+    """Contribuições por variável de todas as previsões de uma janela, indexadas por ('Ano', 'id')."""
+    registrar_falta_cache("carregar_explicacoes", janela=janela)
+    fontes = {(("janela", janela), ("ano", 2000 + ano)): caminho_explicacoes(janela, ano)
+              for ano in anos if os.path.exists(caminho_explicacoes(janela, ano))}
+    df, erros = carregar_store("explicacoes", fontes, _ler_resultado_final)
+    for caminho, e in erros:
+        st.warning(f"Erro ao carregar explicações de {caminho}: {e}")
+    if df.empty:
+        return df
+    return tipar_resultados(df).set_index(["Ano", "id"]).sort_index()
+
+
+@instrumentar_carregador("carregar_explicacoes")
+def carregar_explicacoes(anos, janela="janela_fixa"):
+    """
+    Explicações das previsões pelo modelo de referência (`explicacoes*.xlsx`
+    em `PASTA_EXPLICACOES`), indexadas por ('Ano', 'id'); vazio se ainda não
+    foram geradas (`python explicacoes.py`).
+    """
+    anos = tuple(anos)
+    versao = assinatura_arquivos(*(caminho_explicacoes(janela, ano) for ano in anos))
+    return _visao(_explicacoes_compartilhadas(anos, janela, versao))
+
+
+def _ler_receitas_dca(caminho, particao):
+    """Lê um arquivo DCA anual e o converte para o formato longo (IBGE, Ano, Tipo_Receita, Valor)."""
+    df = pd.read_excel(caminho)
+    if 'IBGE' not in df.columns:
+        raise ValueError("arquivo sem a coluna 'IBGE'")
+    if 'Ano' not in df.columns:
+        df['Ano'] = particao['ano']
+    tipos = [tipo for tipo in TIPOS_RECEITA if tipo in df.columns]
+    if not tipos:
+        raise ValueError("nenhuma coluna de receita esperada (IPTU, ISSQN, etc.)")
+    return df[['IBGE', 'Ano'] + tipos].melt(id_vars=['IBGE', 'Ano'], var_name='Tipo_Receita', value_name='Valor')
+
+
+def _fontes_receitas():
+    """{(("ano", ano),): caminho} dos arquivos DCA, com o ano tirado do nome do arquivo."""
+    fontes = {}
+    for caminho in sorted(glob.glob(PADRAO_RECEITAS)):
+        ano = os.path.splitext(os.path.basename(caminho))[0].split('_')[-1]
+        if ano.isdigit():
+            fontes[(("ano", int(ano)),)] = caminho
+        else:
+            st.warning(f"Não foi possível determinar o ano para o arquivo {os.path.basename(caminho)}. Pulando este arquivo.")
+    return fontes
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _painel_receitas_compartilhado(versao):
+    """
+    Painel de receitas (município × ano × tipo de receita) indexado por município.
+
+    Cada arquivo DCA vira uma partição do store Parquet 'receitas'; um novo
+    ano só compila o arquivo novo. O painel já vem com o nome do município e
+    ordenado por município, tipo de receita e ano, na ordem usada pelos gráficos.
+    """
+    registrar_falta_cache("carregar_painel_receitas")
+    _, versao_ref = versao  # A versão dos arquivos DCA só entra na chave do cache
+    df, erros = carregar_store("receitas", _fontes_receitas(), _ler_receitas_dca)
+    for caminho, e in erros:
+        st.error(f"Erro ao carregar o arquivo de receita {os.path.basename(caminho)}: {e}")
+    if df.empty:
+        return construir_indice(pd.DataFrame(columns=['IBGE', 'Ano', 'Nome_Municipio', 'Tipo_Receita', 'Valor']), ['Nome_Municipio'])
+
+    df['IBGE'] = _codigo(df['IBGE'])
+    df['Ano'] = df['Ano'].astype('int16')
+    df_meso = _mesorregioes_compartilhadas(versao_ref)
+    nomes = df_meso.drop_duplicates(subset=['id']).set_index('id')['Municípios'] if not df_meso.empty else pd.Series(dtype=object)
+    df['Nome_Municipio'] = df['IBGE'].map(nomes).fillna(df['IBGE'].astype(str)).astype('category')
+    df['Tipo_Receita'] = pd.Categorical(df['Tipo_Receita'], categories=[t for t in TIPOS_RECEITA if t in set(df['Tipo_Receita'])])
+    df = df.sort_values(['Nome_Municipio', 'Tipo_Receita', 'Ano'], ignore_index=True)
+    return construir_indice(df[['IBGE', 'Ano', 'Nome_Municipio', 'Tipo_Receita', 'Valor']], ['Nome_Municipio'])
+
+
+@instrumentar_carregador("carregar_painel_receitas")
+def carregar_painel_receitas():
+    """
+    Índice do painel de receitas por 'Nome_Municipio' (colunas IBGE, Ano,
+    Nome_Municipio, Tipo_Receita, Valor).
+
+    Use com `indices.fatiar`; a tabela do índice (`["dados"]`) é compartilhada
+    e não deve ser alterada in-place.
+    """
+    versao_fontes = assinatura_arquivos(*sorted(glob.glob(PADRAO_RECEITAS)))
+    return _painel_receitas_compartilhado((versao_fontes, versao_referencias()))
+
+
+def relatorio_memoria(anos=ANOS_INT):
+    """
+    Linhas, colunas e memória (MB, contando strings) de cada conjunto compartilhado.
+
+    Usa os mesmos caches das páginas, então não recarrega nada que já esteja em memória.
+    """
+    conjuntos = {
+        f"resultados ({janela})": carregar_resultados(anos, janela) for janela in PREFIXOS_JANELA
+    }
+    conjuntos.update({
+        "resultados enriquecidos (janela_fixa)": carregar_resultados_enriquecidos(anos),
+        "mesorregiões": carregar_mesorregioes(),
+        "população": carregar_populacao(),
+        "cubo de acurácia": carregar_cubo_acuracia(anos),
+        "painel de receitas": carregar_painel_receitas()['dados'],
+    })
+    return pd.DataFrame([
+        {"Conjunto": nome, "Linhas": len(df), "Colunas": df.shape[1],
+         "Memória (MB)": df.memory_usage(deep=True).sum() / 2**20}
+        for nome, df in conjuntos.items()
+    ])
+
+
+def _versao_enriquecidos(anos, janela):
+    return versao_resultados(anos, janela), versao_referencias()
+
+
+@instrumentar_carregador("carregar_resultados_enriquecidos")
+def carregar_resultados_enriquecidos(anos, janela="janela_fixa"):
+    """
+    Resultados com 'Mesorregião', 'Municípios', 'Porte' e 'Janela', como visão somente leitura.
+
+    Substitui os merges com a tabela de mesorregiões feitos nas páginas: a
+    tabela é montada uma vez por processo e versão dos dados.
+    """
+    anos = tuple(anos)
+    return _visao(_enriquecidos_compartilhados(anos, janela, _versao_enriquecidos(anos, janela)))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cubo_compartilhado(anos, versao):
+    """Monta o cubo de acurácia das duas janelas uma única vez por versão dos dados."""
+    registrar_falta_cache("carregar_cubo_acuracia")
+    partes = [_enriquecidos_compartilhados(anos, janela, versao_janela) for janela, versao_janela in versao]
+    partes = [df for df in partes if not df.empty]
+    if not partes:
+        return pd.DataFrame(columns=['Janela', 'Ano', 'Mesorregião', 'Porte', 'y_real', 'n', 'acertos'])
+    return construir_cubo_acuracia(pd.concat([df[DIMENSOES_CUBO + ['acerto']] for df in partes], ignore_index=True))
+
+
+@instrumentar_carregador("carregar_cubo_acuracia")
+def carregar_cubo_acuracia(anos):
+    """Cubo de acurácia (Janela × Ano × Mesorregião × Porte × y_real) com `n` e `acertos`."""
+    anos = tuple(anos)
+    versao = tuple((janela, _versao_enriquecidos(anos, janela)) for janela in PREFIXOS_JANELA)
+    return _visao(_cubo_compartilhado(anos, versao))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _matriz_compartilhada(anos, janela, versao):
+    """Matriz município × ano das classificações (códigos int8), montada uma vez por versão dos dados."""
+    registrar_falta_cache("carregar_matriz_classificacoes", janela=janela)
+    df = _enriquecidos_compartilhados(anos, janela, versao)
+    if df.empty:
+        return None
+    return construir_matriz_classificacoes(df, [2000 + ano for ano in anos])
+
+
+@instrumentar_carregador("carregar_matriz_classificacoes")
+def carregar_matriz_classificacoes(anos, janela="janela_fixa"):
+    """
+    Classificações prevista e real de todos os municípios e anos (ver
+    `agregacoes.construir_matriz_classificacoes`), ou None sem resultados.
+    """
+    anos = tuple(anos)
+    matriz = _matriz_compartilhada(anos, janela, _versao_enriquecidos(anos, janela))
+    return None if matriz is None else dict(matriz)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _acuracia_municipios_compartilhada(anos, janela, versao):
+    """Acurácia por município no período, calculada uma vez por versão dos dados."""
+    registrar_falta_cache("carregar_acuracia_municipios", janela=janela)
+    df = _enriquecidos_compartilhados(anos, janela, versao)
+    if df.empty or 'id' not in df.columns:
+        return pd.DataFrame(columns=['Acertos', 'Anos', 'Acerto (%)', 'Municípios'], index=pd.Index([], name='id'))
+    return construir_acuracia_municipios(df)
+
+
+@instrumentar_carregador("carregar_acuracia_municipios")
+def carregar_acuracia_municipios(anos, janela="janela_fixa"):
+    """
+    Acurácia de cada município no período (ver
+    `agregacoes.construir_acuracia_municipios`), indexada pelo código IBGE
+    como texto; visão somente leitura.
+    """
+    anos = tuple(anos)
+    return _visao(_acuracia_municipios_compartilhada(anos, janela, _versao_enriquecidos(anos, janela)))
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _histogramas_compartilhados(anos, n_bins, manter_outliers, versao):
+    """Histogramas A/B de todas as (ano, variável), calculados numa única passada."""
+    registrar_falta_cache("carregar_histogramas", n_bins=n_bins, manter_outliers=manter_outliers)
+    df = _resultados_compartilhados(anos, "janela_fixa", versao)
+    if df.empty:
+        return {}
+    return construir_histogramas(df, variaveis, n_bins=n_bins, manter_outliers=manter_outliers)
+
+
+@instrumentar_carregador("carregar_histogramas")
+def carregar_histogramas(anos, n_bins=19, manter_outliers=False):
+    """
+    Cache de histogramas {(ano, variável): dados} para um nº de faixas e política de outliers.
+
+    Cada combinação (n_bins, manter_outliers) é calculada uma vez por processo
+    e versão dos dados; o dict retornado é compartilhado e não deve ser alterado.
+    """
+    anos = tuple(anos)
+    return _histogramas_compartilhados(anos, n_bins, manter_outliers, versao_resultados(anos, "janela_fixa"))
+
+
+@st.cache_resource(show_spinner=False)
+def _geojson_simplificado_compartilhado(path, tolerancia):
+    """Simplifica e serializa os contornos das mesorregiões uma vez por tolerância."""
+    registrar_falta_cache("carregar_geojson_simplificado", tolerancia=tolerancia)
+    gdf = _geojson_compartilhado(path)
+    if gdf is None or 'Nome_Mesorregiao' not in gdf.columns:
+        return None
+    return simplificar_geojson(gdf, 'Nome_Mesorregiao', tolerancia)
+
+
+@instrumentar_carregador("carregar_geojson_simplificado")
+def carregar_geojson_simplificado(tolerancia=TOLERANCIAS_MAPA[TOLERANCIA_MAPA_PADRAO], path=GEOJSON_PATH):
+    """
+    GeoJSON (dict) simplificado das mesorregiões, com `id` = nome da mesorregião.
+
+    O dict é compartilhado pelo processo e não deve ser alterado; os mapas o
+    referenciam com `featureidkey="id"` e só os valores mudam a cada render.
+    """
+    return _geojson_simplificado_compartilhado(path, tolerancia)
+
+
+def _ler_geometrias_cache(caminho, assinatura):
+    """Lê o cache binário (.npz) de geometrias se ele corresponder à malha atual."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with np.load(caminho) as arquivo:
+            if tuple(arquivo["assinatura"]) != assinatura:
+                return None
+            return {chave: arquivo[chave] for chave in arquivo.files if chave != "assinatura"}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def _geojson_municipios_compartilhado(path, tolerancia):
+    """
+    Contornos simplificados dos municípios para uma tolerância.
+
+    As geometrias simplificadas ficam num cache binário compacto
+    (`.cache_dados/geometrias/*.npz`), invalidado quando a malha muda; assim
+    a malha completa só é lida e simplificada uma vez por nível de detalhe.
+    """
+    registrar_falta_cache("carregar_geojson_municipios", tolerancia=tolerancia)
+    if not os.path.exists(path):
+        st.error(f"Arquivo GeoJSON dos municípios não encontrado: {path}")
+        return None
+    info = os.stat(path)
+    assinatura = (info.st_mtime_ns, info.st_size)
+    caminho_cache = os.path.join(PASTA_CACHE, "geometrias", f"municipios_{tolerancia}.npz")
+
+    compactado = _ler_geometrias_cache(caminho_cache, assinatura)
+    if compactado is None:
+        try:
+            gdf = gpd.read_file(path)
+        except Exception as e:
+            st.error(f"Erro ao carregar GeoJSON dos municípios: {e}")
+            return None
+        coluna_id = next((c for c in COLUNAS_ID_MUNICIPIO if c in gdf.columns), None)
+        if coluna_id is None:
+            st.error(f"GeoJSON dos municípios sem coluna de código IBGE ({', '.join(COLUNAS_ID_MUNICIPIO)}).")
+            return None
+        compactado = compactar_geometrias(gdf, coluna_id, tolerancia)
+        try:
+            os.makedirs(os.path.dirname(caminho_cache), exist_ok=True)
+            temporario = f"{caminho_cache}.{os.getpid()}.tmp.npz"
+            np.savez(temporario, assinatura=np.array(assinatura), **compactado)
+            os.replace(temporario, caminho_cache)
+        except OSError as e:
+            registrar_aviso("cache_geometrias_indisponivel", erro=str(e))
+    return geojson_de_compactado(compactado)
+
+
+def niveis_mapa(path=GEOJSON_MUNICIPIOS_PATH):
+    """
+    Níveis oferecidos nos mapas: 'Município' só aparece quando a malha
+    municipal do IBGE (não versionada) está em `path`.
+    """
+    return ["Mesorregião", "Município"] if os.path.exists(path) else ["Mesorregião"]
+
+
+@instrumentar_carregador("carregar_geojson_municipios")
+def carregar_geojson_municipios(zoom=5, path=GEOJSON_MUNICIPIOS_PATH):
+    """
+    GeoJSON (dict) dos municípios com `id` = código IBGE, no nível de detalhe do zoom.
+
+    Compartilhado pelo processo (não alterar). Ver `geometria.NIVEIS_DETALHE`.
+    """
+    return _geojson_municipios_compartilhado(path, tolerancia_para_zoom(zoom))
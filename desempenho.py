@@ -0,0 +1,374 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import sklearn
+import streamlit as st
+
+import armazenamento
+import metricas
+from agregacoes import (acuracia, construir_acuracia_municipios, construir_cubo_acuracia, construir_histogramas, construir_matriz_classificacoes,
+                        fatiar_cubo, tabela_classificacoes)
+from busca import IndiceBusca
+from floresta import LINHAS_SCIKIT_LEARN
+from dados import (ANOS_INT, PREFIXOS_JANELA, carregar_acuracia_municipios, carregar_cubo_acuracia, carregar_histogramas, carregar_indice_resultados,
+                   carregar_painel_receitas, carregar_resultados, carregar_resultados_enriquecidos, tipar_resultados)
+from extra import variaveis
+from indicadores import CAMPOS_CONTABEIS, contas_e_indicadores
+from indices import construir_indice, fatiar, valores_indexados
+from previsao import carregar_explicador, carregar_floresta, carregar_modelo, limpar_registro, montar_features, prever_lote
+
+# Suíte de desempenho: carregadores (sem cache em disco, frios e quentes),
+# partida a frio e reruns das páginas, caminhos de cálculo das abas, construção de figuras e
+# inferência, nos dados do repositório (escala "MG") e numa ampliação
+# sintética com todos os municípios do Brasil (escala "Brasil").
+#   python desempenho.py                     # grava em .cache_dados/desempenho/
+#   python desempenho.py --rapido            # menos repetições, sem páginas nem "sem disco"
+#   python desempenho.py --comparar .cache_dados/desempenho/<anterior>.json
+PASTA_DESEMPENHO = os.path.join(armazenamento.PASTA_CACHE, "desempenho")
+MUNICIPIOS_BRASIL = 5570
+ANOS_BRASIL = 20
+LINHAS_INFERENCIA = [1, 100, 10_000]
+LIMIAR_REGRESSAO = 1.2  # Mais de 20% mais lento que a referência...
+MINIMO_REGRESSAO_MS = 1.0  # ...e pelo menos 1 ms a mais (abaixo disso é ruído)
+PAGINAS = ["indicador.py", "pages/benchmark.py", "pages/simulacao.py", "pages/modelo.py"]
+MODULOS_PESADOS = ["plotly.express", "geopandas", "shapely", "joblib", "sklearn", "PIL.Image"]
+# Partida a frio de uma página num interpretador novo: separa o tempo das
+# importações do topo da página (executadas antes, via ast) do da primeira execução
+SCRIPT_PARTIDA = """
+import ast, json, sys, time
+pagina, pesados = sys.argv[1], sys.argv[2].split(",")
+inicio = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+streamlit_pronto = time.perf_counter()
+arvore = ast.parse(open(pagina, encoding="utf-8").read())
+importacoes = [no for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom))]
+exec(compile(ast.Module(body=importacoes, type_ignores=[]), pagina, "exec"), {})
+importacoes_prontas = time.perf_counter()
+AppTest.from_file(pagina, default_timeout=300).run()
+fim = time.perf_counter()
+print(json.dumps({"streamlit": streamlit_pronto - inicio, "importacoes": importacoes_prontas - streamlit_pronto,
+                  "primeira_execucao": fim - importacoes_prontas, "pesados": [m for m in pesados if m in sys.modules]}))
+"""
+
+# Carregadores das páginas (sucessores de load_all_data, load_all_revenue_data
+# e carregar_dados_classificacao) e do modelo: nome -> (função, usa cache em disco)
+CARREGADORES = {
+    "resultados": (lambda: [carregar_resultados(ANOS_INT, janela) for janela in PREFIXOS_JANELA], True),
+    "resultados_enriquecidos": (lambda: carregar_resultados_enriquecidos(ANOS_INT), True),
+    "indice_resultados": (lambda: carregar_indice_resultados(ANOS_INT), True),
+    "cubo_acuracia": (lambda: carregar_cubo_acuracia(ANOS_INT), True),
+    "acuracia_municipios": (lambda: carregar_acuracia_municipios(ANOS_INT), True),
+    "histogramas": (lambda: carregar_histogramas(ANOS_INT), True),
+    "painel_receitas": (carregar_painel_receitas, True),
+    "metricas_modelo": (lambda: metricas.carregar_metricas(ANOS_INT), True),
+    "modelo": (carregar_modelo, False),
+    "floresta_compilada": (carregar_floresta, False),
+}
+
+
+class Medicoes:
+    """Acumula os tempos medidos como linhas (grupo, caso, escala, min/mediana em ms)."""
+
+    def __init__(self, repeticoes=5):
+        self.repeticoes = repeticoes
+        self.linhas = []
+
+    def medir(self, grupo, caso, funcao, escala="MG", repeticoes=None, preparar=None):
+        tempos = []
+        for _ in range(repeticoes or self.repeticoes):
+            if preparar is not None:
+                preparar()
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        return self.registrar(grupo, caso, tempos, escala)
+
+    def registrar(self, grupo, caso, tempos, escala="MG"):
+        """Registra tempos (em segundos) medidos fora de `medir`, por exemplo num subprocesso."""
+        linha = {"grupo": grupo, "caso": caso, "escala": escala, "repeticoes": len(tempos),
+                 "min_ms": min(tempos) * 1e3, "mediana_ms": float(np.median(tempos)) * 1e3}
+        self.linhas.append(linha)
+        print(f"  {grupo:<13} {escala:<6} {caso:<45} {linha['min_ms']:>10.2f} ms")
+        return linha
+
+    def tabela(self):
+        return pd.DataFrame(self.linhas)
+
+
+def limpar_caches():
+    """Esvazia os caches do processo (Streamlit e registro de modelos), como num worker novo."""
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    limpar_registro()
+
+
+@contextlib.contextmanager
+def _sem_cache_em_disco():
+    """Aponta os caches em disco (store Parquet, métricas) para uma pasta vazia temporária."""
+    originais = (armazenamento.PASTA_CACHE, metricas.ARQUIVO_TABELA, metricas.ARQUIVO_MANIFESTO)
+    with tempfile.TemporaryDirectory() as pasta:
+        armazenamento.PASTA_CACHE = pasta
+        metricas.ARQUIVO_TABELA = os.path.join(pasta, "metricas.parquet")
+        metricas.ARQUIVO_MANIFESTO = os.path.join(pasta, "manifesto.json")
+        try:
+            yield
+        finally:
+            armazenamento.PASTA_CACHE, metricas.ARQUIVO_TABELA, metricas.ARQUIVO_MANIFESTO = originais
+
+
+def medir_carregadores(medicoes, sem_disco=True):
+    """
+    Cada carregador em três situações: sem nenhum cache em disco (primeiro
+    deploy), frio (worker novo, caches em disco prontos) e quente (rerun).
+    """
+    for nome, (carregar, usa_disco) in CARREGADORES.items():
+        if sem_disco and usa_disco:
+            with _sem_cache_em_disco():
+                medicoes.medir("carregamento", f"{nome} (sem disco)", carregar, repeticoes=1, preparar=limpar_caches)
+        carregar()  # Garante os caches em disco antes da medição fria
+        medicoes.medir("carregamento", f"{nome} (frio)", carregar, repeticoes=3, preparar=limpar_caches)
+        medicoes.medir("carregamento", f"{nome} (quente)", carregar)
+
+
+def medir_paginas(medicoes):
+    """Primeira execução (caches vazios) e rerun de cada página, via `AppTest`."""
+    from streamlit.testing.v1 import AppTest
+
+    for pagina in PAGINAS:
+        app = AppTest.from_file(pagina, default_timeout=300)
+        medicoes.medir("pagina", f"{pagina} (primeira execução)", app.run, repeticoes=1, preparar=limpar_caches)
+        medicoes.medir("pagina", f"{pagina} (rerun)", app.run, repeticoes=3)
+
+    # Reruns do indicador com seleções que ativam as partes mais pesadas das abas
+    app = AppTest.from_file("indicador.py", default_timeout=300).run()
+    municipios = app.multiselect(key="municipios_tab2_reverted").options
+    for n in (10, 100, len(municipios)):
+        app.multiselect(key="municipios_tab2_reverted").set_value(municipios[:n])
+        medicoes.medir("pagina", f"indicador.py aba 2 ({n} municípios)", app.run, repeticoes=3)
+    app.multiselect(key="municipios_tab2_reverted").set_value([])
+    app.radio(key="nivel_tab4").set_value("Município")
+    medicoes.medir("pagina", "indicador.py aba 4 (municípios)", app.run, repeticoes=3)
+
+
+def medir_partida(medicoes, repeticoes=3):
+    """
+    Importações do topo e primeira execução de cada página num interpretador
+    novo (worker recém-criado, caches em disco prontos). Mostra quais módulos
+    pesados a página acabou carregando.
+    """
+    ambiente = {**os.environ, "INSTRUMENTACAO_NIVEL": "WARNING"}
+    for pagina in PAGINAS:
+        execucoes = []
+        for _ in range(repeticoes):
+            saida = subprocess.run([sys.executable, "-c", SCRIPT_PARTIDA, pagina, ",".join(MODULOS_PESADOS)],
+                                   capture_output=True, text=True, check=True, env=ambiente).stdout
+            execucoes.append(json.loads(saida.strip().splitlines()[-1]))
+        medicoes.registrar("partida", f"{pagina} (importações)", [e["importacoes"] for e in execucoes])
+        medicoes.registrar("partida", f"{pagina} (primeira execução)", [e["primeira_execucao"] for e in execucoes])
+        print(f"  {'':<13} {'':<6} módulos pesados carregados: {', '.join(execucoes[-1]['pesados']) or 'nenhum'}")
+
+
+def ampliar_resultados(df, n_municipios=MUNICIPIOS_BRASIL, n_anos=ANOS_BRASIL, semente=0):
+    """
+    Resultados sintéticos com `n_municipios` × `n_anos` por janela, sorteando
+    linhas reais (com reposição) e atribuindo novos ids, nomes e anos.
+    """
+    rng = np.random.default_rng(semente)
+    anos = np.arange(2023 - n_anos, 2023)
+    partes = []
+    for janela, df_janela in df.groupby("Janela", observed=True):
+        linhas = df_janela.iloc[rng.integers(0, len(df_janela), n_municipios * n_anos)].reset_index(drop=True)
+        ids = np.tile(np.arange(n_municipios), n_anos)
+        linhas["id"] = 1_000_000 + ids
+        linhas["Municípios"] = pd.Categorical.from_codes(ids, [f"Município {i:04d}" for i in range(n_municipios)])
+        linhas["Ano"] = np.repeat(anos, n_municipios)
+        linhas["Janela"] = janela
+        partes.append(linhas)
+    return tipar_resultados(pd.concat(partes, ignore_index=True))
+
+
+def _geojson_quadrados(ids):
+    """Um quadrado por id, para medir mapas sem depender da malha do IBGE."""
+    lados = int(np.ceil(np.sqrt(len(ids))))
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "id": str(i), "properties": {}, "geometry": {"type": "Polygon", "coordinates": [[
+            [x, y], [x + 0.1, y], [x + 0.1, y + 0.1], [x, y + 0.1], [x, y]]]}}
+        for i, (x, y) in zip(ids, ((-51 + 0.1 * (k % lados), -22 + 0.1 * (k // lados)) for k in range(len(ids))))
+    ]}
+
+
+def medir_calculos(medicoes, df, escala):
+    """Caminhos de cálculo das abas do indicador e construção das figuras."""
+    fixa = df[df["Janela"] == "janela_fixa"]
+    ultimo_ano = int(fixa["Ano"].max())
+    medicoes.medir("calculo", "aba 1: construir histogramas", lambda: construir_histogramas(df, variaveis), escala, repeticoes=3)
+    medicoes.medir("calculo", "índices: construir", lambda: construir_indice(fixa), escala, repeticoes=3)
+    indice = construir_indice(fixa)
+    municipios = valores_indexados(indice, "Municípios")
+    anos = sorted(fixa["Ano"].unique())
+    medicoes.medir("calculo", "aba 2: construir matriz de classificações",
+                   lambda: construir_matriz_classificacoes(fixa, anos), escala, repeticoes=3)
+    matriz = construir_matriz_classificacoes(fixa, anos)
+    for n in (10, 100, len(municipios)):
+        medicoes.medir("calculo", f"aba 2: fatiar ({n} municípios)",
+                       lambda selecao=municipios[:n]: fatiar(indice, "Municípios", selecao), escala)
+        medicoes.medir("calculo", f"aba 2: tabela de classificações ({n} municípios)",
+                       lambda selecao=municipios[:n]: tabela_classificacoes(matriz, selecao), escala)
+    unicos = fixa.drop_duplicates(subset=["Municípios"])
+    def indice_busca():
+        return IndiceBusca(unicos["Municípios"], codigos=unicos["id"].astype(str),
+                           grupos={"Mesorregião": unicos["Mesorregião"], "Porte": unicos["Porte"]})
+    medicoes.medir("calculo", "busca: construir índice", indice_busca, escala, repeticoes=3)
+    busca = indice_busca()
+    for consulta in ("sao joao del", "uberlandia", "joao monlevad", "31"):
+        medicoes.medir("calculo", f"busca: '{consulta}'", lambda consulta=consulta: busca.buscar(consulta), escala)
+    medicoes.medir("calculo", "aba 3: construir cubo", lambda: construir_cubo_acuracia(df), escala, repeticoes=3)
+    cubo = construir_cubo_acuracia(df)
+    medicoes.medir("calculo", "aba 3: fatiar cubo + acurácia",
+                   lambda: acuracia(fatiar_cubo(cubo, Janela="janela_fixa"), por=["Mesorregião", "Ano"]), escala)
+    medicoes.medir("calculo", "aba 4: construir acurácia por município",
+                   lambda: construir_acuracia_municipios(fixa), escala, repeticoes=3)
+    por_id = construir_acuracia_municipios(fixa)
+    ids_mapa = list(por_id.index)
+    medicoes.medir("calculo", "aba 4: selecionar municípios do mapa",
+                   lambda: por_id.reindex(ids_mapa).dropna(subset=["Anos"]), escala)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "resultados.parquet")
+        medicoes.medir("calculo", "parquet: gravar + ler resultados",
+                       lambda: (df.to_parquet(caminho, index=False), pd.read_parquet(caminho)), escala, repeticoes=3)
+
+    # Figuras (construção + serialização, como o st.plotly_chart faz a cada rerun)
+    recorte = fatiar(indice, "Municípios", municipios[:10]).sort_values("Ano")
+    medicoes.medir("figura", "aba 2: linha (10 municípios)", lambda: px.line(
+        recorte, x="Ano", y=variaveis[0], color="Municípios", markers=True, line_shape="spline").to_json(), escala)
+    por_meso = acuracia(fatiar_cubo(cubo, Janela="janela_fixa"), por=["Mesorregião", "Ano"])
+    medicoes.medir("figura", "aba 3: linha por mesorregião", lambda: px.line(
+        por_meso, x="Ano", y="acerto", color="Mesorregião", markers=True).to_json(), escala)
+    histograma = next(h for h in construir_histogramas(fixa[fixa["Ano"] == ultimo_ano], variaveis).values() if h)
+    medicoes.medir("figura", "aba 1: histograma A/B", lambda: go.Figure([
+        go.Bar(x=histograma["centros"], y=histograma["hist_A"]),
+        go.Bar(x=histograma["centros"], y=-histograma["hist_B"])]).to_json(), escala)
+    por_municipio = fixa.groupby("id")["acerto"].mean().reset_index()
+    geojson = _geojson_quadrados(por_municipio["id"].astype(str))
+    medicoes.medir("figura", f"aba 4: mapa ({len(por_municipio)} municípios)", lambda: go.Figure(go.Choroplethmapbox(
+        geojson=geojson, locations=por_municipio["id"].astype(str), z=por_municipio["acerto"],
+        featureidkey="id")).to_json(), escala, repeticoes=3)
+
+
+def medir_inferencia(medicoes, referencia):
+    """Previsão com o modelo original e o compilado, explicações e o caminho completo da simulação."""
+    modelo, floresta, explicador = carregar_modelo(), carregar_floresta(), carregar_explicador()
+    rng = np.random.default_rng(0)
+    X = montar_features(modelo, referencia)
+    for n in LINHAS_INFERENCIA:
+        amostra = X.iloc[rng.integers(0, len(X), n)]
+        repeticoes = 20 if n == 1 else 5
+        medicoes.medir("inferencia", f"scikit-learn predict_proba ({n} linhas)", lambda: modelo.predict_proba(amostra),
+                       repeticoes=repeticoes)
+        medicoes.medir("inferencia", f"floresta compilada ({n} linhas)", lambda: floresta.predict_proba(amostra),
+                       repeticoes=repeticoes)
+        if n >= LINHAS_SCIKIT_LEARN:  # Acima do limiar a floresta usa o scikit-learn; mede o percurso NumPy à parte
+            medicoes.medir("inferencia", f"percurso compilado ({n} linhas)", lambda: floresta.percorrer(amostra),
+                           repeticoes=repeticoes)
+        medicoes.medir("inferencia", f"explicações ({n} linhas)", lambda: explicador.explicar(amostra),
+                       repeticoes=repeticoes)
+        contas = pd.DataFrame(rng.uniform(1e5, 1e8, (n, len(CAMPOS_CONTABEIS))), columns=CAMPOS_CONTABEIS)
+        contas["populacao"] = rng.integers(1_000, 500_000, n)
+
+        def simulacao(entradas=contas):
+            return prever_lote(floresta, contas_e_indicadores(entradas))
+        medicoes.medir("inferencia", f"simulação: indicadores + previsão ({n} linhas)", simulacao, repeticoes=repeticoes)
+
+
+def metadados():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "desconhecido"
+    return {
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "scikit-learn": sklearn.__version__,
+        "nucleos": os.cpu_count(),
+    }
+
+
+def comparar(atual, referencia, limiar=LIMIAR_REGRESSAO):
+    """
+    Junta duas tabelas de medições pelos casos em comum e calcula a razão
+    (atual / referência) dos tempos mínimos; `regressao` marca razões acima do
+    limiar que também somam pelo menos `MINIMO_REGRESSAO_MS`.
+    """
+    chaves = ["grupo", "caso", "escala"]
+    juntas = atual[chaves + ["min_ms"]].merge(referencia[chaves + ["min_ms"]], on=chaves, suffixes=("", "_referencia"))
+    juntas["razao"] = juntas["min_ms"] / juntas["min_ms_referencia"]
+    juntas["regressao"] = (juntas["razao"] > limiar) & (juntas["min_ms"] - juntas["min_ms_referencia"] >= MINIMO_REGRESSAO_MS)
+    return juntas.sort_values("razao", ascending=False, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o desempenho de carregamento, páginas, cálculos e inferência.")
+    parser.add_argument("--rapido", action="store_true", help="Menos repetições; pula páginas e carregamento sem disco")
+    parser.add_argument("--sem-escala", action="store_true", help="Não mede a ampliação sintética (Brasil)")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON de saída (padrão: .cache_dados/desempenho/<commit>.json)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_REGRESSAO, help="Razão acima da qual há regressão")
+    args = parser.parse_args(argv)
+
+    medicoes = Medicoes(repeticoes=3 if args.rapido else 5)
+    print("Carregamento:")
+    medir_carregadores(medicoes, sem_disco=not args.rapido)
+    print("Partida a frio das páginas:")
+    medir_partida(medicoes, repeticoes=1 if args.rapido else 3)
+    if not args.rapido:
+        print("Páginas:")
+        medir_paginas(medicoes)
+
+    resultados = pd.concat([carregar_resultados_enriquecidos(ANOS_INT, janela) for janela in PREFIXOS_JANELA],
+                           ignore_index=True)
+    resultados = tipar_resultados(resultados)
+    print("Cálculos e figuras (MG):")
+    medir_calculos(medicoes, resultados, "MG")
+    if not args.sem_escala:
+        print(f"Cálculos e figuras (Brasil: {MUNICIPIOS_BRASIL} municípios × {ANOS_BRASIL} anos):")
+        medir_calculos(medicoes, ampliar_resultados(resultados), "Brasil")
+    print("Inferência:")
+    medir_inferencia(medicoes, resultados)
+
+    meta = metadados()
+    saida = args.saida or os.path.join(PASTA_DESEMPENHO, f"{meta['commit']}.json")
+    os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump({"metadados": meta, "medicoes": medicoes.linhas}, f, indent=1, ensure_ascii=False)
+    print(f"{len(medicoes.linhas)} medições gravadas em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        comparacao = comparar(medicoes.tabela(), pd.DataFrame(anterior["medicoes"]), args.limiar)
+        print(f"Comparação com {anterior['metadados']['commit']} (razão = atual / anterior):")
+        print(comparacao.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+        if comparacao["regressao"].any():
+            print(f"{int(comparacao['regressao'].sum())} caso(s) com mais de {args.limiar:.0%} do tempo anterior.", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
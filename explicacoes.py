@@ -0,0 +1,227 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from floresta import compilar_floresta
+from tardio import importar_tardio
+
+go = importar_tardio("plotly.graph_objects")
+
+# Explicações locais das previsões: quanto cada variável moveu a probabilidade
+# da classe em relação à média do modelo, decompondo o caminho de cada linha
+# em cada árvore (a cada divisão, a variação da probabilidade do nó pai para o
+# filho é atribuída à variável da divisão). Por construção,
+#   base + soma das contribuições = probabilidade prevista.
+# `treinamento.py` grava os resultados e as explicações com o mesmo modelo
+# ajustado. Os modelos que geraram os resultados publicados (`resultados/`) não
+# foram guardados: para o histórico, o script abaixo refaz um modelo de
+# referência por janela/ano (mesmo procedimento de `treinamento.py`), explica
+# o `resultado_final` publicado e só grava as linhas em que o modelo refeito
+# chega à classe publicada. As planilhas (`<prefixo>explicacoes<ano>.xlsx`)
+# vão para `.cache_dados/explicacoes_referencia/`, nunca para `resultados/`, e
+# a página as apresenta como explicações do modelo de referência:
+#   python explicacoes.py                 # janelas/anos ainda sem explicações
+#   python explicacoes.py --forcar --workers 4
+TAMANHO_BLOCO = 256  # Linhas por bloco: (linhas × árvores × variáveis × classes) cabe no cache
+COLUNAS_FIXAS = ["id", "classe_explicada", "base", "probabilidade", "classe_prevista"]
+MAX_BARRAS = 8  # Variáveis mostradas na cascata; as demais são somadas numa barra
+
+
+class ExplicadorFloresta:
+    """
+    Contribuições por variável das previsões de uma `FlorestaCompilada`.
+
+    Guarda, para cada nó, a soma das contribuições acumuladas no caminho da
+    raiz até ele (nós × variáveis × classes). Explicar uma linha vira uma
+    consulta às folhas alcançadas e uma média entre as árvores, sem percorrer
+    os caminhos de novo.
+    """
+
+    def __init__(self, floresta):
+        self.floresta = floresta
+        self.classes_ = floresta.classes_
+        self.feature_names_in_ = floresta.feature_names_in_
+        valores = floresta.valores
+        acumuladas = np.zeros((len(valores), floresta.n_features_in_, len(self.classes_)))
+        # Um nível por iteração: os filhos herdam o acumulado do pai mais a variação da divisão
+        frente = floresta.raizes[~floresta.folha[floresta.raizes]]
+        while frente.size:
+            variavel = floresta.feature[frente]
+            filhos = []
+            for lado in (0, 1):
+                filho = floresta.filhos[2 * frente + lado]
+                acumuladas[filho] = acumuladas[frente]
+                acumuladas[filho, variavel] += valores[filho] - valores[frente]
+                filhos.append(filho)
+            frente = np.concatenate(filhos)
+            frente = frente[~floresta.folha[frente]]
+        self.acumuladas = acumuladas
+        self.base = valores[floresta.raizes].mean(axis=0)  # Probabilidade média antes de qualquer divisão
+
+    def explicar(self, X):
+        """
+        Retorna (contribuições, probabilidades): arrays (linhas × variáveis ×
+        classes) e (linhas × classes), com `base + contribuições.sum(1) == probabilidades`.
+        """
+        folhas = self.floresta.folhas(X)
+        contribuicoes = np.empty((len(folhas), *self.acumuladas.shape[1:]))
+        for inicio in range(0, len(folhas), TAMANHO_BLOCO):
+            bloco = folhas[inicio:inicio + TAMANHO_BLOCO]
+            contribuicoes[inicio:inicio + TAMANHO_BLOCO] = self.acumuladas[bloco].mean(axis=1)
+        return contribuicoes, self.base + contribuicoes.sum(axis=1)
+
+    def tabela(self, X, ids=None, classe=None):
+        """
+        Uma linha por linha de `X` com as colunas de `COLUNAS_FIXAS` e a
+        contribuição de cada variável para a probabilidade de `classe`
+        (padrão: a primeira classe do modelo).
+        """
+        classe = self.classes_[0] if classe is None else classe
+        k = list(self.classes_).index(classe)
+        contribuicoes, probabilidades = self.explicar(X)
+        tabela = pd.DataFrame(contribuicoes[:, :, k], columns=list(self.feature_names_in_))
+        tabela.insert(0, "classe_prevista", self.classes_[probabilidades.argmax(axis=1)])
+        tabela.insert(0, "probabilidade", probabilidades[:, k])
+        tabela.insert(0, "base", self.base[k])
+        tabela.insert(0, "classe_explicada", str(classe))
+        tabela.insert(0, "id", np.arange(len(tabela)) if ids is None else np.asarray(ids))
+        return tabela
+
+
+def explicar_resultados(modelo, resultados):
+    """Tabela de explicações (ver `ExplicadorFloresta.tabela`) das linhas de um `resultado_final`."""
+    floresta = compilar_floresta(modelo)
+    X = resultados[list(floresta.feature_names_in_)]
+    return ExplicadorFloresta(floresta).tabela(X, ids=resultados["id"])
+
+
+def concordantes(tabela, resultados):
+    """Linhas da `tabela` de explicações cuja `classe_prevista` é o `y_previsto` publicado (mesmo 'id')."""
+    publicada = resultados.drop_duplicates(subset=["id"]).set_index("id")["y_previsto"].astype(str)
+    iguais = tabela["classe_prevista"].astype(str).to_numpy() == publicada.reindex(tabela["id"]).to_numpy()
+    return tabela[iguais].reset_index(drop=True)
+
+
+def figura_cascata(linha, variaveis, titulo, max_barras=MAX_BARRAS):
+    """
+    Cascata da explicação de uma linha (Series com `base`, `probabilidade`,
+    `classe_explicada` e as contribuições de `variaveis`): as `max_barras`
+    variáveis de maior efeito e as demais agrupadas.
+    """
+    contribuicoes = linha[list(variaveis)].astype(float)
+    ordem = contribuicoes.abs().sort_values(ascending=False).index
+    principais = contribuicoes[ordem[:max_barras]]
+    nomes = [v.replace("_", " ") for v in principais.index]
+    valores = list(principais.to_numpy())
+    if len(ordem) > max_barras:
+        nomes.append(f"Demais {len(ordem) - max_barras} variáveis")
+        valores.append(float(contribuicoes[ordem[max_barras:]].sum()))
+    classe = linha["classe_explicada"]
+
+    fig = go.Figure(go.Waterfall(
+        orientation="h",
+        measure=["absolute", *["relative"] * len(valores), "total"],
+        y=["Média do modelo", *nomes, f"Probabilidade de {classe}"],
+        x=[float(linha["base"]), *valores, float(linha["probabilidade"])],
+        text=[f"{linha['base']:.1%}", *[f"{v:+.1%}" for v in valores], f"{linha['probabilidade']:.1%}"],
+        textposition="outside",
+        increasing={"marker": {"color": "#4B9CD3"}}, decreasing={"marker": {"color": "#FF6B6B"}},
+        totals={"marker": {"color": "#888888"}},
+        hovertemplate="<b>%{y}</b><br>%{text}<extra></extra>",
+    ))
+    fig.add_vline(x=0.5, line_dash="dot", line_color="gray")
+    fig.update_layout(
+        title=titulo, height=120 + 32 * (len(valores) + 2), margin=dict(l=0, r=0, t=40, b=0),
+        xaxis=dict(title=f"Probabilidade de Classe {classe}", tickformat=".0%", range=[0, 1]),
+        yaxis=dict(autorange="reversed"), showlegend=False,
+    )
+    return fig
+
+
+def _explicar_pasta(argumentos):
+    """
+    Tarefa de `precalcular`: refaz o modelo de uma janela/ano, explica o
+    `resultado_final` de `pasta` e grava em `saida` só as linhas em que o
+    modelo refeito concorda com a classe publicada (ver `concordantes`).
+    """
+    janela, ano, base, pasta, saida = argumentos
+    from treinamento import ajustar_modelo, caminho_artefato, salvar_explicacoes
+
+    ajuste = ajustar_modelo(janela, ano, base, n_jobs=1)
+    if ajuste is None:
+        return None
+    resultados = pd.read_excel(caminho_artefato(pasta, janela, ano, "resultado_final", "xlsx"))
+    tabela = explicar_resultados(ajuste[0], resultados)
+    gravadas = concordantes(tabela, resultados)
+    os.makedirs(os.path.dirname(caminho_artefato(saida, janela, ano, "explicacoes", "xlsx")), exist_ok=True)
+    salvar_explicacoes(gravadas, saida, janela, ano)
+    return {"janela": janela, "ano": ano, "linhas": len(tabela), "gravadas": len(gravadas)}
+
+
+def precalcular(pasta, saida, anos=None, janelas=None, workers=None, forcar=False):
+    """
+    Grava em `saida` as `<prefixo>explicacoes<ano>.xlsx` das janelas/anos que
+    têm `resultado_final` em `pasta` e ainda não têm explicações (todas, com
+    `forcar`).
+
+    O modelo de cada pasta é refeito como em `treinamento.py` (mesma semente e
+    anos de treino), mas pode divergir do modelo que gerou a planilha
+    publicada: as linhas em que a classe difere ficam sem explicação. As
+    pastas são processadas em paralelo, uma por processo.
+    """
+    from treinamento import PREFIXOS_JANELA, caminho_artefato, montar_base
+
+    base = montar_base(pasta)
+    tarefas = []
+    for janela in janelas or PREFIXOS_JANELA:
+        for ano in sorted(anos or base["Ano"].unique()):
+            if not os.path.exists(caminho_artefato(pasta, janela, ano, "resultado_final", "xlsx")):
+                continue
+            if forcar or not os.path.exists(caminho_artefato(saida, janela, ano, "explicacoes", "xlsx")):
+                tarefas.append((janela, int(ano), base, pasta, saida))
+    if not tarefas:
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tarefas)))
+    if workers == 1:
+        resumos = [_explicar_pasta(t) for t in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            resumos = list(executor.map(_explicar_pasta, tarefas))
+    return [r for r in resumos if r is not None]
+
+
+def main(argv=None):
+    from dados import PASTA_EXPLICACOES, PASTA_RESULTADOS, PREFIXOS_JANELA
+    from treinamento import dentro_de_publicados
+
+    parser = argparse.ArgumentParser(description="Pré-calcula as explicações das previsões de resultados/ "
+                                                 "por um modelo de referência refeito.")
+    parser.add_argument("--anos", type=int, nargs="+", default=None, help="Anos com dois dígitos (ex.: 21 22)")
+    parser.add_argument("--janelas", nargs="+", choices=list(PREFIXOS_JANELA), default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: núcleos)")
+    parser.add_argument("--pasta", default=PASTA_RESULTADOS, help="Resultados a explicar (só leitura)")
+    parser.add_argument("--saida", default=PASTA_EXPLICACOES,
+                        help=f"Pasta das explicações, fora de resultados/ (padrão: {PASTA_EXPLICACOES})")
+    parser.add_argument("--forcar", action="store_true", help="Refaz também as pastas que já têm explicações")
+    args = parser.parse_args(argv)
+    if dentro_de_publicados(args.saida):
+        parser.error(f"--saida não pode ficar dentro de {PASTA_RESULTADOS}/: as explicações vêm de um modelo refeito.")
+
+    inicio = time.perf_counter()
+    resumos = precalcular(args.pasta, args.saida, args.anos, args.janelas, args.workers, args.forcar)
+    if not resumos:
+        print("Nenhuma pasta sem explicações.")
+        return
+    for r in resumos:
+        print(f"{r['janela']:<17} 20{r['ano']}  {r['gravadas']:>4} de {r['linhas']:>4} linhas explicadas "
+              f"(classe igual à publicada em {r['gravadas'] / r['linhas']:.1%})")
+    print(f"{len(resumos)} pasta(s) em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_BLOCO = 512  # Linhas percorridas por vez em `FlorestaCompilada.folhas`
+# A partir deste número de linhas o percurso em C do scikit-learn (custo fixo
+# de ~10 ms por chamada) vence o percurso NumPy nível a nível: 512 linhas
+# levam 15 ms compiladas e 16 ms no scikit-learn; 1024, 22 ms e 20 ms; 7.936,
+# 200 ms e 85 ms (1 núcleo, 100 árvores). Os lotes grandes vão para o modelo
+# original, que dá exatamente as mesmas probabilidades e folhas.
+LINHAS_SCIKIT_LEARN = 768
+LINHAS_PARIDADE = 256  # Linhas da amostra de `amostra_paridade`
+
+class FlorestaCompilada:
+    """
+    Random Forest do scikit-learn compilado em arrays NumPy contíguos.
+
+    Os nós de todas as árvores ficam num único conjunto de arrays (feature,
+    limiar, filhos, direção dos ausentes e probabilidades por classe), com os
+    índices dos filhos já deslocados para a numeração global. Todas as linhas
+    descem todas as árvores ao mesmo tempo, um nível por iteração, sem laços
+    em Python por linha ou por árvore.
+
+    Expõe `predict_proba`, `predict`, `classes_` e `feature_names_in_`, e pode
+    substituir o modelo original em `montar_features`, `prever_lote` e na
+    análise de sensibilidade. O percurso compilado serve os lotes pequenos
+    (a simulação, uma linha por vez), onde o scikit-learn gasta mais com a
+    chamada do que com as árvores; a partir de `LINHAS_SCIKIT_LEARN` linhas
+    o modelo original é usado. O resultado de `predict_proba` é idêntico ao
+    do scikit-learn (ver `verificar_paridade`, executada em `previsao.carregar_floresta`).
+    """
+
+    def __init__(self, modelo, n_jobs=None):
+        arvores = [estimador.tree_ for estimador in modelo.estimators_]
+        tamanhos = np.array([arvore.node_count for arvore in arvores])
+        inicios = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+
+        self.modelo = modelo
+        self.classes_ = modelo.classes_
+        self.feature_names_in_ = getattr(modelo, "feature_names_in_", None)
+        self.n_features_in_ = modelo.n_features_in_
+        self.n_arvores = len(arvores)
+        self.raizes = inicios.astype(np.intp)
+        # Threads para percorrer blocos em paralelo (o NumPy libera o GIL nos `take`)
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else max(1, n_jobs or 1)
+
+        feature, limiar, filhos, ausente_esquerda, valores = [], [], [], [], []
+        for inicio, arvore in zip(inicios, arvores):
+            folha = arvore.children_left == -1
+            proprios = inicio + np.arange(arvore.node_count)
+            feature.append(np.where(folha, 0, arvore.feature))
+            limiar.append(np.where(folha, np.inf, arvore.threshold))
+            # Filhos intercalados (esquerdo, direito); as folhas apontam para si mesmas
+            filhos.append(np.column_stack([
+                np.where(folha, proprios, inicio + arvore.children_left),
+                np.where(folha, proprios, inicio + arvore.children_right),
+            ]).ravel())
+            ausente_esquerda.append(np.where(folha, True, arvore.missing_go_to_left.astype(bool)))
+            # Mesma normalização de DecisionTreeClassifier.predict_proba
+            proba = arvore.value[:, 0, :len(self.classes_)].astype(np.float64)
+            normalizador = proba.sum(axis=1)[:, np.newaxis]
+            normalizador[normalizador == 0.0] = 1.0
+            valores.append(proba / normalizador)
+
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.intp)
+        self.filhos = np.ascontiguousarray(np.concatenate(filhos), dtype=np.intp)
+        self.folha = self.filhos[0::2] == np.arange(len(self.feature))
+        self.ausente_esquerda = np.ascontiguousarray(np.concatenate(ausente_esquerda))
+        self.valores = np.ascontiguousarray(np.concatenate(valores))
+        # O scikit-learn compara o valor em float32 com o limiar em float64. Como
+        # x é float32, x <= t equivale a x <= (maior float32 <= t): os limiares
+        # arredondados para baixo dão o mesmo resultado com metade da memória.
+        limiar = np.concatenate(limiar)
+        self.limiar = limiar.astype(np.float32)
+        acima = self.limiar.astype(np.float64) > limiar
+        self.limiar[acima] = np.nextafter(self.limiar[acima], np.float32(-np.inf))
+
+    def _matriz(self, X):
+        """Entrada como float32 (como o scikit-learn), na ordem de `feature_names_in_`."""
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None \
+                and list(X.columns) != list(self.feature_names_in_):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Esperadas {self.n_features_in_} features, recebidas {X.shape[1]}.")
+        return X
+
+    def _quadro(self, X):
+        """Entrada do scikit-learn: a matriz float32 com os nomes das colunas (evita o aviso de nomes ausentes)."""
+        if self.feature_names_in_ is None:
+            return X
+        return pd.DataFrame(X, columns=self.feature_names_in_, copy=False)
+
+    def _folhas_bloco(self, X):
+        n, n_features = X.shape
+        valores_x = X.ravel()
+        nos = np.tile(self.raizes, n)  # Posição i * n_arvores + t: linha i, árvore t
+        deslocamento = np.repeat(np.arange(n) * n_features, self.n_arvores)
+        ativos = np.flatnonzero(~self.folha.take(nos))
+        tem_ausentes = bool(np.isnan(valores_x).any())
+        # Um nível por iteração, só com os pares (linha, árvore) que ainda não chegaram à folha
+        while ativos.size:
+            no = nos.take(ativos)
+            x = valores_x.take(deslocamento.take(ativos) + self.feature.take(no))
+            direita = x > self.limiar.take(no)
+            if tem_ausentes:
+                direita = np.where(np.isnan(x), ~self.ausente_esquerda.take(no), direita)
+            no = self.filhos.take(2 * no + direita)
+            nos[ativos] = no
+            ativos = ativos[~self.folha.take(no)]
+        return nos.reshape(n, self.n_arvores)
+
+    def folhas(self, X):
+        """Índice global da folha alcançada por cada linha em cada árvore: (linhas, árvores)."""
+        X = self._matriz(X)
+        if not len(X):
+            return np.empty((0, self.n_arvores), dtype=np.intp)
+        if len(X) >= LINHAS_SCIKIT_LEARN:
+            return self.modelo.apply(self._quadro(X)).astype(np.intp) + self.raizes
+        return self.percorrer(X)
+
+    def percorrer(self, X):
+        """`folhas` sempre pelo percurso compilado, qualquer que seja o número de linhas."""
+        X = self._matriz(X)
+        if not len(X):
+            return np.empty((0, self.n_arvores), dtype=np.intp)
+        # Blocos de linhas menores mantêm os arrays de trabalho no cache
+        blocos = [X[i:i + TAMANHO_BLOCO] for i in range(0, len(X), TAMANHO_BLOCO)]
+        if self.n_jobs > 1 and len(blocos) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+                return np.concatenate(list(executor.map(self._folhas_bloco, blocos)))
+        return np.concatenate([self._folhas_bloco(bloco) for bloco in blocos])
+
+    def predict_proba(self, X):
+        X = self._matriz(X)
+        if len(X) >= LINHAS_SCIKIT_LEARN:
+            return self.modelo.predict_proba(self._quadro(X))
+        return self._probabilidades(self.percorrer(X))
+
+    def _probabilidades(self, folhas):
+        # cumsum soma árvore a árvore, na mesma ordem do RandomForestClassifier
+        probabilidades = np.cumsum(self.valores[folhas], axis=1)[:, -1]
+        return probabilidades / self.n_arvores
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def compilar_floresta(modelo, n_jobs=None):
+    """Compila um `RandomForestClassifier` treinado (ver `FlorestaCompilada`)."""
+    return FlorestaCompilada(modelo, n_jobs)
+
+
+def amostra_paridade(floresta, n=LINHAS_PARIDADE, semente=0):
+    """
+    Linhas sintéticas que exercitam as divisões da floresta: cada valor é um
+    limiar sorteado da variável, exatamente nele ou logo acima (os casos em
+    que um arredondamento mudaria o lado), com alguns ausentes (NaN).
+    """
+    gerador = np.random.default_rng(semente)
+    X = np.zeros((n, floresta.n_features_in_), dtype=np.float32)
+    divisoes = ~floresta.folha
+    for coluna in range(floresta.n_features_in_):
+        limiares = floresta.limiar[divisoes & (floresta.feature == coluna)]
+        if not len(limiares):
+            continue
+        valores = gerador.choice(limiares, n)
+        acima = gerador.random(n) < 0.5
+        valores[acima] = np.nextafter(valores[acima], np.float32(np.inf))
+        X[:, coluna] = valores
+    X[gerador.random(X.shape) < 0.02] = np.nan
+    return X
+
+
+def verificar_paridade(modelo, floresta, X):
+    """
+    Compara as probabilidades do percurso compilado com `predict_proba` do
+    modelo em `X` (em qualquer número de linhas, sem passar pelo scikit-learn).
+
+    Retorna a maior diferença absoluta encontrada; levanta AssertionError se
+    as probabilidades não forem idênticas.
+    """
+    esperado = modelo.predict_proba(floresta._quadro(floresta._matriz(X)))
+    obtido = floresta._probabilidades(floresta.percorrer(X))
+    diferenca = float(np.max(np.abs(esperado - obtido))) if len(esperado) else 0.0
+    if not np.array_equal(esperado, obtido):
+        raise AssertionError(f"predict_proba diverge do scikit-learn (diferença máxima {diferenca:.3g}).")
+    return diferenca
+
+
+def _cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+if __name__ == "__main__":
+    # Paridade e tempos nos dados de referência: python floresta.py
+    from dados import ANOS_INT, PREFIXOS_JANELA, carregar_resultados
+    from previsao import carregar_modelo, montar_features
+
+    modelo = carregar_modelo()
+    floresta = compilar_floresta(modelo, n_jobs=-1)
+    referencia = pd.concat([carregar_resultados(ANOS_INT, janela) for janela in PREFIXOS_JANELA], ignore_index=True)
+    X = montar_features(modelo, referencia)
+    try:
+        verificar_paridade(modelo, floresta, X)
+        verificar_paridade(modelo, floresta, amostra_paridade(floresta))
+    except AssertionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"Paridade OK em {len(X)} linhas e {LINHAS_PARIDADE} linhas sintéticas "
+          f"({floresta.n_arvores} árvores, {len(floresta.limiar)} nós).")
+
+    uma_linha = X.iloc[:1]
+    print(f"1 linha:  scikit-learn {_cronometrar(lambda: modelo.predict_proba(uma_linha), 50) * 1e3:8.3f} ms | "
+          f"compilada {_cronometrar(lambda: floresta.predict_proba(uma_linha), 500) * 1e3:8.3f} ms")
+    um_ano = X[(referencia["Ano"] == referencia["Ano"].max()).to_numpy()]
+    um_ano = um_ano.iloc[:len(um_ano) // len(PREFIXOS_JANELA)]  # Municípios do último ano, uma janela
+    print(f"{len(um_ano)} linhas: scikit-learn {_cronometrar(lambda: modelo.predict_proba(um_ano), 10) * 1e3:8.1f} ms | "
+          f"compilada {_cronometrar(lambda: floresta.predict_proba(um_ano), 10) * 1e3:8.1f} ms")
+    print(f"{len(X)} linhas: scikit-learn {_cronometrar(lambda: modelo.predict_proba(X), 5) * 1e3:8.1f} ms | "
+          f"compilada {_cronometrar(lambda: floresta.predict_proba(X), 5) * 1e3:8.1f} ms "
+          f"(percurso compilado {_cronometrar(lambda: floresta.percorrer(X), 5) * 1e3:.1f} ms)")
@@ -0,0 +1,124 @@
+import numpy as np
+
+from tardio import importar_tardio
+
+shapely = importar_tardio("shapely")  # Só carregado ao (des)compactar ou enquadrar geometrias
+
+# Tolerâncias de simplificação (em graus) disponíveis para os mapas
+TOLERANCIAS_MAPA = {"Alta": 0.001, "Média": 0.005, "Baixa": 0.02}
+TOLERANCIA_MAPA_PADRAO = "Média"
+CASAS_DECIMAIS = 4  # ~11 m de precisão, suficiente para o zoom dos mapas
+
+
+def simplificar_cobertura(geometrias, tolerancia):
+    """
+    Simplifica polígonos vizinhos sem abrir frestas nem sobreposições.
+
+    Com `shapely.coverage_simplify` (shapely >= 2.1, GEOS >= 3.12), cada
+    fronteira compartilhada é simplificada uma única vez para os dois lados.
+    Em versões anteriores, cai no Douglas-Peucker por polígono
+    (`preserve_topology=True`), que não garante fronteiras coincidentes.
+    """
+    geometrias = np.asarray(geometrias, dtype=object)
+    if not hasattr(shapely, "coverage_simplify") or shapely.geos_version < (3, 12, 0):
+        return shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+    validas = ~(shapely.is_missing(geometrias) | shapely.is_empty(geometrias))
+    simplificadas = geometrias.copy()
+    simplificadas[validas] = shapely.coverage_simplify(geometrias[validas], tolerancia)
+    return simplificadas
+
+
+def simplificar_geojson(gdf, coluna_id, tolerancia, casas_decimais=CASAS_DECIMAIS):
+    """
+    Simplifica os polígonos e monta um GeoJSON enxuto para o Plotly.
+
+    Simplifica a coleção inteira com `simplificar_cobertura` (as fronteiras
+    entre mesorregiões vizinhas continuam coincidindo), arredonda as
+    coordenadas e mantém apenas `coluna_id` como identificador da feature
+    (campo `id`), para uso com `featureidkey="id"`.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)  # Plotly espera longitude/latitude
+    geometrias = shapely.transform(
+        simplificar_cobertura(gdf.geometry.to_numpy(), tolerancia),
+        lambda coords: np.round(coords, casas_decimais),
+    )
+    features = [
+        {"type": "Feature", "id": str(identificador), "properties": {}, "geometry": shapely.geometry.mapping(geometria)}
+        for identificador, geometria in zip(gdf[coluna_id], geometrias)
+        if geometria is not None and not geometria.is_empty
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def contar_vertices(geojson):
+    """Número total de vértices de um GeoJSON (para comparar níveis de simplificação)."""
+    return sum(
+        int(shapely.get_num_coordinates(shapely.geometry.shape(feature["geometry"])))
+        for feature in geojson["features"]
+    )
+
+
+# Níveis de detalhe (LOD) do mapa de municípios: zoom mínimo -> tolerância (graus).
+# Com o estado inteiro na tela (zoom ~5) os 853 contornos ficam bem grosseiros;
+# ao aproximar numa mesorregião, usa-se um nível mais fino.
+NIVEIS_DETALHE = {0: 0.01, 6: 0.004, 8: 0.001}
+
+
+def tolerancia_para_zoom(zoom):
+    """Tolerância de simplificação do nível de detalhe correspondente ao zoom."""
+    return NIVEIS_DETALHE[max(z for z in NIVEIS_DETALHE if z <= max(zoom, 0))]
+
+
+def compactar_geometrias(gdf, coluna_id, tolerancia, casas_decimais=CASAS_DECIMAIS):
+    """
+    Simplifica os polígonos (com `simplificar_cobertura`) e os guarda em
+    arrays (formato "ragged" do shapely).
+
+    Retorna um dict de arrays NumPy, próprio para `np.savez`: `ids`, `tipo`,
+    `coords` (float32, N×2) e `offsets_<i>` (índices de anéis/partes/features).
+    Muito menor e mais rápido de ler que o GeoJSON em texto.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(epsg=4326)
+    geometrias = simplificar_cobertura(gdf.geometry.to_numpy(), tolerancia)
+    validas = ~(shapely.is_missing(geometrias) | shapely.is_empty(geometrias))
+    tipo, coords, offsets = shapely.to_ragged_array(geometrias[validas])
+    compactado = {
+        "ids": gdf[coluna_id].astype(str).to_numpy()[validas],
+        "tipo": np.array(int(tipo)),
+        "coords": np.round(coords, casas_decimais).astype(np.float32),
+    }
+    compactado.update({f"offsets_{i}": o.astype(np.int32) for i, o in enumerate(offsets)})
+    return compactado
+
+
+def geojson_de_compactado(compactado):
+    """Reconstrói o GeoJSON (features com `id`) a partir de `compactar_geometrias`."""
+    n_offsets = sum(1 for chave in compactado if chave.startswith("offsets_"))
+    geometrias = shapely.from_ragged_array(
+        shapely.GeometryType(int(compactado["tipo"])),
+        np.round(compactado["coords"].astype(float), CASAS_DECIMAIS),
+        tuple(compactado[f"offsets_{i}"] for i in range(n_offsets)),
+    )
+    features = [
+        {"type": "Feature", "id": str(identificador), "properties": {}, "geometry": shapely.geometry.mapping(geometria)}
+        for identificador, geometria in zip(compactado["ids"], geometrias)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def enquadrar(geojson, ids=None):
+    """
+    Centro e zoom aproximados para mostrar as features `ids` (ou todas).
+
+    Retorna ({"lat", "lon"}, zoom), para usar direto no `choropleth_mapbox`.
+    """
+    ids = None if ids is None else set(ids)
+    geometrias = [shapely.geometry.shape(f["geometry"]) for f in geojson["features"] if ids is None or f["id"] in ids]
+    if not geometrias:
+        return {"lat": -18.5122, "lon": -44.5550}, 5
+    lon_min, lat_min, lon_max, lat_max = shapely.total_bounds(geometrias)
+    extensao = max(lon_max - lon_min, lat_max - lat_min, 1e-3)
+    zoom = float(np.clip(np.log2(360 / extensao) - 0.8, 3, 12))  # Margem para o mapa não cortar bordas
+    return {"lat": float(lat_min + lat_max) / 2, "lon": float(lon_min + lon_max) / 2}, zoom
@@ -1,11 +1,6 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import os
 import numpy as np
-import geopandas as gpd
-import traceback # Adicionado para melhor log de erro se necessário
 # Assume que estas importações funcionam ou ajusta os fallbacks
 try:
     from extra import variaveis, mesoregiao
@@ -13,16 +8,28 @@ except ImportError:
     variaveis = []
     def mesoregiao(): return pd.DataFrame(columns=['v21', 'Municípios', 'Mesorregião', 'id'])
     st.warning("Módulo 'extra' não carregado. Usando fallbacks.")
+from dados import carregar_resultados_enriquecidos, carregar_indice_resultados, carregar_acuracia_municipios, carregar_mesorregioes, carregar_cubo_acuracia, carregar_histogramas, carregar_matriz_classificacoes, carregar_indice_busca, carregar_geojson_simplificado, carregar_geojson_municipios, carregar_explicacoes, niveis_mapa
+from explicacoes import figura_cascata
+from geometria import TOLERANCIAS_MAPA, TOLERANCIA_MAPA_PADRAO, enquadrar
+from agregacoes import acuracia, fatiar_cubo, tabela_classificacoes
+from busca import seletor_municipios
+from indices import fatiar, valores_indexados
+from instrumentacao import iniciar_rerun, medir, painel_desempenho
+from tardio import importar_tardio
+
+# Dependências pesadas carregadas no primeiro uso (ver tardio.py)
+go = importar_tardio("plotly.graph_objects")
+px = importar_tardio("plotly.express")
 
 
 # --- Configuração Inicial e Constantes ---
 st.set_page_config(page_title="Previsão Financeira Municipal", layout="wide", page_icon="🏙️")
+iniciar_rerun("indicador")
 
 ANOS_INT = [17, 18, 19, 20, 21, 22]
-ANOS_STR = [f"20{ano}" for ano in ANOS_INT] # Lista de anos como string para filtros/labels
+ANOS = [2000 + ano for ano in ANOS_INT] # Anos completos (int), como na coluna 'Ano' dos dados
 CORES_SITUACAO = {'A': '#4B9CD3', 'B': '#FF6B6B'} # Cores para A/B
 CORES_MAPA = 'BuGn' # Escala de cores para o mapa
-GEOJSON_PATH = "pages/MG_Mesorregioes_Contorno.geojson" # Caminho para o GeoJSON
 
 # --- CSS Customizado (Mantido da versão anterior) ---
 CSS = """
@@ -35,82 +42,18 @@ CSS = """
 """
 st.markdown(CSS, unsafe_allow_html=True)
 
-# --- Funções de Carregamento de Dados com Cache (Mantidas da versão anterior) ---
-
-@st.cache_data
-def load_all_data(anos):
-    """Carrega e concatena dados de todos os anos disponíveis."""
-    all_data = []
-    print("Executando load_all_data...") # Log
-    for ano in anos:
-        file_path = os.path.join("resultados", "janela_fixa", str(ano), f"resultado_final{ano}.xlsx")
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_excel(file_path)
-                df['Ano'] = f"20{ano}"; df['acerto'] = df["y_real"] == df["y_previsto"]
-                if 'id' in df.columns: df['id'] = df['id'].astype(str)
-                if 'v21' in df.columns: df['v21'] = df['v21'].astype(str)
-                all_data.append(df)
-            except Exception as e: st.warning(f"Erro ao carregar dados de 20{ano}: {e}")
-        else: st.warning(f"Arquivo não encontrado para 20{ano}: {file_path}")
-    if not all_data: return pd.DataFrame()
-    return pd.concat(all_data, ignore_index=True)
-
-@st.cache_data
-def load_mesoregiao_data():
-    """Carrega e prepara dados de mesoregião."""
-    print("Executando load_mesoregiao_data...") # Log
-    try:
-        df_meso = mesoregiao();
-        if 'v21' in df_meso.columns: df_meso['v21'] = df_meso['v21'].astype(str)
-        if 'id' in df_meso.columns: df_meso['id'] = df_meso['id'].astype(str)
-        return df_meso
-    except Exception as e:
-        st.error(f"Erro ao executar a função mesoregiao(): {e}")
-        return pd.DataFrame(columns=['v21', 'Municípios', 'Mesorregião', 'id'])
-
-@st.cache_data
-def load_geojson(path):
-    """Carrega o arquivo GeoJSON."""
-    print("Executando load_geojson...") # Log
-    if not os.path.exists(path): st.error(f"Arquivo GeoJSON não encontrado: {path}"); return None
-    try: return gpd.read_file(path)
-    except Exception as e: st.error(f"Erro ao carregar GeoJSON: {e}"); return None
-
 # --- Funções de Geração de Gráficos e UI (Mantidas/Recriadas) ---
 
-def create_distribution_chart(df_filtered, variable, title_prefix, year_str):
-    if df_filtered.empty or variable not in df_filtered.columns:
-        return None
-
-    # Remover valores nulos da variável e da classificação
-    df_filtered = df_filtered.dropna(subset=[variable, 'y_real'])
-    if df_filtered.empty:
+@medir("grafico_distribuicao", "figura")
+def create_distribution_chart(histograma, variable, title_prefix, year_str, manter_outliers=False):
+    """Gráfico de distribuição A/B a partir de um histograma pré-calculado (ver `carregar_histogramas`)."""
+    if histograma is None:
         return None
 
-    # Remoção de outliers usando IQR
-    Q1 = df_filtered[variable].quantile(0.25)
-    Q3 = df_filtered[variable].quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 1.5 * IQR
-    upper_bound = Q3 + 1.5 * IQR
-    df_filtered = df_filtered[(df_filtered[variable] >= lower_bound) & (df_filtered[variable] <= upper_bound)]
-    if df_filtered.empty:
-        return None
-
-    # Separar em grupos A e B
-    df_A = df_filtered[df_filtered['y_real'] == 'A']
-    df_B = df_filtered[df_filtered['y_real'] == 'B']
-
-    min_val, max_val = df_filtered[variable].min(), df_filtered[variable].max()
-    if pd.isna(min_val) or pd.isna(max_val) or min_val == max_val:
-        return None
-
-    bins = np.linspace(min_val, max_val, 20)
-    bin_centers = (bins[:-1] + bins[1:]) / 2
-
-    hist_A, _ = np.histogram(df_A[variable].dropna(), bins=bins)
-    hist_B, _ = np.histogram(df_B[variable].dropna(), bins=bins)
+    bin_centers = histograma["centros"]
+    hist_A, hist_B = histograma["hist_A"], histograma["hist_B"]
+    min_val, max_val = histograma["min"], histograma["max"]
+    descricao_outliers = "com outliers" if manter_outliers else "sem outliers"
 
     fig = go.Figure()
     fig.add_trace(go.Bar(
@@ -137,7 +80,7 @@ def create_distribution_chart(df_filtered, variable, title_prefix, year_str):
         annotations=[
             dict(
                 xref='paper', yref='paper', x=1, y=1.05, showarrow=False,
-                text=f'Range {variable} (sem outliers): {min_val:.2f} a {max_val:.2f}',
+                text=f'Range {variable} ({descricao_outliers}): {min_val:.2f} a {max_val:.2f}',
                 font=dict(size=10, color='grey')
             )
         ]
@@ -146,53 +89,46 @@ def create_distribution_chart(df_filtered, variable, title_prefix, year_str):
     fig.update_yaxes(hoverformat='.0f')
     return fig
 
-# Função de formatação da tabela para Tab 2 (Mantida da versão anterior)
-def format_classification_table(df_pivot):
-    def color_text(val_str):
-        if isinstance(val_str, str) and '(' in val_str and ')' in val_str:
-            parts = val_str.split('('); prev = parts[0].strip(); real = parts[1].replace(')', '').strip()
-            if prev in ['A', 'B'] and real in ['A', 'B']:
-                color = 'green' if real == prev else 'red'; return f'color: {color}; font-weight: bold;'
-        return ''
-    styled_df = df_pivot.style.map(color_text); return styled_df
-
 # Função create_metrics RECRiada para Tab 3 original
-def create_metrics(df_acertos_tab3, mesoregioes_selecionadas_tab3):
-    """Cria métricas de resumo para a Tab 3 (versão original)."""
-    # Certifica que df_acertos_tab3 não está vazio e tem as colunas necessárias
-    if df_acertos_tab3.empty or 'acerto' not in df_acertos_tab3.columns or 'Ano' not in df_acertos_tab3.columns:
+def create_metrics(cubo_tab3, mesoregioes_selecionadas_tab3):
+    """Cria métricas de resumo para a Tab 3 a partir das células do cubo de acurácia."""
+    # Certifica que o recorte do cubo não está vazio e tem as colunas necessárias
+    if cubo_tab3.empty or 'acertos' not in cubo_tab3.columns or 'Ano' not in cubo_tab3.columns:
         st.warning("Dados insuficientes para calcular métricas de acurácia.")
         return
 
     col1, col2, col3 = st.columns(3)
     with col1:
         # Usa o número de mesoregiões únicas presentes nos *dados filtrados*
-        mesos_nos_dados = df_acertos_tab3['Mesorregião'].nunique() if 'Mesorregião' in df_acertos_tab3.columns else 0
+        mesos_nos_dados = cubo_tab3['Mesorregião'].nunique() if 'Mesorregião' in cubo_tab3.columns else 0
         st.metric("Mesorregiões Analisadas", mesos_nos_dados)
     with col2:
-        media_geral = df_acertos_tab3['acerto'].mean()
+        media_geral = acuracia(cubo_tab3)
         st.metric("Acurácia Média Geral", f"{media_geral:.1%}" if pd.notna(media_geral) else "N/A")
     with col3:
-        ultimo_ano_disponivel = df_acertos_tab3['Ano'].max()
+        ultimo_ano_disponivel = cubo_tab3['Ano'].max()
         if pd.notna(ultimo_ano_disponivel):
-            media_ultimo = df_acertos_tab3[df_acertos_tab3['Ano'] == ultimo_ano_disponivel]['acerto'].mean()
+            media_ultimo = acuracia(fatiar_cubo(cubo_tab3, Ano=ultimo_ano_disponivel))
             st.metric(f"Acurácia Média ({ultimo_ano_disponivel})", f"{media_ultimo:.1%}" if pd.notna(media_ultimo) else "N/A")
         else:
             st.metric("Acurácia Último Ano", "N/A")
 
 
 # Função para Mapa (Tab 4 - Atualizada com escala fixa)
-def create_map_chart(gdf_merged, year_str):
-    if gdf_merged is None or gdf_merged.empty or 'Acerto (%)' not in gdf_merged.columns: 
+@medir("mapa_mesorregioes", "figura")
+def create_map_chart(df_acuracia, geojson_mapa, year_str):
+    """Choropleth da acurácia por mesorregião sobre o GeoJSON simplificado (features por `id`)."""
+    if df_acuracia is None or df_acuracia.empty or 'Acerto (%)' not in df_acuracia.columns or geojson_mapa is None:
         return None
 
     fig = px.choropleth_mapbox(
-        gdf_merged, 
-        geojson=gdf_merged.geometry, 
-        locations=gdf_merged.index, 
+        df_acuracia, 
+        geojson=geojson_mapa, 
+        locations='Mesorregião', 
+        featureidkey='id', 
         color='Acerto (%)', 
-        hover_name='Nome_Mesorregiao', 
-        hover_data={'Acerto (%)': ':.1f'}, 
+        hover_name='Mesorregião', 
+        hover_data={'Acerto (%)': ':.1f', 'Mesorregião': False}, 
         color_continuous_scale=CORES_MAPA, 
         range_color=(50, 100),  # <- Escala fixa entre 50% e 100%
         mapbox_style="carto-positron", 
@@ -205,6 +141,7 @@ def create_map_chart(gdf_merged, year_str):
     fig.update_layout(
         title=f"Acurácia Média por Mesorregião - {year_str}", 
         margin={"r":0,"t":40,"l":0,"b":0},
+        uirevision="mapa_acuracia",  # Mantém zoom/posição entre reruns
         coloraxis_colorbar=dict(
             title="Acurácia (%)", 
             tickvals=np.linspace(50, 100, 5),  # <- Ticks também fixos
@@ -218,60 +155,50 @@ def create_map_chart(gdf_merged, year_str):
 
     return fig
 
-# --- Carregamento Principal e Merge (Mantido da versão anterior) ---
-all_df = load_all_data(ANOS_INT)
-df_meso = load_mesoregiao_data()
-geojson_data = load_geojson(GEOJSON_PATH)
-
-# Adiciona informações de mesoregião aos dados principais (se possível)
-if not all_df.empty and not df_meso.empty and 'v21' in all_df.columns and 'v21' in df_meso.columns:
-    # Garante que 'Mesorregião' e 'Municípios' não sejam duplicadas se já existirem em all_df
-    # Define as colunas potenciais a serem trazidas de df_meso
-    potential_cols_from_meso = ['v21', 'Municípios', 'Mesorregião', 'id']
-    # Filtra pelas colunas que realmente existem em df_meso
-    cols_available_in_meso = [col for col in potential_cols_from_meso if col in df_meso.columns]
-
-    # Identifica quais dessas colunas (exceto a chave 'v21') já existem em all_df
-    cols_already_in_all_df = [
-        col for col in cols_available_in_meso
-        if col in all_df.columns and col != 'v21'
-    ]
-
-    # Define as colunas finais a serem selecionadas de df_meso para o merge:
-    # Inclui a chave 'v21' e as colunas disponíveis que NÃO estão já em all_df
-    cols_to_select_for_merge = ['v21'] + [
-        col for col in cols_available_in_meso
-        if col != 'v21' and col not in cols_already_in_all_df
-    ]
-
-    # Só faz o merge se houver alguma coluna NOVA a ser adicionada (além da chave 'v21')
-    if len(cols_to_select_for_merge) > 1:
-        print(f"Colunas a serem selecionadas de df_meso para merge: {cols_to_select_for_merge}") # Log útil
-        try:
-            # Prepara o lado direito do merge: seleciona colunas e garante unicidade da chave 'v21'
-            df_meso_subset = df_meso[cols_to_select_for_merge].drop_duplicates(subset=['v21'])
-
-            # Realiza o merge
-            all_df = pd.merge(
-                all_df,
-                df_meso_subset, # Usa o subset preparado
-                on="v21",       # Chave do merge
-                how="left"      # Mantém todas as linhas de all_df
-            )
-            print("Merge com df_meso realizado com sucesso.") # Log
-        except Exception as e:
-            st.warning(f"Erro ao mesclar dados de mesoregião: {e}")
-            print(f"Traceback do erro de merge: {traceback.format_exc()}") # Log detalhado
-    else:
-        print("Nenhuma coluna nova para mesclar de df_meso.") # Log
-
-# Fallbacks se o merge falhou ou não aconteceu (mantido igual)
-if 'Mesorregião' not in all_df.columns: all_df['Mesorregião'] = 'Desconhecida'
-if 'Municípios' not in all_df.columns:
-    if not df_meso.empty and 'id' in all_df.columns and 'id' in df_meso.columns and 'Municípios' in df_meso.columns:
-        id_to_municipio = df_meso.set_index('id')['Municípios'].to_dict()
-        all_df['Municípios'] = all_df['id'].map(id_to_municipio).fillna('Desconhecido')
-    else: all_df['Municípios'] = 'Desconhecido'
+# Função para Mapa de Municípios (Tab 4)
+@medir("mapa_municipios", "figura")
+def create_municipio_map_chart(df_municipios, geojson_mapa, centro, zoom, titulo):
+    """
+    Choropleth da acurácia por município (código IBGE como `id` da feature).
+
+    As features e a ordem de `locations` são fixas para um nível de detalhe;
+    entre reruns só o vetor `z` (cores) muda, e `uirevision` preserva a vista.
+    """
+    if df_municipios is None or df_municipios.empty or geojson_mapa is None:
+        return None
+
+    fig = go.Figure(go.Choroplethmapbox(
+        geojson=geojson_mapa,
+        featureidkey='id',
+        locations=df_municipios['id'],
+        z=df_municipios['Acerto (%)'],
+        text=df_municipios['Municípios'],
+        customdata=df_municipios[['Acertos', 'Anos']],
+        coloraxis='coloraxis',
+        marker_opacity=0.75,
+        marker_line_width=0.3,
+        hovertemplate="<b>%{text}</b><br>Acurácia: %{z:.0f}% (%{customdata[0]} de %{customdata[1]} anos)<extra></extra>",
+    ))
+    fig.update_layout(
+        title=titulo,
+        mapbox=dict(style="carto-positron", center=centro, zoom=zoom),
+        margin={"r":0,"t":40,"l":0,"b":0},
+        uirevision="mapa_municipios",
+        coloraxis=dict(colorscale=CORES_MAPA, cmin=0, cmax=100,
+                       colorbar=dict(title="Acurácia (%)", tickformat=".0f")),
+    )
+    return fig
+
+# --- Carregamento Principal ---
+# Resultados já enriquecidos (mesorregião, município, porte), compartilhados entre sessões
+all_df = carregar_resultados_enriquecidos(ANOS_INT)
+indice_resultados = carregar_indice_resultados(ANOS_INT)  # Fatias por ano/mesorregião/município
+df_meso = carregar_mesorregioes()
+cubo_acuracia = carregar_cubo_acuracia(ANOS_INT)
+explicacoes_resultados = carregar_explicacoes(ANOS_INT)  # Contribuições por variável do modelo de referência
+matriz_classificacoes = carregar_matriz_classificacoes(ANOS_INT)  # Município × ano, em códigos (Tab 2)
+indice_busca = carregar_indice_busca()  # Busca de municípios por nome/código IBGE (Tab 2)
+acuracia_municipios = carregar_acuracia_municipios(ANOS_INT)  # Acertos/anos por município, chave = id do GeoJSON (Tab 4)
 
 
 # --- Interface Principal ---
@@ -293,15 +220,21 @@ else:
         st.subheader("Distribuição de Variável por Situação (A/B)")
         col1_t1, col2_t1 = st.columns(2)
         with col1_t1:
-            selected_year_t1 = st.selectbox("Selecione o Ano:", options=ANOS_STR, index=len(ANOS_STR)-1, key='year_tab1', help="Ano dos dados a serem visualizados.")
+            selected_year_t1 = st.selectbox("Selecione o Ano:", options=ANOS, index=len(ANOS)-1, key='year_tab1', help="Ano dos dados a serem visualizados.")
         with col2_t1:
             if variaveis: selected_variable_t1 = st.selectbox("Selecione a Variável:", options=variaveis, index=0, key='var_tab1', help="Variável a ser analisada na distribuição.")
             else: st.warning("Nenhuma variável disponível para seleção."); selected_variable_t1 = None
 
-        df_year_t1 = all_df[all_df['Ano'] == selected_year_t1].copy()
-        if not df_year_t1.empty and selected_variable_t1:
+        col3_t1, col4_t1 = st.columns(2)
+        with col3_t1:
+            n_bins_t1 = st.slider("Número de faixas:", min_value=5, max_value=60, value=19, key='bins_tab1', help="Quantidade de faixas (barras) do histograma.")
+        with col4_t1:
+            manter_outliers_t1 = st.checkbox("Manter outliers", value=False, key='outliers_tab1', help="Se desmarcado, remove valores fora de 1,5 × IQR.")
+
+        histogramas_t1 = carregar_histogramas(ANOS_INT, n_bins_t1, manter_outliers_t1)
+        if selected_variable_t1 and (selected_year_t1, selected_variable_t1) in histogramas_t1:
             with st.spinner(f"Gerando gráfico de distribuição para {selected_variable_t1} em {selected_year_t1}..."):
-                fig_dist = create_distribution_chart(df_year_t1, selected_variable_t1, f"Distribuição de '{selected_variable_t1}'", selected_year_t1)
+                fig_dist = create_distribution_chart(histogramas_t1[(selected_year_t1, selected_variable_t1)], selected_variable_t1, f"Distribuição de '{selected_variable_t1}'", selected_year_t1, manter_outliers_t1)
                 if fig_dist: st.plotly_chart(fig_dist, use_container_width=True)
         elif selected_variable_t1: st.warning(f"Não há dados disponíveis para o ano {selected_year_t1}.")
 
@@ -310,17 +243,16 @@ else:
         st.subheader("Evolução Histórica por Município")
         st.markdown("Acompanhe a evolução de uma variável e a classificação (prevista vs. real) para os municípios selecionados ao longo dos anos.")
 
-        municipios_disponiveis_t2 = sorted(all_df['Municípios'].unique()) if 'Municípios' in all_df.columns else []
+        municipios_disponiveis_t2 = valores_indexados(indice_resultados, 'Municípios')
         if not municipios_disponiveis_t2:
             st.warning("Nenhum nome de município disponível.")
             selected_municipios_t2 = []
         else:
-            selected_municipios_t2 = st.multiselect(
-                 "Selecione um ou mais Municípios:",
-                 options=municipios_disponiveis_t2,
-                 # Removido default para não poluir inicialmente
-                 key='municipios_tab2_reverted',
-                 help="Digite para buscar ou selecione na lista."
+            selected_municipios_t2 = seletor_municipios(
+                 indice_busca, "Selecione um ou mais Municípios:", municipios_disponiveis_t2,
+                 # Sem seleção padrão para não poluir inicialmente
+                 chave='municipios_tab2_reverted',
+                 ajuda="Use a busca acima (sem acentos ou pelo código IBGE) ou adicione uma mesorregião/porte inteiro."
              )
 
         if not selected_municipios_t2:
@@ -337,50 +269,78 @@ else:
                  st.warning("Lista de variáveis não disponível.")
                  selected_variable_t2 = None
 
-            # Filtrar o DataFrame GERAL `all_df` pelos municípios selecionados
-            # Este substitui o loop e concatenação da versão original
-            df_final_t2 = all_df[all_df['Municípios'].isin(selected_municipios_t2)].copy()
+            # Linhas dos municípios selecionados, direto do índice (sem varrer `all_df`)
+            with medir("fatiar_municipios"):
+                df_final_t2 = fatiar(indice_resultados, 'Municípios', selected_municipios_t2)
 
             if not df_final_t2.empty and selected_variable_t2:
                 # Gerar gráfico de evolução (usando Plotly Express diretamente como na versão original)
                 with st.spinner(f"Gerando gráfico de evolução para {selected_variable_t2}..."):
                     try:
-                         fig_evol_t2 = px.line(
-                             df_final_t2.sort_values('Ano'), # Garante ordem correta
-                             x="Ano", y=selected_variable_t2,
-                             color="Municípios", # Usa a coluna que já veio do merge
-                             markers=True, line_shape='spline',
-                             title=f"Evolução de '{selected_variable_t2}' por Município"
-                         )
+                         with medir("grafico_evolucao_municipios", "figura"):
+                             fig_evol_t2 = px.line(
+                                 df_final_t2.sort_values('Ano'), # Garante ordem correta
+                                 x="Ano", y=selected_variable_t2,
+                                 color="Municípios", # Usa a coluna que já veio do merge
+                                 markers=True, line_shape='spline',
+                                 title=f"Evolução de '{selected_variable_t2}' por Município"
+                             )
+                             fig_evol_t2.update_xaxes(dtick=1) # 'Ano' é inteiro: um tick por ano
                          st.plotly_chart(fig_evol_t2, use_container_width=True)
                     except Exception as e:
                          st.error(f"Erro ao gerar gráfico de evolução: {e}")
 
-                # Tabela de Classificações (lógica da versão original mantida)
-                st.markdown("---")
-                st.subheader("Histórico de Classificações")
-                st.markdown("Valores mostram `Previsto (Real)`. <span style='color:green; font-weight:bold;'>Verde</span> indica acerto, <span style='color:red; font-weight:bold;'>Vermelho</span> indica erro.", unsafe_allow_html=True)
-
-                with st.spinner("Gerando tabela de classificações..."):
-                    try:
-                        df_pivot_t2 = df_final_t2.pivot_table(
-                            index='Municípios', columns='Ano',
-                            values=['y_real', 'y_previsto'], aggfunc='first'
-                        )
-                        df_formatted_t2 = pd.DataFrame(index=df_pivot_t2.index)
-                        for ano in ANOS_STR:
-                            col_real = ('y_real', ano); col_prev = ('y_previsto', ano)
-                            if col_real in df_pivot_t2.columns and col_prev in df_pivot_t2.columns:
-                                df_formatted_t2[ano] = (df_pivot_t2[col_prev].fillna('-').astype(str) + " (" + df_pivot_t2[col_real].fillna('-').astype(str) + ")")
-                            else: df_formatted_t2[ano] = "N/A"
-
-                        styled_table = format_classification_table(df_formatted_t2)
-                        st.dataframe(styled_table, use_container_width=True, height=min(400, (len(selected_municipios_t2) + 1) * 35 + 3))
-                    except Exception as e: st.error(f"Erro ao gerar tabela de classificações: {e}")
-
             elif not selected_variable_t2: pass # Aviso já dado
             else: st.warning("Nenhum dado encontrado para os municípios selecionados.")
 
+        # Histórico de classificações: rótulos montados da matriz pré-calculada (ver carregar_matriz_classificacoes)
+        st.markdown("---")
+        st.subheader("Histórico de Classificações")
+        todos_t2 = st.checkbox("Mostrar todos os municípios", key='todos_historico_tab2',
+                               help="Lista o histórico de todos os municípios, não só dos selecionados.")
+        if matriz_classificacoes is None:
+            st.warning("Classificações não disponíveis.")
+        elif todos_t2 or selected_municipios_t2:
+            st.markdown("Valores mostram `Previsto (Real)`. 🟢 indica acerto, 🔴 indica erro; "
+                        "`Acerto` é a fração de anos em que a previsão coincidiu com a classe real.")
+            with medir("tabela_classificacoes"):
+                tabela_t2 = tabela_classificacoes(matriz_classificacoes, None if todos_t2 else selected_municipios_t2)
+            # st.dataframe já desenha só as linhas visíveis: a tabela com todos os municípios rola sem custo extra
+            st.dataframe(tabela_t2, use_container_width=True, height=min(400, (len(tabela_t2) + 1) * 35 + 3),
+                         column_config={"Acerto": st.column_config.ProgressColumn("Acerto", format="percent",
+                                                                                  min_value=0, max_value=1)})
+
+        # Explicação local de uma previsão (contribuições pré-calculadas por um modelo refeito, ver explicacoes.py)
+        if selected_municipios_t2 and not df_final_t2.empty:
+            st.markdown("---")
+            st.subheader("Explicação por um modelo de referência")
+            st.caption("Os modelos que geraram as previsões publicadas não foram guardados. As contribuições abaixo "
+                       "vêm de um modelo de referência refeito com o mesmo procedimento de treino e só são mostradas "
+                       "quando ele chega à classe publicada; a média e a probabilidade da cascata são as desse modelo.")
+            if explicacoes_resultados.empty:
+                st.info("Explicações do modelo de referência ainda não geradas (execute `python explicacoes.py`).")
+            else:
+                col1_exp, col2_exp = st.columns(2)
+                with col1_exp:
+                    municipio_exp_t2 = st.selectbox("Município:", options=selected_municipios_t2, key='municipio_explicacao_tab2')
+                linhas_exp_t2 = df_final_t2[df_final_t2['Municípios'] == municipio_exp_t2]
+                with col2_exp:
+                    ano_exp_t2 = st.selectbox("Ano:", options=sorted(linhas_exp_t2['Ano'].unique(), reverse=True), key='ano_explicacao_tab2')
+                linha_exp_t2 = linhas_exp_t2[linhas_exp_t2['Ano'] == ano_exp_t2].iloc[0]
+                chave_exp_t2 = (ano_exp_t2, linha_exp_t2['id'])
+                explicacao_t2 = explicacoes_resultados.loc[chave_exp_t2] if chave_exp_t2 in explicacoes_resultados.index else None
+                # Só explica a decisão que está na tela: uma explicação de outra classe seria de outro modelo
+                if explicacao_t2 is None or str(explicacao_t2['classe_prevista']) != str(linha_exp_t2['y_previsto']):
+                    st.info(f"Sem explicação para a previsão de {municipio_exp_t2} em {ano_exp_t2}: o modelo "
+                            "de referência não chega à classe publicada neste caso.")
+                else:
+                    with medir("cascata_explicacao", "figura"):
+                        fig_exp_t2 = figura_cascata(explicacao_t2, [v for v in variaveis if v in explicacao_t2.index],
+                                                    f"Contribuição de cada variável no modelo de referência - {municipio_exp_t2} ({ano_exp_t2})")
+                    st.plotly_chart(fig_exp_t2, use_container_width=True)
+                    st.caption("Cada barra mostra quanto a variável afastou a probabilidade da média do modelo de "
+                               "referência, seguindo os caminhos das árvores até a previsão.")
+
 
     # --- Tab 3: Assertividade (Lógica Revertida/Adaptada) ---
     with tab3:
@@ -388,7 +348,7 @@ else:
         st.markdown("Avalie a taxa de acerto do modelo ao longo do tempo para as mesorregiões selecionadas.")
 
         # Seleção de Mesorregiões (lógica da versão original)
-        meso_disponiveis_t3 = sorted(all_df['Mesorregião'].unique()) if 'Mesorregião' in all_df.columns else []
+        meso_disponiveis_t3 = valores_indexados(indice_resultados, 'Mesorregião')
         if not meso_disponiveis_t3 or 'Desconhecida' in meso_disponiveis_t3:
              st.warning("Nomes de mesorregião não disponíveis ou inválidos.")
              selected_meso_t3 = []
@@ -404,28 +364,30 @@ else:
         if not selected_meso_t3:
             st.info("Selecione pelo menos uma mesorregião.")
         else:
-            # Filtrar o DataFrame GERAL `all_df` pelas mesorregiões selecionadas
-            # Este substitui o loop e concatenação da versão original
-            df_acertos_t3 = all_df[all_df['Mesorregião'].isin(selected_meso_t3)].copy()
+            # Recorte do cubo de acurácia pré-agregado (janela fixa, mesorregiões selecionadas)
+            cubo_t3 = fatiar_cubo(cubo_acuracia, Janela="janela_fixa", **{"Mesorregião": selected_meso_t3})
 
-            if not df_acertos_t3.empty:
+            if not cubo_t3.empty:
                 # Usar a função create_metrics recriada
-                create_metrics(df_acertos_t3, selected_meso_t3)
+                create_metrics(cubo_t3, selected_meso_t3)
 
-                # Gráfico de Assertividade (lógica de groupby da versão original)
+                # Gráfico de Assertividade (agregação das células do cubo)
                 with st.spinner("Gerando gráfico de Acurácia..."):
                     try:
-                        assertividade_plot_df = df_acertos_t3.groupby(['Mesorregião', 'Ano'])['acerto'].mean().reset_index()
-                        assertividade_plot_df.rename(columns={'acerto': 'Taxa de Acerto'}, inplace=True) # Renomeia para label
-
-                        fig_assert_t3 = px.line(
-                            assertividade_plot_df.sort_values('Ano'),
-                            x="Ano", y="Taxa de Acerto", color="Mesorregião",
-                            markers=True, # Adiciona marcadores como na original
-                            title="Acurácia Média por Mesorregião",
-                            labels={'Taxa de Acerto': 'Taxa de Acerto', 'Ano': 'Ano'}
-                         )
-                        fig_assert_t3.update_yaxes(tickformat=".0%") # Formato percentual
+                        with medir("acuracia_mesorregiao_ano"):
+                            assertividade_plot_df = acuracia(cubo_t3, por=['Mesorregião', 'Ano'])
+                            assertividade_plot_df.rename(columns={'acerto': 'Taxa de Acerto'}, inplace=True) # Renomeia para label
+
+                        with medir("grafico_acuracia", "figura"):
+                            fig_assert_t3 = px.line(
+                                assertividade_plot_df.sort_values('Ano'),
+                                x="Ano", y="Taxa de Acerto", color="Mesorregião",
+                                markers=True, # Adiciona marcadores como na original
+                                title="Acurácia Média por Mesorregião",
+                                labels={'Taxa de Acerto': 'Taxa de Acerto', 'Ano': 'Ano'}
+                             )
+                            fig_assert_t3.update_yaxes(tickformat=".0%") # Formato percentual
+                            fig_assert_t3.update_xaxes(dtick=1) # 'Ano' é inteiro: um tick por ano
                         st.plotly_chart(fig_assert_t3, use_container_width=True)
                     except Exception as e:
                         st.error(f"Erro ao gerar gráfico de assertividade: {e}")
@@ -435,21 +397,65 @@ else:
 
     # --- Tab 4: Mapa de Assertividade (Mantida da versão anterior) ---
     with tab4:
-        st.subheader("Mapa de Acurácia Média por Mesorregião")
-        st.markdown("Visualize a distribuição geográfica da taxa média de acerto do modelo em um ano específico.")
-        selected_year_t4 = st.selectbox("Selecione o Ano para o Mapa:", options=ANOS_STR, index=len(ANOS_STR)-1, key='year_tab4')
-
-        if geojson_data is None: st.error("Dados geográficos não carregados. Mapa indisponível.")
+        st.subheader("Mapa de Acurácia Média")
+        niveis_t4 = niveis_mapa()  # Sem a malha municipal, só o mapa por mesorregião
+        nivel_t4 = st.radio("Nível do mapa:", niveis_t4, horizontal=True, key='nivel_tab4') if len(niveis_t4) > 1 else niveis_t4[0]
+
+        if nivel_t4 == "Mesorregião":
+            st.markdown("Visualize a distribuição geográfica da taxa média de acerto do modelo em um ano específico.")
+            col1_t4, col2_t4 = st.columns(2)
+            with col1_t4:
+                selected_year_t4 = st.selectbox("Selecione o Ano para o Mapa:", options=ANOS, index=len(ANOS)-1, key='year_tab4')
+            with col2_t4:
+                detalhe_t4 = st.select_slider("Detalhe do contorno:", options=list(TOLERANCIAS_MAPA), value=TOLERANCIA_MAPA_PADRAO, key='detalhe_tab4', help="Contornos mais simples deixam o mapa mais leve.")
+            geojson_mapa_t4 = carregar_geojson_simplificado(TOLERANCIAS_MAPA[detalhe_t4])
+
+            if geojson_mapa_t4 is None: st.error("Dados geográficos não carregados. Mapa indisponível.")
+            else:
+                cubo_t4 = fatiar_cubo(cubo_acuracia, Janela="janela_fixa", Ano=selected_year_t4)
+                if not cubo_t4.empty:
+                    with medir("acuracia_mesorregiao"):
+                        assertividade_media_ano = acuracia(cubo_t4, por="Mesorregião")
+                        assertividade_media_ano["Acerto (%)"] = assertividade_media_ano["acerto"] * 100
+                        # Uma linha por feature do GeoJSON; mesorregiões sem dados ficam com 0 (como antes)
+                        ids_mapa = [feature["id"] for feature in geojson_mapa_t4["features"]]
+                        df_mapa_t4 = (assertividade_media_ano.set_index("Mesorregião")[["Acerto (%)"]]
+                                      .reindex(ids_mapa).fillna(0).rename_axis("Mesorregião").reset_index())
+                    with st.spinner("Gerando mapa de Acurácia..."):
+                        fig_map = create_map_chart(df_mapa_t4, geojson_mapa_t4, selected_year_t4)
+                        if fig_map: st.plotly_chart(fig_map, use_container_width=True)
+                else: st.warning(f"Não há dados de classificação ou mesorregião para {selected_year_t4}.")
         else:
-            df_year_t4 = all_df[all_df['Ano'] == selected_year_t4].copy()
-            if not df_year_t4.empty and 'Mesorregião' in df_year_t4.columns:
-                assertividade_media_ano = df_year_t4.groupby("Mesorregião")["acerto"].mean().reset_index()
-                assertividade_media_ano["Acerto (%)"] = assertividade_media_ano["acerto"] * 100
-                if 'Nome_Mesorregiao' in geojson_data.columns:
-                     gdf_merged_t4 = geojson_data.merge(assertividade_media_ano[['Mesorregião', 'Acerto (%)']], left_on="Nome_Mesorregiao", right_on="Mesorregião", how="left")
-                     gdf_merged_t4['Acerto (%)'].fillna(0, inplace=True)
-                     with st.spinner("Gerando mapa de Acurácia..."):
-                         fig_map = create_map_chart(gdf_merged_t4, selected_year_t4)
-                         if fig_map: st.plotly_chart(fig_map, use_container_width=True)
-                else: st.error("Coluna 'Nome_Mesorregiao' não encontrada no GeoJSON.")
-            else: st.warning(f"Não há dados de classificação ou mesorregião para {selected_year_t4}.")
+            st.markdown("Acurácia de cada município no período (fração dos anos classificados corretamente). "
+                        "Aproxime numa mesorregião para ver contornos mais detalhados.")
+            opcoes_regiao_t4 = ["Minas Gerais"] + (sorted(df_meso['Mesorregião'].dropna().unique()) if 'Mesorregião' in df_meso.columns else [])
+            regiao_t4 = st.selectbox("Região:", options=opcoes_regiao_t4, key='regiao_tab4')
+
+            # Nível de detalhe: contornos grosseiros para o estado, finos ao aproximar
+            geojson_estado_t4 = carregar_geojson_municipios(zoom=5)
+            if geojson_estado_t4 is None: st.error("Malha municipal não carregada. Mapa de municípios indisponível.")
+            elif acuracia_municipios.empty: st.warning("Não há dados de classificação para os municípios.")
+            else:
+                ids_regiao_t4 = None
+                if regiao_t4 != "Minas Gerais":
+                    ids_regiao_t4 = set(df_meso.loc[df_meso['Mesorregião'] == regiao_t4, 'id'].astype(str))
+                centro_t4, zoom_t4 = enquadrar(geojson_estado_t4, ids_regiao_t4)
+                geojson_mapa_t4 = carregar_geojson_municipios(zoom=zoom_t4)
+                if ids_regiao_t4 is not None:
+                    geojson_mapa_t4 = {"type": "FeatureCollection",
+                                       "features": [f for f in geojson_mapa_t4["features"] if f["id"] in ids_regiao_t4]}
+
+                with medir("acuracia_municipios"):
+                    # Só seleciona as linhas das features do mapa; a acurácia já vem calculada do cache
+                    ids_mapa = [feature["id"] for feature in geojson_mapa_t4["features"]]
+                    df_municipios_t4 = acuracia_municipios.reindex(ids_mapa).rename_axis('id').reset_index()
+                    df_municipios_t4 = df_municipios_t4.dropna(subset=['Anos'])
+                    df_municipios_t4['Municípios'] = df_municipios_t4['Municípios'].fillna(df_municipios_t4['id'])
+
+                with st.spinner("Gerando mapa de municípios..."):
+                    fig_map = create_municipio_map_chart(df_municipios_t4, geojson_mapa_t4, centro_t4, zoom_t4,
+                                                         f"Acurácia por Município - {regiao_t4} ({ANOS[0]}-{ANOS[-1]})")
+                    if fig_map: st.plotly_chart(fig_map, use_container_width=True)
+                    else: st.warning("Nenhum município do mapa possui dados de classificação.")
+
+painel_desempenho()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+# Contas contábeis informadas na simulação, agrupadas como no formulário
+GRUPOS_CONTABEIS = {
+    "📈 Receitas": [
+        "receita_total", "receita_propria",
+        "receita_transferencias", "populacao",
+        "receita_corrente_liquida"
+    ],
+    "📉 Despesas": [
+        "despesa_total", "despesa_com_pessoal",
+        "gastos_operacionais"
+    ],
+    "💼 Ativos": [
+        "disponibilidade_caixa", "ativo_circulante"
+    ],
+    "📋 Passivos": [
+        "obrigacoes_curto_prazo", "divida_consolidada",
+        "operacoes_credito"
+    ]
+}
+CAMPOS_CONTABEIS = [campo for campos in GRUPOS_CONTABEIS.values() for campo in campos]
+
+
+# Colunas produzidas, na mesma ordem do dicionário da simulação individual:
+# a RCL informada seguida das variáveis do modelo (`extra.variaveis`)
+INDICADORES = [
+    "receita_corrente_liquida",
+    "receita_per_capita",
+    "representatividade_da_receita_propria",
+    "participacao_das_receitas_de_transferencias",
+    "participacao_dos_gastos_operacionais",
+    "cobertura_de_despesas",
+    "recursos_para_cobertura_de_queda_de_arrecadacao",
+    "recursos_para_cobertura_de_obrigacoes_de_curto_prazo",
+    "comprometimento_das_receitas_correntes_com_as_obrigacoes_de_curto_prazo",
+    "divida_per_capita",
+    "comprometimento_das_receitas_correntes_com_o_endividamento",
+    "Despesa com pessoal",
+    "Dívida Consolidada",
+    "Operações de crédito",
+    "poupanca_corrente",
+    "liquidez_relativa",
+    "indicador_de_liquidez",
+    "endividamento"
+]
+
+
+def _dividir(numerador, denominador):
+    """
+    Divisão mascarada: retorna 0 onde o denominador é 0.
+
+    Reproduz `a / b if b != 0 else 0` elemento a elemento, inclusive para
+    denominadores NaN (NaN != 0, logo o resultado é NaN).
+    """
+    resultado = np.zeros(np.broadcast(numerador, denominador).shape)
+    np.divide(numerador, denominador, out=resultado, where=denominador != 0)
+    return resultado
+
+
+def _colunas(entradas):
+    """
+    Extrai as contas contábeis como arrays float64 de mesmo tamanho.
+
+    Aceita DataFrame, array estruturado do NumPy ou dict (de escalares ou
+    arrays). Contas ausentes valem 0, como no `dados.get(campo, 0)` original.
+    """
+    if isinstance(entradas, pd.DataFrame):
+        nomes, obter = entradas.columns, lambda c: pd.to_numeric(entradas[c], errors="coerce").to_numpy(dtype=float)
+        n = len(entradas)
+    elif isinstance(entradas, np.ndarray) and entradas.dtype.names:
+        nomes, obter = entradas.dtype.names, lambda c: entradas[c].astype(float)
+        n = len(entradas)
+    else:
+        nomes, obter = entradas.keys(), lambda c: np.atleast_1d(np.asarray(entradas[c], dtype=float))
+        n = max((np.size(entradas[c]) for c in CAMPOS_CONTABEIS if c in entradas), default=1)
+    return {
+        campo: np.broadcast_to(obter(campo), (n,)) if campo in nomes else np.zeros(n)
+        for campo in CAMPOS_CONTABEIS
+    }
+
+
+def calcular_matriz_indicadores(entradas):
+    """
+    Calcula os indicadores de N cenários e retorna uma matriz (N, len(INDICADORES)).
+
+    Versão sem pandas, usada pelos caminhos em lote (sensibilidade, serviço).
+    """
+    c = _colunas(entradas)
+    populacao = c["populacao"]
+    populacao_div = np.where(populacao > 0, populacao, 1.0)
+    receita_total = c["receita_total"]
+    despesa_total = c["despesa_total"]
+    rcl = c["receita_corrente_liquida"]
+    disponibilidade_caixa = c["disponibilidade_caixa"]
+    obrigacoes_curto_prazo = c["obrigacoes_curto_prazo"]
+    divida_consolidada = c["divida_consolidada"]
+    operacoes_credito = c["operacoes_credito"]
+
+    return np.column_stack([
+        rcl,
+        receita_total / populacao_div,
+        _dividir(c["receita_propria"], receita_total),
+        _dividir(c["receita_transferencias"], receita_total),
+        _dividir(c["gastos_operacionais"], despesa_total),
+        _dividir(receita_total, despesa_total),
+        _dividir(disponibilidade_caixa, receita_total),
+        _dividir(disponibilidade_caixa, obrigacoes_curto_prazo),
+        _dividir(obrigacoes_curto_prazo, rcl),
+        divida_consolidada / populacao_div,
+        _dividir(divida_consolidada, rcl),
+        c["despesa_com_pessoal"],
+        divida_consolidada,
+        operacoes_credito,
+        receita_total - despesa_total,
+        _dividir(obrigacoes_curto_prazo, disponibilidade_caixa),
+        _dividir(c["ativo_circulante"], obrigacoes_curto_prazo),
+        _dividir(divida_consolidada + operacoes_credito, rcl),
+    ])
+
+
+def calcular_indicadores_lote(entradas):
+    """
+    Calcula os indicadores de vários cenários de uma só vez.
+
+    `entradas` é um DataFrame, array estruturado ou dict de arrays com as
+    colunas de `CAMPOS_CONTABEIS`. Retorna um DataFrame com as colunas de
+    `INDICADORES` (preservando o índice quando `entradas` é um DataFrame).
+    """
+    indice = entradas.index if isinstance(entradas, pd.DataFrame) else None
+    return pd.DataFrame(calcular_matriz_indicadores(entradas), columns=INDICADORES, index=indice)
+
+
+def contas_e_indicadores(entradas):
+    """
+    Contas de `CAMPOS_CONTABEIS` e indicadores de todos os cenários de
+    `entradas` (DataFrame), sem colunas repetidas: 'receita_corrente_liquida'
+    é conta e indicador, e fica o indicador. É a entrada de `previsao.prever_lote`.
+    """
+    indicadores = calcular_indicadores_lote(entradas)
+    return pd.concat([entradas[CAMPOS_CONTABEIS].drop(columns=indicadores.columns, errors="ignore"), indicadores], axis=1)
+
+
+def calcular_indicadores(dados):
+    """Indicadores de um único cenário (dict de contas -> dict de indicadores)."""
+    linha = calcular_matriz_indicadores({campo: dados.get(campo, 0) for campo in CAMPOS_CONTABEIS})[0]
+    return {nome: valor.item() for nome, valor in zip(INDICADORES, linha)}
@@ -0,0 +1,53 @@
+import numpy as np
+
+# Colunas indexadas por padrão nos resultados
+COLUNAS_INDICE = ["Ano", "Mesorregião", "Municípios"]
+
+
+def construir_indice(df, colunas=COLUNAS_INDICE):
+    """
+    Monta índices de fatias para consultas por valor de coluna.
+
+    Guarda `df` uma única vez (sem cópias ordenadas) e, para cada coluna, uma
+    permutação int32 das linhas que as agrupa por valor (estável: dentro de
+    um valor, as linhas ficam na ordem de `df`) e o bloco [inicio, fim) de
+    cada valor nessa permutação. Retorna um dict {"dados": df, "colunas":
+    {coluna: {"ordem": permutacao, "blocos": {valor: (inicio, fim)}}}}.
+    Valores ausentes (NaN) não são indexados.
+    """
+    indice = {"dados": df, "colunas": {}}
+    for coluna in colunas:
+        if coluna not in df.columns:
+            continue
+        posicoes = df.groupby(coluna, observed=True, sort=False).indices
+        valores = sorted(posicoes)
+        ordem = np.concatenate([posicoes[v] for v in valores]).astype(np.int32) if valores else np.array([], dtype=np.int32)
+        fins = np.cumsum([len(posicoes[v]) for v in valores])
+        indice["colunas"][coluna] = {
+            "ordem": ordem,
+            "blocos": {valor: (int(fim) - len(posicoes[valor]), int(fim)) for valor, fim in zip(valores, fins)},
+        }
+    return indice
+
+
+def fatiar(indice, coluna, valores):
+    """
+    Linhas cujo valor em `coluna` é `valores` (um valor ou uma lista).
+
+    As linhas são tiradas da tabela compartilhada com `take` pelas posições
+    do bloco de cada valor (vários valores saem na ordem dos valores). O custo
+    é proporcional ao número de linhas retornadas, não ao tamanho da tabela.
+    """
+    ordem, blocos = indice["colunas"][coluna]["ordem"], indice["colunas"][coluna]["blocos"]
+    if not isinstance(valores, (list, tuple, set)):
+        inicio, fim = blocos.get(valores, (0, 0))
+        return indice["dados"].take(ordem[inicio:fim])
+
+    faixas = sorted(blocos[valor] for valor in set(valores) if valor in blocos)
+    posicoes = np.concatenate([ordem[inicio:fim] for inicio, fim in faixas]) if faixas else np.array([], dtype=np.int32)
+    return indice["dados"].take(posicoes)
+
+
+def valores_indexados(indice, coluna):
+    """Valores distintos de `coluna` presentes no índice, em ordem."""
+    return sorted(indice["colunas"][coluna]["blocos"]) if coluna in indice["colunas"] else []
@@ -0,0 +1,216 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from armazenamento import PASTA_CACHE
+
+# Instrumentação leve das páginas: trechos cronometrados (carregadores,
+# cálculos, figuras, previsões, importações tardias), acertos/faltas dos caches e o total de cada
+# rerun. Os números saem em três lugares:
+# - log estruturado (uma linha JSON por evento, logger "desempenho"; o nível
+#   vem de INSTRUMENTACAO_NIVEL, padrão INFO; em DEBUG sai cada trecho);
+# - arquivo de texto no formato do Prometheus, um por processo, em
+#   `.cache_dados/prometheus/` (para o textfile collector do node_exporter);
+# - expander "⏱ Perf" no fim de cada página, visível com `?perf=1` na URL
+#   ou INSTRUMENTACAO_PAINEL=1.
+PASTA_PROMETHEUS = os.path.join(PASTA_CACHE, "prometheus")
+INTERVALO_PROMETHEUS = 5.0  # Segundos mínimos entre gravações do arquivo
+LIMITES_HISTOGRAMA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("desempenho")
+if not logger.handlers:
+    _saida = logging.StreamHandler(sys.stdout)
+    _saida.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_saida)
+    logger.setLevel(os.environ.get("INSTRUMENTACAO_NIVEL", "INFO").upper())
+    logger.propagate = False
+
+_trava = threading.Lock()
+_duracoes = {}  # (categoria, nome) -> {"n", "soma", "baldes"}
+_contadores = {}  # (métrica, rótulos ordenados) -> valor
+_local = threading.local()  # Trechos do rerun em andamento e pilha de carregadores (por sessão/thread)
+_ultima_gravacao = [0.0]
+
+
+def _log(nivel, evento, **campos):
+    if logger.isEnabledFor(nivel):
+        logger.log(nivel, json.dumps({"evento": evento, **campos}, ensure_ascii=False, default=str))
+
+
+def _incrementar(metrica, valor=1, **rotulos):
+    chave = (metrica, tuple(sorted(rotulos.items())))
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def _registrar_duracao(categoria, nome, segundos):
+    with _trava:
+        estatistica = _duracoes.setdefault((categoria, nome), {"n": 0, "soma": 0.0, "baldes": [0] * len(LIMITES_HISTOGRAMA)})
+        estatistica["n"] += 1
+        estatistica["soma"] += segundos
+        for i, limite in enumerate(LIMITES_HISTOGRAMA):
+            if segundos <= limite:
+                estatistica["baldes"][i] += 1
+    trechos = getattr(_local, "trechos", None)
+    if trechos is not None:
+        trechos.append({"categoria": categoria, "nome": nome, "ms": segundos * 1e3})
+    _log(logging.DEBUG, "trecho", categoria=categoria, nome=nome, ms=round(segundos * 1e3, 3))
+
+
+@contextlib.contextmanager
+def medir(nome, categoria="calculo"):
+    """Cronometra o bloco `with` como um trecho (`categoria`: carregador, calculo, figura, previsao...)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar_duracao(categoria, nome, time.perf_counter() - inicio)
+
+
+def instrumentar_carregador(nome):
+    """
+    Decorador para as funções públicas de carregamento: cronometra a chamada
+    e conta acerto ou falta de cache. A função cacheada chamada por dentro
+    deve chamar `registrar_falta_cache(nome)` quando de fato executar.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            pilha = _local.__dict__.setdefault("carregadores", [])
+            pilha.append(set())
+            try:
+                with medir(nome, "carregador"):
+                    return funcao(*args, **kwargs)
+            finally:
+                faltas = pilha.pop()
+                if pilha:
+                    pilha[-1].update(faltas)
+                _incrementar("app_cache_acessos_total", nome=nome, resultado="falta" if nome in faltas else "acerto")
+        return envolvida
+    return decorador
+
+
+def registrar_falta_cache(nome, **detalhes):
+    """Chamado dentro das funções cacheadas: o cache não tinha o valor e ele está sendo calculado."""
+    for faltas in getattr(_local, "carregadores", []):
+        faltas.add(nome)
+    _incrementar("app_cache_execucoes_total", nome=nome)
+    _log(logging.INFO, "cache_falta", nome=nome, **detalhes)
+
+
+def registrar_aviso(evento, **detalhes):
+    """Situação anormal que não interrompe a página (ex.: um fallback): log WARNING e contador por evento."""
+    _incrementar("app_avisos_total", evento=evento)
+    _log(logging.WARNING, evento, **detalhes)
+
+
+def iniciar_rerun(pagina):
+    """Marca o início da execução de uma página (zera os trechos da sessão atual)."""
+    _local.pagina = pagina
+    _local.inicio_rerun = time.perf_counter()
+    _local.trechos = []
+
+
+def finalizar_rerun():
+    """
+    Registra o total do rerun, registra o resumo no log e atualiza o arquivo
+    do Prometheus. Retorna (total em ms, trechos do rerun).
+    """
+    pagina = getattr(_local, "pagina", None)
+    if pagina is None:
+        return 0.0, []
+    total = time.perf_counter() - _local.inicio_rerun
+    trechos = _local.trechos
+    _local.pagina, _local.trechos = None, None
+    _registrar_duracao("rerun", pagina, total)
+    _log(logging.INFO, "rerun", pagina=pagina, ms=round(total * 1e3, 1), trechos=len(trechos),
+         mais_lentos=[(t["nome"], round(t["ms"], 1)) for t in sorted(trechos, key=lambda t: -t["ms"])[:3]])
+    if time.monotonic() - _ultima_gravacao[0] >= INTERVALO_PROMETHEUS:
+        try:
+            gravar_prometheus()
+        except OSError as e:
+            _log(logging.WARNING, "prometheus_erro", erro=str(e))
+    return total * 1e3, trechos
+
+
+def _rotulos(**rotulos):
+    return ",".join(f'{chave}="{str(valor)}"' for chave, valor in rotulos.items())
+
+
+def exportar_prometheus():
+    """Texto no formato de exposição do Prometheus com todos os trechos e contadores do processo."""
+    pid = os.getpid()
+    linhas = ["# HELP app_duracao_segundos Duração dos trechos instrumentados.",
+              "# TYPE app_duracao_segundos histogram"]
+    with _trava:
+        duracoes = {chave: {**valor, "baldes": list(valor["baldes"])} for chave, valor in _duracoes.items()}
+        contadores = dict(_contadores)
+    for (categoria, nome), estatistica in sorted(duracoes.items()):
+        for limite, n in zip(LIMITES_HISTOGRAMA, estatistica["baldes"]):
+            linhas.append(f"app_duracao_segundos_bucket{{{_rotulos(pid=pid, categoria=categoria, nome=nome, le=limite)}}} {n}")
+        linhas.append(f"app_duracao_segundos_bucket{{{_rotulos(pid=pid, categoria=categoria, nome=nome, le='+Inf')}}} {estatistica['n']}")
+        linhas.append(f"app_duracao_segundos_sum{{{_rotulos(pid=pid, categoria=categoria, nome=nome)}}} {estatistica['soma']:.6f}")
+        linhas.append(f"app_duracao_segundos_count{{{_rotulos(pid=pid, categoria=categoria, nome=nome)}}} {estatistica['n']}")
+    for metrica in sorted({m for m, _ in contadores}):
+        linhas.append(f"# TYPE {metrica} counter")
+        for (m, rotulos), valor in sorted(contadores.items()):
+            if m == metrica:
+                linhas.append(f"{metrica}{{{_rotulos(pid=pid, **dict(rotulos))}}} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+def gravar_prometheus(pasta=PASTA_PROMETHEUS):
+    """Grava `exportar_prometheus()` em `<pasta>/streamlit_<pid>.prom` (troca atômica)."""
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"streamlit_{os.getpid()}.prom")
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(exportar_prometheus())
+    os.replace(temporario, caminho)
+    _ultima_gravacao[0] = time.monotonic()
+    return caminho
+
+
+def resumo_cache():
+    """Acertos e faltas por carregador: lista de dicts (nome, acertos, faltas, execucoes)."""
+    with _trava:
+        contadores = dict(_contadores)
+    nomes = {dict(rotulos)["nome"] for (m, rotulos) in contadores if m.startswith("app_cache_")}
+    resumo = []
+    for nome in sorted(nomes):
+        def valor(metrica, **extra):
+            return contadores.get((metrica, tuple(sorted({"nome": nome, **extra}.items()))), 0)
+        resumo.append({"nome": nome, "acertos": valor("app_cache_acessos_total", resultado="acerto"),
+                       "faltas": valor("app_cache_acessos_total", resultado="falta"),
+                       "execucoes": valor("app_cache_execucoes_total")})
+    return resumo
+
+
+def painel_desempenho():
+    """
+    Finaliza o rerun e, se habilitado (`?perf=1` ou INSTRUMENTACAO_PAINEL=1),
+    mostra o expander "⏱ Perf" com os trechos deste rerun e os caches do processo.
+    Chamar no fim da página.
+    """
+    import pandas as pd
+    import streamlit as st
+
+    total_ms, trechos = finalizar_rerun()
+    if os.environ.get("INSTRUMENTACAO_PAINEL") != "1" and st.query_params.get("perf") != "1":
+        return
+    with st.expander("⏱ Perf"):
+        instrumentado = sum(t["ms"] for t in trechos if t["categoria"] not in ("carregador", "importacao"))
+        importacoes = sum(t["ms"] for t in trechos if t["categoria"] == "importacao")
+        st.caption(f"Rerun: {total_ms:.0f} ms · {len(trechos)} trechos · cálculos/figuras/previsões: {instrumentado:.0f} ms"
+                   + (f" · importações tardias: {importacoes:.0f} ms" if importacoes else ""))
+        if trechos:
+            st.dataframe(pd.DataFrame(trechos).sort_values("ms", ascending=False), hide_index=True,
+                         column_config={"ms": st.column_config.NumberColumn("ms", format="%.1f")})
+        cache = resumo_cache()
+        if cache:
+            st.dataframe(pd.DataFrame(cache), hide_index=True)
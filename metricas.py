@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+
+import pandas as pd
+import streamlit as st
+
+from armazenamento import PASTA_CACHE, PYARROW_DISPONIVEL
+from dados import ANOS_INT, PASTA_RESULTADOS, PREFIXOS_JANELA, assinatura_arquivos
+from instrumentacao import instrumentar_carregador, registrar_aviso, registrar_falta_cache
+
+# Tabela única (formato longo) com as métricas de todas as janelas e anos.
+# Compile com `python metricas.py` após gerar novos resultados (ex.: no deploy);
+# a página do modelo só lê a tabela e, se ela faltar ou estiver desatualizada,
+# compila na hora.
+PASTA_METRICAS = os.path.join(PASTA_CACHE, "metricas")
+ARQUIVO_TABELA = os.path.join(PASTA_METRICAS, "metricas.parquet")
+ARQUIVO_MANIFESTO = os.path.join(PASTA_METRICAS, "manifesto.json")
+
+LINHAS_CLASSIFICACAO = ['A', 'B', 'accuracy']
+METRICAS_CLASSIFICACAO = ['precision', 'recall', 'f1-score', 'support']
+# Imagens geradas no treino, por tipo: nome base do arquivo
+IMAGENS = {"arvore": "arvore", "importancias": "feature_importances", "perda": "loss"}
+
+
+def _caminho(janela, ano, nome_base, extensao):
+    prefixo = PREFIXOS_JANELA[janela]
+    return os.path.join(PASTA_RESULTADOS, janela, str(ano), f"{prefixo}{nome_base}{ano}.{extensao}")
+
+
+def _ler_classificacao(caminho):
+    """Linhas A/B/accuracy do classification_report, no formato longo (Item, Metrica, Valor)."""
+    df = pd.read_excel(caminho, index_col=0)
+    df.index = df.index.map(str)
+    df = df.loc[df.index.intersection(LINHAS_CLASSIFICACAO), [m for m in METRICAS_CLASSIFICACAO if m in df.columns]]
+    longo = df.rename_axis("Item").reset_index().melt(id_vars="Item", var_name="Metrica", value_name="Valor")
+    longo["Valor"] = pd.to_numeric(longo["Valor"].astype(str).str.replace(',', '.', regex=False), errors="coerce")
+    return longo
+
+
+def _ler_importancias(caminho):
+    df = pd.read_excel(caminho)
+    return pd.DataFrame({"Item": df["feature"].astype(str), "Metrica": "importance",
+                         "Valor": pd.to_numeric(df["importance"], errors="coerce")})
+
+
+def _ler_perda(caminho):
+    df = pd.read_excel(caminho)
+    return (df.rename(columns={"max_depth": "Item"}).astype({"Item": str})
+            .melt(id_vars="Item", var_name="Metrica", value_name="Valor"))
+
+
+# Planilhas compiladas: artefato -> (nome base do arquivo, leitor)
+PLANILHAS = {
+    "classificacao": ("classification_report", _ler_classificacao),
+    "importancia": ("feature_importances", _ler_importancias),
+    "perda": ("loss_curve", _ler_perda),
+}
+
+
+def _fontes(anos):
+    """Caminhos de todas as planilhas e imagens esperadas (existentes ou não)."""
+    return [
+        _caminho(janela, ano, nome_base, extensao)
+        for janela in PREFIXOS_JANELA for ano in anos
+        for nome_base, extensao in [(n, "xlsx") for n, _ in PLANILHAS.values()] + [(n, "png") for n in IMAGENS.values()]
+    ]
+
+
+def compilar_metricas(anos=ANOS_INT):
+    """
+    Lê todas as planilhas de métricas e monta (tabela, manifesto).
+
+    A tabela tem uma linha por (Janela, Ano, Artefato, Item, Metrica) com o
+    `Valor` numérico; o manifesto guarda os caminhos das imagens por janela e
+    ano e a versão (mtime/tamanho) das fontes usadas.
+    """
+    partes, erros = [], []
+    artefatos = {janela: {} for janela in PREFIXOS_JANELA}
+    for janela in PREFIXOS_JANELA:
+        for ano in anos:
+            for artefato, (nome_base, ler) in PLANILHAS.items():
+                caminho = _caminho(janela, ano, nome_base, "xlsx")
+                if not os.path.exists(caminho):
+                    continue
+                try:
+                    parte = ler(caminho)
+                except Exception as e:
+                    erros.append(f"{caminho}: {e}")
+                    continue
+                partes.append(parte.assign(Janela=janela, Ano=2000 + ano, Artefato=artefato))
+            imagens = {tipo: _caminho(janela, ano, nome_base, "png") for tipo, nome_base in IMAGENS.items()}
+            artefatos[janela][str(2000 + ano)] = {tipo: caminho for tipo, caminho in imagens.items() if os.path.exists(caminho)}
+
+    colunas = ["Janela", "Ano", "Artefato", "Item", "Metrica", "Valor"]
+    tabela = pd.concat(partes, ignore_index=True)[colunas] if partes else pd.DataFrame(columns=colunas)
+    tabela = tabela.dropna(subset=["Valor"]).astype({
+        "Janela": "category", "Ano": "int16", "Artefato": "category",
+        "Item": "category", "Metrica": "category", "Valor": "float64",
+    })
+    manifesto = {
+        "anos": list(anos),
+        "versao": [list(item) for item in assinatura_arquivos(*_fontes(anos))],
+        "artefatos": artefatos,
+        "erros": erros,
+    }
+    return tabela.sort_values(["Artefato", "Janela", "Ano"], ignore_index=True), manifesto
+
+
+def salvar_metricas(tabela, manifesto):
+    """Grava a tabela (Parquet) e o manifesto em `.cache_dados/metricas/`."""
+    os.makedirs(PASTA_METRICAS, exist_ok=True)
+    temporario = f"{ARQUIVO_TABELA}.{os.getpid()}.tmp"
+    tabela.to_parquet(temporario, index=False)
+    os.replace(temporario, ARQUIVO_TABELA)
+    temporario = f"{ARQUIVO_MANIFESTO}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=1, ensure_ascii=False)
+    os.replace(temporario, ARQUIVO_MANIFESTO)
+
+
+def _ler_compiladas(anos, versao):
+    """Tabela e manifesto compilados, ou None se ausentes ou com outra `versao` das fontes."""
+    if not (PYARROW_DISPONIVEL and os.path.exists(ARQUIVO_TABELA) and os.path.exists(ARQUIVO_MANIFESTO)):
+        return None
+    try:
+        with open(ARQUIVO_MANIFESTO, encoding="utf-8") as f:
+            manifesto = json.load(f)
+        if manifesto.get("versao") != [list(item) for item in versao]:
+            return None
+        return pd.read_parquet(ARQUIVO_TABELA), manifesto
+    except (OSError, ValueError):
+        return None
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _metricas_compartilhadas(anos, versao):
+    """Lê a tabela compilada (ou compila e grava, se ausente ou desatualizada)."""
+    registrar_falta_cache("carregar_metricas")
+    compiladas = _ler_compiladas(anos, versao)
+    if compiladas is not None:
+        return compiladas
+    tabela, manifesto = compilar_metricas(anos)
+    if PYARROW_DISPONIVEL:
+        try:
+            salvar_metricas(tabela, manifesto)
+        except OSError as e:
+            registrar_aviso("metricas_nao_gravadas", erro=str(e))
+    return tabela, manifesto
+
+
+@instrumentar_carregador("carregar_metricas")
+def carregar_metricas(anos=ANOS_INT):
+    """
+    (tabela, manifesto) das métricas do modelo, lidos uma vez por versão das
+    planilhas e imagens de origem: um artefato novo ou regravado é
+    percebido na próxima chamada, sem reiniciar o processo.
+
+    A tabela e o manifesto são compartilhados e não devem ser alterados.
+    """
+    anos = tuple(anos)
+    return _metricas_compartilhadas(anos, assinatura_arquivos(*_fontes(anos)))
+
+
+if __name__ == "__main__":
+    tabela, manifesto = compilar_metricas()
+    salvar_metricas(tabela, manifesto)
+    print(f"{len(tabela)} linhas de métricas gravadas em {ARQUIVO_TABELA}")
+    for erro in manifesto["erros"]:
+        print(f"Erro: {erro}", file=sys.stderr)
+    sys.exit(1 if manifesto["erros"] else 0)
@@ -1,56 +1,37 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import os
-import geopandas as gpd
 import traceback # Para logs de erro
-import glob # Para encontrar os arquivos de receita dinamicamente
 
 # Assumindo que 'extra' está acessível
 try:
-    from extra import variaveis, mesoregiao
+    from extra import variaveis
     EXTRA_MODULO_DISPONIVEL = True
 except ImportError:
     st.warning("Módulo 'extra' não encontrado. Algumas funcionalidades podem ser limitadas ou usar dados de fallback.")
     variaveis = [] # Fallback para lista de variáveis
-    # Função dummy para mesoregiao para evitar erros fatais se 'extra' falhar
-    def mesoregiao():
-        # Tenta carregar 'mesoregiao.xlsx' localmente como fallback
-        if os.path.exists("Mesorregiao.xlsx"):
-            try:
-                df = pd.read_excel("Mesorregiao.xlsx")
-                # Garante colunas esperadas, mesmo que vazias
-                if 'id' not in df.columns: df['id'] = None
-                if 'Municípios' not in df.columns: df['Municípios'] = "Nome Indisponível"
-                if 'Mesorregião' not in df.columns: df['Mesorregião'] = "Mesorregião Indisponível"
-                if 'v21' not in df.columns: # v21 é usado para o mapa
-                    # Tenta criar um v21 a partir do ID da mesoregião se possível ou um placeholder
-                    # Esta parte pode precisar de ajuste dependendo da estrutura real do seu mesoregiao.xlsx
-                    if 'IDMesorregiao' in df.columns: # Exemplo, ajuste conforme necessário
-                         df['v21'] = df['IDMesorregiao'].astype(str)
-                    else:
-                         df['v21'] = df['id'].astype(str) # Fallback muito básico
-                return df
-            except Exception as e_fallback:
-                st.error(f"Erro ao carregar 'mesoregiao.xlsx' como fallback: {e_fallback}")
-                return pd.DataFrame(columns=['v21', 'Municípios', 'Mesorregião', 'id'])
-        else:
-            st.error("'mesoregiao.xlsx' não encontrado localmente para fallback.")
-            return pd.DataFrame(columns=['v21', 'Municípios', 'Mesorregião', 'id'])
     EXTRA_MODULO_DISPONIVEL = False
+from dados import carregar_resultados, carregar_indice_resultados, carregar_painel_receitas, carregar_mesorregioes, carregar_indice_busca, carregar_geojson_simplificado, carregar_geojson_municipios, niveis_mapa
+from busca import seletor_municipios
+from geometria import enquadrar
+from indices import fatiar, valores_indexados
+from instrumentacao import iniciar_rerun, medir, painel_desempenho
+from tardio import importar_tardio
+
+# Dependências pesadas carregadas no primeiro uso (ver tardio.py)
+px = importar_tardio("plotly.express")
+go = importar_tardio("plotly.graph_objects")
 
 
 # --- Configuração Inicial e Constantes ---
 st.set_page_config(page_title="Comparativo Municipal e Regional", layout="wide", page_icon="📊")
+iniciar_rerun("benchmark")
 
 # Constantes para Benchmark/Mapa
 ANOS_INT_BENCHMARK = [17, 18, 19, 20, 21, 22]
-ANOS_STR_BENCHMARK = [f"20{ano}" for ano in ANOS_INT_BENCHMARK]
-GEOJSON_PATH = "pages/MG_Mesorregioes_Contorno.geojson" # Confirme este caminho
+ANOS_BENCHMARK = [2000 + ano for ano in ANOS_INT_BENCHMARK] # Anos completos (int), como na coluna 'Ano' dos dados
 CORES_MAPA = 'Viridis'
 
 # Constantes para Receitas
-REVENUE_FILES_PATTERN = "receitas_anuais_dca_*.xlsx" # Padrão para encontrar arquivos de receita
 MUNICIPIOS_INFO_FILE = "mesoregiao.xlsx" # Usado pela parte de receitas se o 'extra.mesoregiao' não for adequado ou para garantir consistência
 
 # --- CSS (Opcional) ---
@@ -65,139 +46,15 @@ st.markdown(CSS, unsafe_allow_html=True)
 
 # --- Funções de Carregamento de Dados com Cache ---
 
-# Funções do Benchmark
-@st.cache_data
-def load_benchmark_data(anos):
-    """Carrega e concatena dados de resultado_final de todos os anos disponíveis."""
-    all_data = []
-    # st.write("Debug: Carregando dados de benchmark...") # Para depuração
-    for ano in anos:
-        file_path = os.path.join("resultados", "janela_fixa", str(ano), f"resultado_final{ano}.xlsx")
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_excel(file_path)
-                df['Ano'] = f"20{ano}"
-                if 'id' in df.columns: df['id'] = df['id'].astype(str)
-                if 'v21' in df.columns: df['v21'] = df['v21'].astype(str)
-                all_data.append(df)
-            except Exception as e:
-                st.warning(f"Erro ao carregar dados de benchmark de 20{ano}: {e}")
-        else:
-            st.warning(f"Arquivo de benchmark não encontrado para 20{ano}: {file_path}")
-    if not all_data: return pd.DataFrame()
-    return pd.concat(all_data, ignore_index=True)
-
-@st.cache_data
-def load_mesoregiao_info():
-    """Carrega e prepara dados de mesoregião (de 'extra' ou fallback)."""
-    # st.write("Debug: Carregando dados de mesoregião...") # Para depuração
-    try:
-        df_meso = mesoregiao() # Chama a função definida no início (do 'extra' ou fallback)
-        # Garante que as colunas 'id' e 'v21' sejam strings
-        if 'id' in df_meso.columns:
-            df_meso['id'] = df_meso['id'].astype(str)
-        else:
-            st.error("Coluna 'id' não encontrada nos dados de mesoregião.")
-            df_meso['id'] = None # Adiciona coluna vazia para evitar erros posteriores
-
-        if 'v21' in df_meso.columns:
-            df_meso['v21'] = df_meso['v21'].astype(str)
-        elif 'id' in df_meso.columns: # Fallback: se v21 não existe, usa id como v21 para o mapa (pode não ser ideal)
-            st.warning("Coluna 'v21' não encontrada nos dados de mesoregião. Usando 'id' como substituto para 'v21'.")
-            df_meso['v21'] = df_meso['id'].astype(str)
-        else:
-            st.error("Colunas 'v21' e 'id' não encontradas nos dados de mesoregião.")
-            df_meso['v21'] = None
-
-        if 'Municípios' not in df_meso.columns:
-            st.error("Coluna 'Municípios' não encontrada nos dados de mesoregião.")
-            df_meso['Municípios'] = "Nome Indisponível"
-
-        if 'Mesorregião' not in df_meso.columns:
-            st.warning("Coluna 'Mesorregião' não encontrada nos dados de mesoregião.")
-            df_meso['Mesorregião'] = "Mesorregião Indisponível"
-
-        return df_meso
-    except Exception as e:
-        st.error(f"Erro crítico ao carregar dados de mesoregião: {e}")
-        return pd.DataFrame(columns=['v21', 'Municípios', 'Mesorregião', 'id'])
-
-
-@st.cache_data
-def load_geojson_map_data(path):
-    """Carrega o arquivo GeoJSON."""
-    # st.write("Debug: Carregando GeoJSON...") # Para depuração
-    if not os.path.exists(path): st.error(f"Arquivo GeoJSON não encontrado: {path}"); return None
-    try: return gpd.read_file(path)
-    except Exception as e: st.error(f"Erro ao carregar GeoJSON: {e}"); return None
-
-# Funções para a Aba de Receitas
-@st.cache_data
-def load_all_revenue_data(file_pattern):
-    """Carrega, combina e processa os arquivos de receita encontrados na pasta."""
-    revenue_files = glob.glob(file_pattern)
-    if not revenue_files:
-        st.warning(f"Nenhum arquivo de receita encontrado com o padrão: {file_pattern} na pasta atual.")
-        return pd.DataFrame()
-
-    all_dfs = []
-    # st.sidebar.write("Arquivos de receita encontrados:") # Removido da sidebar para não poluir
-    for filepath in revenue_files:
-        # st.sidebar.caption(f"- {os.path.basename(filepath)}")
-        try:
-            df = pd.read_excel(filepath)
-            if 'Ano' not in df.columns:
-                try:
-                    filename = os.path.basename(filepath)
-                    year_from_filename = filename.split('_')[-1].split('.')[0]
-                    df['Ano'] = int(year_from_filename)
-                except Exception:
-                    st.warning(f"Não foi possível determinar o ano para o arquivo {filename}. Pulando este arquivo.")
-                    continue
-            
-            # A coluna de ID do município nos arquivos de receita deve ser 'IBGE'
-            if 'IBGE' not in df.columns:
-                st.warning(f"Arquivo {os.path.basename(filepath)} não contém a coluna 'IBGE'. Pulando este arquivo.")
-                continue
-            df['IBGE'] = df['IBGE'].astype(str)
-            all_dfs.append(df)
-        except Exception as e:
-            st.error(f"Erro ao carregar o arquivo de receita {os.path.basename(filepath)}: {e}")
-            continue
-
-    if not all_dfs:
-        return pd.DataFrame()
-
-    combined_df = pd.concat(all_dfs, ignore_index=True)
-    
-    # Colunas de receita esperadas
-    revenue_cols_expected = ['IPTU', 'ISSQN', 'ITBI', 'FPM', 'ICMS (Cota-Parte)', 'IPVA (Cota-Parte)']
-    base_cols = ['IBGE', 'Ano']
-    
-    existing_revenue_cols = [col for col in revenue_cols_expected if col in combined_df.columns]
-    if not existing_revenue_cols:
-        st.error("Nenhuma das colunas de receita esperadas (IPTU, ISSQN, etc.) foi encontrada nos arquivos de receita carregados.")
-        return pd.DataFrame()
-        
-    final_cols_to_select = base_cols + existing_revenue_cols
-    
-    # Verifica se as colunas base existem
-    for col in base_cols:
-        if col not in combined_df.columns:
-            st.error(f"Coluna obrigatória '{col}' ausente nos dados de receita combinados.")
-            return pd.DataFrame()
-
-    return combined_df[final_cols_to_select]
-
-
 # --- Funções Auxiliares (Benchmark/Mapa) ---
-def merge_data_for_map(benchmark_df, mesoregiao_df, geojson_gdf, selected_year, selected_variable):
-    """Filtra dados do ano, calcula média por mesoregião e faz merge com GeoJSON."""
-    if benchmark_df.empty or selected_variable not in benchmark_df.columns:
+@medir("media_mesorregiao")
+def merge_data_for_map(indice_benchmark, mesoregiao_df, geojson_mapa, selected_year, selected_variable):
+    """Seleciona os dados do ano (pelo índice), calcula média por mesoregião e alinha com as features do GeoJSON simplificado."""
+    if 'Ano' not in indice_benchmark['colunas'] or selected_variable not in indice_benchmark['dados'].columns:
         st.warning(f"Dados de benchmark ou variável '{selected_variable}' indisponíveis para o mapa.")
         return None, None
 
-    df_year = benchmark_df[benchmark_df['Ano'] == selected_year].copy()
+    df_year = fatiar(indice_benchmark, 'Ano', selected_year)
     if df_year.empty:
         st.warning(f"Nenhum dado de benchmark encontrado para o ano {selected_year}.")
         return None, None
@@ -207,10 +64,10 @@ def merge_data_for_map(benchmark_df, mesoregiao_df, geojson_gdf, selected_year,
          return None, None
 
     # Calcula média da variável por v21 (código da mesoregião)
-    # Assegura que a variável selecionada seja numérica para a média
+    # Assegura que a variável selecionada seja numérica para a média (numa cópia local: os dados são compartilhados)
     if not pd.api.types.is_numeric_dtype(df_year[selected_variable]):
         try:
-            df_year[selected_variable] = pd.to_numeric(df_year[selected_variable], errors='coerce')
+            df_year = df_year.assign(**{selected_variable: pd.to_numeric(df_year[selected_variable], errors='coerce')})
         except Exception as e:
             st.error(f"Não foi possível converter a variável '{selected_variable}' para numérica: {e}")
             return None, None
@@ -231,50 +88,43 @@ def merge_data_for_map(benchmark_df, mesoregiao_df, geojson_gdf, selected_year,
             on="v21", how="left"
         )
         # Se 'Mesorregião' ainda tiver NaNs após o merge (v21 não encontrado em mesoregiao_df)
-        variavel_meso_avg['Mesorregião'].fillna('ID ' + variavel_meso_avg['v21'].astype(str), inplace=True)
+        variavel_meso_avg['Mesorregião'] = variavel_meso_avg['Mesorregião'].fillna('ID ' + variavel_meso_avg['v21'].astype(str))
     else:
         st.warning("Não foi possível adicionar nomes das mesorregiões (dados de 'mesoregiao_info' ausentes ou incompletos).")
         variavel_meso_avg['Mesorregião'] = 'ID ' + variavel_meso_avg['v21'].astype(str)
 
-    if geojson_gdf is None or 'Nome_Mesorregiao' not in geojson_gdf.columns:
+    if geojson_mapa is None:
         st.error("GeoJSON não carregado ou não contém a coluna 'Nome_Mesorregiao'.")
         return None, None
 
     coluna_media = f"Média {selected_variable}"
     variavel_meso_avg.rename(columns={selected_variable: coluna_media}, inplace=True)
 
-    # Merge com o GeoJSON
-    # Certifique-se que a coluna de merge no geojson_gdf (Nome_Mesorregiao) e em variavel_meso_avg (Mesorregião)
-    # tenham correspondência. Pode ser necessário normalizar os nomes.
-    gdf_merged = geojson_gdf.merge(
-        variavel_meso_avg[['Mesorregião', coluna_media]], # Seleciona apenas as colunas necessárias
-        left_on="Nome_Mesorregiao",
-        right_on="Mesorregião",
-        how="left"
-    )
+    # Uma linha por feature do GeoJSON (id = Nome_Mesorregiao). Certifique-se que os nomes
+    # do GeoJSON e de 'Mesorregião' tenham correspondência. Pode ser necessário normalizá-los.
+    ids_mapa = [feature["id"] for feature in geojson_mapa["features"]]
+    df_mapa = (variavel_meso_avg.drop_duplicates(subset=['Mesorregião']).set_index('Mesorregião')[[coluna_media]]
+               .reindex(ids_mapa).rename_axis('Mesorregião').reset_index())
     # Preenche NaNs na coluna de média (mesorregiões no mapa sem dados) com um valor neutro ou o mínimo
     # para que ainda apareçam no mapa com alguma cor.
-    if coluna_media in gdf_merged.columns:
-        min_val = gdf_merged[coluna_media].min() if not gdf_merged[coluna_media].dropna().empty else 0
-        gdf_merged[coluna_media].fillna(min_val, inplace=True)
-    else: # Se a coluna_media não foi criada por algum motivo
-        st.warning(f"Coluna '{coluna_media}' não encontrada no GeoDataFrame após o merge.")
-        return None, None
-
+    min_val = df_mapa[coluna_media].min() if not df_mapa[coluna_media].dropna().empty else 0
+    df_mapa[coluna_media] = df_mapa[coluna_media].fillna(min_val)
 
-    return gdf_merged, coluna_media
+    return df_mapa, coluna_media
 
 
 # --- Interface Principal ---
 st.title("📊 Comparativo Municipal e Regional 🗺️")
 
 # Carrega dados essenciais uma vez
-df_benchmark_all = load_benchmark_data(ANOS_INT_BENCHMARK)
-df_mesoregiao_geral = load_mesoregiao_info() # Carrega de 'extra' ou fallback
-gdf_geojson = load_geojson_map_data(GEOJSON_PATH)
+df_benchmark_all = carregar_resultados(ANOS_INT_BENCHMARK)
+indice_benchmark = carregar_indice_resultados(ANOS_INT_BENCHMARK) # Fatias por ano, sem varrer a tabela
+df_mesoregiao_geral = carregar_mesorregioes() # Carrega de 'extra' ou fallback
+geojson_mapa = carregar_geojson_simplificado()
 
-# Carrega dados de receita para a segunda aba
-df_revenues_all = load_all_revenue_data(REVENUE_FILES_PATTERN)
+# Painel de receitas (formato longo, já com nomes) indexado por município para a primeira aba
+painel_receitas = carregar_painel_receitas()
+indice_busca = carregar_indice_busca() # Busca de municípios por nome/código IBGE, compartilhada com o indicador
 
 
 # Abas
@@ -283,103 +133,61 @@ tab_receitas, tab_mapa  = st.tabs(["📈 Comparativo de Receitas Municipais",
 ])
 # --- Tab 1: Comparativo de Receitas Municipais ---
 with tab_receitas:
-    df_benchmark_all = load_benchmark_data(ANOS_INT_BENCHMARK)
-    df_mesoregiao_geral = load_mesoregiao_info()
-    gdf_geojson = load_geojson_map_data(GEOJSON_PATH)
-    df_revenues_all = load_all_revenue_data(REVENUE_FILES_PATTERN)
-
     st.header("Comparativo de Receitas Municipais")
 
-    if df_revenues_all.empty:
+    municipios_disponiveis_receita = valores_indexados(painel_receitas, 'Nome_Municipio')
+    if not municipios_disponiveis_receita:
         st.error("Não foi possível carregar dados de receita (`receitas_anuais_dca_*.xlsx`). A funcionalidade de comparação de receitas está indisponível.")
-    elif df_mesoregiao_geral.empty:
-        st.error("Não foi possível carregar informações dos municípios (`mesoregiao`). A funcionalidade de comparação de receitas pode estar limitada.")
     else:
-        if 'id' not in df_mesoregiao_geral.columns or 'Municípios' not in df_mesoregiao_geral.columns:
-            st.error("Dados de mesoregião incompletos (faltam 'id' ou 'Municípios'). Não é possível associar nomes aos municípios para as receitas.")
-            df_revenues_merged_with_names = pd.DataFrame()
-        else:
-            df_meso_for_revenue = df_mesoregiao_geral[['id', 'Municípios']].copy()
-            df_meso_for_revenue.rename(columns={'id': 'IBGE', 'Municípios': 'Nome_Municipio'}, inplace=True)
-            df_revenues_all['IBGE'] = df_revenues_all['IBGE'].astype(str)
-            df_meso_for_revenue['IBGE'] = df_meso_for_revenue['IBGE'].astype(str)
-            df_revenues_merged_with_names = pd.merge(
-                df_revenues_all,
-                df_meso_for_revenue,
-                on="IBGE",
-                how="left"
+        col1_t2, col2_t2 = st.columns(2)
+        
+        with col1_t2:
+            default_selection_municipios = municipios_disponiveis_receita[:2] if len(municipios_disponiveis_receita) >= 2 else municipios_disponiveis_receita
+            selected_municipios_receita = seletor_municipios(
+                indice_busca, "Selecione os Municípios para Comparar Receitas:", municipios_disponiveis_receita,
+                chave='municipios_receita', padrao=default_selection_municipios
             )
-            df_revenues_merged_with_names['Nome_Municipio'].fillna(df_revenues_merged_with_names['IBGE'], inplace=True)
 
-        if df_revenues_merged_with_names.empty:
-            st.warning("Nenhum dado de receita disponível após tentativa de combinação com nomes de municípios.")
-        else:
-            col1_t2, col2_t2 = st.columns(2)
-            
-            with col1_t2:
-                municipios_disponiveis_receita = sorted(df_revenues_merged_with_names['Nome_Municipio'].unique())
-                if not municipios_disponiveis_receita:
-                    st.warning("Nenhum município disponível para seleção na aba de receitas.")
-                    selected_municipios_receita = []
-                else:
-                    default_selection_municipios = municipios_disponiveis_receita[:2] if len(municipios_disponiveis_receita) >= 2 else municipios_disponiveis_receita
-                    selected_municipios_receita = st.multiselect(
-                        "Selecione os Municípios para Comparar Receitas:",
-                        options=municipios_disponiveis_receita,
-                        default=default_selection_municipios,
-                        key='municipios_receita'
-                    )
-
-            available_revenue_types = sorted([col for col in df_revenues_merged_with_names.columns if col not in ['IBGE', 'Ano', 'Nome_Municipio']])
-            
-            with col2_t2:
-                if not available_revenue_types:
-                    st.warning("Nenhum tipo de receita disponível para seleção.")
-                    selected_revenue_types = []
-                else:
-                    default_selection_revenue = available_revenue_types[:1] if available_revenue_types else []
-                    selected_revenue_types = st.multiselect(
-                        "Selecione o(s) Tipo(s) de Receita:",
-                        options=available_revenue_types,
-                        default=default_selection_revenue,
-                        key='revenue_types_receita'
-                    )
-
-            if not selected_municipios_receita:
-                st.info("Por favor, selecione pelo menos um município para visualizar os gráficos de receita.")
-            elif not selected_revenue_types:
-                st.info("Por favor, selecione pelo menos um tipo de receita.")
+        available_revenue_types = sorted(painel_receitas['dados']['Tipo_Receita'].cat.categories)
+        
+        with col2_t2:
+            if not available_revenue_types:
+                st.warning("Nenhum tipo de receita disponível para seleção.")
+                selected_revenue_types = []
             else:
-                df_filtered_by_municipio = df_revenues_merged_with_names[
-                    df_revenues_merged_with_names['Nome_Municipio'].isin(selected_municipios_receita)
-                ].copy()
-
-                cols_to_melt = ['Ano', 'Nome_Municipio'] + selected_revenue_types
-                df_subset_for_melt = df_filtered_by_municipio[cols_to_melt]
-
-                df_melted_receita = pd.melt(
-                    df_subset_for_melt,
-                    id_vars=['Ano', 'Nome_Municipio'],
-                    value_vars=selected_revenue_types,
-                    var_name='Tipo_Receita',
-                    value_name='Valor_Arrecadado'
+                default_selection_revenue = available_revenue_types[:1] if available_revenue_types else []
+                selected_revenue_types = st.multiselect(
+                    "Selecione o(s) Tipo(s) de Receita:",
+                    options=available_revenue_types,
+                    default=default_selection_revenue,
+                    key='revenue_types_receita'
                 )
-                # garantir que "Ano" seja numérico
-                df_melted_receita['Ano'] = pd.to_numeric(df_melted_receita['Ano'], errors='coerce')
 
-                if df_melted_receita.empty:
-                    st.warning(f"Nenhum dado de receita encontrado para os municípios e tipos de receita selecionados.")
-                else:
-                    # --- PONTO CRÍTICO DA CORREÇÃO ---
-                    # Ordenar o DataFrame pelos grupos e, crucialmente, pelo Ano
-                    df_melted_receita.sort_values(by=['Nome_Municipio', 'Tipo_Receita', 'Ano'], inplace=True)
-                    # --- FIM DA CORREÇÃO PRINCIPAL ---
-
-                    revenue_types_str = ', '.join(selected_revenue_types)
-                    st.subheader(f"Comparativo de Arrecadação: {revenue_types_str}")
-                    
-                    # Gráfico de Linhas
-                    try:
+        if not selected_municipios_receita:
+            st.info("Por favor, selecione pelo menos um município para visualizar os gráficos de receita.")
+        elif not selected_revenue_types:
+            st.info("Por favor, selecione pelo menos um tipo de receita.")
+        else:
+            # Fatia dos municípios no painel (já ordenada por município, tipo e ano)
+            with medir("filtrar_receitas"):
+                df_painel_municipios = fatiar(painel_receitas, 'Nome_Municipio', selected_municipios_receita)
+                df_melted_receita = (df_painel_municipios[df_painel_municipios['Tipo_Receita'].isin(selected_revenue_types)]
+                                     .rename(columns={'Valor': 'Valor_Arrecadado'}))
+                df_melted_receita = df_melted_receita.assign(
+                    Nome_Municipio=df_melted_receita['Nome_Municipio'].cat.remove_unused_categories(),
+                    Tipo_Receita=df_melted_receita['Tipo_Receita'].cat.remove_unused_categories(),
+                )
+
+            if df_melted_receita.empty:
+                st.warning(f"Nenhum dado de receita encontrado para os municípios e tipos de receita selecionados.")
+            else:
+                # O painel já está ordenado por município, tipo de receita e ano (linhas ligadas na ordem certa)
+                revenue_types_str = ', '.join(selected_revenue_types)
+                st.subheader(f"Comparativo de Arrecadação: {revenue_types_str}")
+                
+                # Gráfico de Linhas
+                try:
+                    with medir("grafico_receitas", "figura"):
                         anos_ordenados = sorted(df_melted_receita['Ano'].unique())
                         fig_line_receita = px.line(
                             df_melted_receita, x='Ano', y='Valor_Arrecadado',
@@ -392,18 +200,19 @@ with tab_receitas:
                                     'Nome_Municipio': 'Município', 'Tipo_Receita': 'Tipo de Receita'}
                         )
                         fig_line_receita.update_layout(legend_title_text='Legenda')
-                        st.plotly_chart(fig_line_receita, use_container_width=True)
-                    except Exception as e:
-                        st.error(f"Erro ao gerar o gráfico de linhas de receita: {e}\n{traceback.format_exc()}")
+                    st.plotly_chart(fig_line_receita, use_container_width=True)
+                except Exception as e:
+                    st.error(f"Erro ao gerar o gráfico de linhas de receita: {e}\n{traceback.format_exc()}")
 
-                    # --- GRÁFICO DE BARRAS: MUNICÍPIOS LADO A LADO, IMPOSTOS EMPILHADOS DENTRO DE CADA MUNICÍPIO (POR ANO) ---
-                    st.subheader(f"Composição da Receita por Município (Anual)")
-                    try:
-                        # Garantir que 'Ano' e 'Nome_Municipio' estejam ordenados
-                        anos_ordenados_barra = sorted(df_melted_receita['Ano'].unique())
-                        municipios_ordenados_barra = selected_municipios_receita # Ou sorted(df_melted_receita['Nome_Municipio'].unique()) se quiser alfabético
-                                                                               # filtrado pelos selecionados.
+                # --- GRÁFICO DE BARRAS: MUNICÍPIOS LADO A LADO, IMPOSTOS EMPILHADOS DENTRO DE CADA MUNICÍPIO (POR ANO) ---
+                st.subheader(f"Composição da Receita por Município (Anual)")
+                try:
+                    # Garantir que 'Ano' e 'Nome_Municipio' estejam ordenados
+                    anos_ordenados_barra = sorted(df_melted_receita['Ano'].unique())
+                    municipios_ordenados_barra = selected_municipios_receita # Ou sorted(df_melted_receita['Nome_Municipio'].unique()) se quiser alfabético
+                                                                           # filtrado pelos selecionados.
 
+                    with medir("grafico_composicao_receitas", "figura"):
                         fig_bar_receita_empilhado_por_municipio = px.bar(
                             df_melted_receita,
                             x='Nome_Municipio',     # Municípios no eixo X de cada subplot
@@ -425,33 +234,32 @@ with tab_receitas:
                         # Limpa os títulos dos subplots (facetas)
                         fig_bar_receita_empilhado_por_municipio.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
                         fig_bar_receita_empilhado_por_municipio.update_layout(legend_title_text='Tipo de Receita')
-                        st.plotly_chart(fig_bar_receita_empilhado_por_municipio, use_container_width=True)
+                    st.plotly_chart(fig_bar_receita_empilhado_por_municipio, use_container_width=True)
+
+                except Exception as e:
+                    st.error(f"Erro ao gerar o gráfico de barras empilhadas por município: {e}\n{traceback.format_exc()}")
+                # Tabela de Dados Filtrados
+                st.subheader("Dados Detalhados de Receita (Filtrados)")
+                # Formato largo (uma coluna por tipo de receita) só para as linhas selecionadas
+                with medir("pivot_receitas"):
+                    df_filtered_by_municipio = (df_melted_receita
+                                                .pivot_table(index=['Nome_Municipio', 'Ano'], columns='Tipo_Receita',
+                                                             values='Valor_Arrecadado', aggfunc='first', observed=True)
+                                                .reset_index())
+                    df_filtered_by_municipio.columns.name = None
+                cols_to_display_receita = ['Ano', 'Nome_Municipio'] + [rt for rt in selected_revenue_types if rt in df_filtered_by_municipio.columns]
+                format_dict_receita = {col: '{:,.2f}' for col in cols_to_display_receita[2:]}
 
-                    except Exception as e:
-                        st.error(f"Erro ao gerar o gráfico de barras empilhadas por município: {e}\n{traceback.format_exc()}")
-                    # Tabela de Dados Filtrados
-                    st.subheader("Dados Detalhados de Receita (Filtrados)")
-                    cols_to_display_receita = ['Ano', 'Nome_Municipio']
-                    for rt in selected_revenue_types:
-                        if rt in df_filtered_by_municipio.columns:
-                            cols_to_display_receita.append(rt)
-                    cols_to_display_receita = sorted(list(set(cols_to_display_receita)), key=lambda x: (x != 'Ano', x != 'Nome_Municipio', x))
-                    format_cols_numeric_receita = [col for col in selected_revenue_types if col in df_filtered_by_municipio.columns and pd.api.types.is_numeric_dtype(df_filtered_by_municipio[col])]
-                    format_dict_receita = {col: '{:,.2f}' for col in format_cols_numeric_receita}
-                    
-                    try:
-                        st.dataframe(
-                            df_filtered_by_municipio[cols_to_display_receita]
-                            .sort_values(by=['Nome_Municipio', 'Ano'])
-                            .style.format(format_dict_receita, na_rep="-"),
-                            use_container_width=True
-                        )
-                    except KeyError as e:
-                        st.error(f"Erro ao tentar exibir a tabela de dados: Coluna não encontrada - {e}. Verifique se os tipos de receita selecionados existem nos dados.")
-                        st.dataframe(df_filtered_by_municipio.sort_values(by=['Nome_Municipio', 'Ano']), use_container_width=True)
-                    except Exception as e:
-                        st.error(f"Erro ao exibir a tabela de dados de receita: {e}\n{traceback.format_exc()}")
-                        st.dataframe(df_filtered_by_municipio[cols_to_display_receita].sort_values(by=['Nome_Municipio', 'Ano']), use_container_width=True)
+                try:
+                    st.dataframe(
+                        df_filtered_by_municipio[cols_to_display_receita]
+                        .sort_values(by=['Nome_Municipio', 'Ano'])
+                        .style.format(format_dict_receita, na_rep="-"),
+                        use_container_width=True
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao exibir a tabela de dados de receita: {e}\n{traceback.format_exc()}")
+                    st.dataframe(df_filtered_by_municipio[cols_to_display_receita].sort_values(by=['Nome_Municipio', 'Ano']), use_container_width=True)
 
 # --- Tab 2: Mapa Regional de Variáveis (Benchmark) ---
 with tab_mapa:
@@ -462,8 +270,6 @@ with tab_mapa:
         st.error("Não foi possível carregar dados de benchmark (`resultado_final*.xlsx`). O mapa não pode ser gerado.")
     elif df_mesoregiao_geral.empty:
         st.error("Não foi possível carregar dados de mesorregião. O mapa não pode ser gerado.")
-    elif gdf_geojson is None:
-        st.error("Não foi possível carregar o arquivo GeoJSON do mapa. O mapa não pode ser gerado.")
     else:
         col1_t1, col2_t1 = st.columns(2)
         with col1_t1:
@@ -493,34 +299,82 @@ with tab_mapa:
         with col2_t1:
             ano_selecionado_t1 = st.selectbox(
                 "Selecione o ano para o mapa:",
-                options=ANOS_STR_BENCHMARK, key='ano_mapa', index=len(ANOS_STR_BENCHMARK) - 1
+                options=ANOS_BENCHMARK, key='ano_mapa', index=len(ANOS_BENCHMARK) - 1
             )
-
-        if variavel_selecionada_t1 and ano_selecionado_t1:
+        niveis_mapa_t1 = niveis_mapa()  # Sem a malha municipal, só o mapa por mesorregião
+        nivel_mapa_t1 = st.radio("Nível do mapa:", niveis_mapa_t1, horizontal=True, key='nivel_mapa') if len(niveis_mapa_t1) > 1 else niveis_mapa_t1[0]
+
+        if variavel_selecionada_t1 and ano_selecionado_t1 and nivel_mapa_t1 == "Município":
+            opcoes_regiao = ["Minas Gerais"] + sorted(df_mesoregiao_geral['Mesorregião'].dropna().unique())
+            regiao_t1 = st.selectbox("Região:", options=opcoes_regiao, key='regiao_mapa',
+                                     help="Ao aproximar numa mesorregião, os contornos são mais detalhados.")
+            geojson_estado = carregar_geojson_municipios(zoom=5)
+            if geojson_estado is None:
+                st.info("Malha municipal indisponível. Use o nível 'Mesorregião'.")
+            else:
+                ids_regiao = None
+                if regiao_t1 != "Minas Gerais":
+                    ids_regiao = set(df_mesoregiao_geral.loc[df_mesoregiao_geral['Mesorregião'] == regiao_t1, 'id'].astype(str))
+                centro_t1, zoom_t1 = enquadrar(geojson_estado, ids_regiao)
+                geojson_municipios = carregar_geojson_municipios(zoom=zoom_t1)
+                if ids_regiao is not None:
+                    geojson_municipios = {"type": "FeatureCollection",
+                                          "features": [f for f in geojson_municipios["features"] if f["id"] in ids_regiao]}
+
+                with medir("media_municipios"):
+                    df_ano_mun = fatiar(indice_benchmark, 'Ano', ano_selecionado_t1)
+                    # Códigos IBGE como texto, a chave das features do GeoJSON
+                    valores = pd.to_numeric(df_ano_mun[variavel_selecionada_t1], errors='coerce').groupby(df_ano_mun['id'].astype(str)).mean()
+                    nomes = df_mesoregiao_geral.assign(id=df_mesoregiao_geral['id'].astype(str)).drop_duplicates(subset=['id']).set_index('id')['Municípios']
+                    ids_mapa = [f["id"] for f in geojson_municipios["features"] if f["id"] in valores.index]
+                if not ids_mapa:
+                    st.info("Nenhum município do mapa possui dados para a variável e ano selecionados.")
+                else:
+                    # Features e ordem fixas por nível de detalhe: entre reruns só `z` muda
+                    with medir("mapa_municipios", "figura"):
+                        fig_map = go.Figure(go.Choroplethmapbox(
+                            geojson=geojson_municipios, featureidkey='id',
+                            locations=ids_mapa, z=valores.reindex(ids_mapa).to_numpy(),
+                            text=[nomes.get(i, i) for i in ids_mapa],
+                            colorscale=CORES_MAPA, marker_opacity=0.75, marker_line_width=0.3,
+                            colorbar=dict(title=variavel_selecionada_t1.replace('_',' ').capitalize()),
+                            hovertemplate="<b>%{text}</b><br>%{z:.2f}<extra></extra>",
+                        ))
+                        fig_map.update_layout(
+                            title=f"'{variavel_selecionada_t1}' por Município - {regiao_t1} ({ano_selecionado_t1})",
+                            mapbox=dict(style="carto-positron", center=centro_t1, zoom=zoom_t1),
+                            margin={"r":0, "t":40, "l":0, "b":0},
+                            uirevision="mapa_benchmark_municipios",
+                        )
+                    st.plotly_chart(fig_map, use_container_width=True)
+        elif variavel_selecionada_t1 and ano_selecionado_t1:
             with st.spinner(f"Gerando mapa para '{variavel_selecionada_t1}' em {ano_selecionado_t1}..."):
-                gdf_map_display_data, nome_col_media_mapa = merge_data_for_map(
-                    df_benchmark_all, df_mesoregiao_geral, gdf_geojson,
+                df_map_display_data, nome_col_media_mapa = merge_data_for_map(
+                    indice_benchmark, df_mesoregiao_geral, geojson_mapa,
                     ano_selecionado_t1, variavel_selecionada_t1
                 )
 
-                if gdf_map_display_data is not None and not gdf_map_display_data.empty and nome_col_media_mapa:
+                if df_map_display_data is not None and not df_map_display_data.empty and nome_col_media_mapa:
                     try:
-                        fig_map = px.choropleth_mapbox(
-                            gdf_map_display_data,
-                            geojson=gdf_map_display_data.geometry,
-                            locations=gdf_map_display_data.index, # Usa o índice do GeoDataFrame
-                            color=nome_col_media_mapa,
-                            hover_name='Nome_Mesorregiao', # Do GeoJSON
-                            hover_data={nome_col_media_mapa: ':.2f', 'Mesorregião': True},
-                            color_continuous_scale=CORES_MAPA,
-                            mapbox_style="carto-positron",
-                            center={"lat": -18.5122, "lon": -44.5550}, zoom=5, opacity=0.75
-                        )
-                        fig_map.update_layout(
-                            title=f"Distribuição Média de '{variavel_selecionada_t1}' por Mesorregião - {ano_selecionado_t1}",
-                            margin={"r":0, "t":40, "l":0, "b":0},
-                            coloraxis_colorbar=dict(title=variavel_selecionada_t1.replace('_',' ').capitalize())
-                        )
+                        with medir("mapa_mesorregioes", "figura"):
+                            fig_map = px.choropleth_mapbox(
+                                df_map_display_data,
+                                geojson=geojson_mapa, # GeoJSON simplificado e compartilhado (features por 'id')
+                                locations='Mesorregião',
+                                featureidkey='id',
+                                color=nome_col_media_mapa,
+                                hover_name='Mesorregião',
+                                hover_data={nome_col_media_mapa: ':.2f', 'Mesorregião': False},
+                                color_continuous_scale=CORES_MAPA,
+                                mapbox_style="carto-positron",
+                                center={"lat": -18.5122, "lon": -44.5550}, zoom=5, opacity=0.75
+                            )
+                            fig_map.update_layout(
+                                title=f"Distribuição Média de '{variavel_selecionada_t1}' por Mesorregião - {ano_selecionado_t1}",
+                                margin={"r":0, "t":40, "l":0, "b":0},
+                                uirevision="mapa_benchmark", # Mantém zoom/posição entre reruns
+                                coloraxis_colorbar=dict(title=variavel_selecionada_t1.replace('_',' ').capitalize())
+                            )
                         st.plotly_chart(fig_map, use_container_width=True)
                     except Exception as e:
                         st.error(f"Erro ao gerar o mapa: {e}")
@@ -528,3 +382,4 @@ with tab_mapa:
                 else:
                     st.info("Não foi possível gerar o mapa com os dados e seleções atuais. Verifique os avisos acima.")
 
+painel_desempenho()
@@ -2,16 +2,20 @@ from extra import variaveis # Se você tiver este arquivo, mantenha. Caso contr
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
-import os
+import io
+from dados import carregar_populacao, carregar_resultados
+from previsao import NOME_MODELO, carregar_explicador, carregar_floresta, montar_features, prever_lote
+from explicacoes import figura_cascata
+from sensibilidade import analise_sensibilidade
+from indicadores import GRUPOS_CONTABEIS, CAMPOS_CONTABEIS, calcular_indicadores, contas_e_indicadores
+from instrumentacao import iniciar_rerun, instrumentar_carregador, medir, painel_desempenho
+from tardio import importar_tardio
+
+go = importar_tardio("plotly.graph_objects")  # Só para o gráfico de sensibilidade
 
 # Configurações iniciais
 st.set_page_config(page_title="Previsão CAPAG+LRF", page_icon="📊", layout="wide")
-
-# Constantes
-PASTA_DADOS = "resultados"
-NOME_MODELO = "random_forest_saude_municipios.pkl"
-ARQUIVO_CLASSIFICACAO_POPULACAO = "Mesorregiao_com_populacao.xlsx" ### ADIÇÃO ###
+iniciar_rerun("simulacao")
 
 # Dicionário de descrições para as variáveis (substitua com suas descrições reais)
 DESCRICOES_VARIAVEIS = {
@@ -45,97 +49,25 @@ def classificar_populacao(pop):
     else:
         return "Metrópole"
 
+@instrumentar_carregador("carregar_dados_2022")
 def carregar_dados_2022():
-    """Carrega os dados de referência de 2022 e os dados de classificação populacional"""
-    try:
-        caminho_financeiro = os.path.join(PASTA_DADOS, "janela_fixa", "22", "resultado_final22.xlsx")
-        df_financeiro = pd.read_excel(caminho_financeiro)
-
-        # Converter colunas numéricas que podem estar como strings
-        for col in df_financeiro.columns:
-            if df_financeiro[col].dtype == object:
-                try:
-                    # Evitar converter colunas que devem ser string, como 'id' ou 'IBGE'
-                    if col.lower() != 'id' and col.upper() != 'IBGE' and col.upper() != 'MUNICÍPIOS':
-                        df_financeiro[col] = pd.to_numeric(df_financeiro[col].astype(str).str.replace(',', '.', regex=False))
-                except ValueError:
-                    pass
-
-        caminho_classificacao = ARQUIVO_CLASSIFICACAO_POPULACAO
-        if not os.path.exists(caminho_classificacao):
-            st.error(f"Arquivo de classificação '{ARQUIVO_CLASSIFICACAO_POPULACAO}' não encontrado. A comparação será feita com a média geral.")
-            return df_financeiro
-
-        df_classificacao = pd.read_excel(caminho_classificacao)
-
-        ### ALTERAÇÃO AQUI: Usar 'id' para df_financeiro e 'IBGE' para df_classificacao ###
-        coluna_ibge_financeiro = 'id' # Nome da coluna no df_financeiro
-        coluna_ibge_classificacao = 'IBGE' # Nome da coluna no df_classificacao
-
-        if coluna_ibge_financeiro not in df_financeiro.columns:
-            st.error(f"Coluna '{coluna_ibge_financeiro}' não encontrada no arquivo financeiro. Não é possível mesclar com a classificação.")
-            # Adicionar a coluna de classificação vazia para evitar erros posteriores, se df_financeiro for retornado
-            df_financeiro['Classificação do Município'] = "Não Classificado"
-            return df_financeiro
-        if coluna_ibge_classificacao not in df_classificacao.columns:
-            st.error(f"Coluna '{coluna_ibge_classificacao}' não encontrada no arquivo de classificação. Não é possível mesclar.")
-            # Adicionar a coluna de classificação vazia para evitar erros posteriores, se df_financeiro for retornado
-            df_financeiro['Classificação do Município'] = "Não Classificado"
-            return df_financeiro
-
-        try:
-            # Garantir que ambas as colunas de merge sejam do mesmo tipo (ex: int)
-            # Se seus códigos IBGE são numéricos (ex: 3100104)
-            df_financeiro[coluna_ibge_financeiro] = df_financeiro[coluna_ibge_financeiro].astype(int)
-            df_classificacao[coluna_ibge_classificacao] = df_classificacao[coluna_ibge_classificacao].astype(int)
-            
-            # Se seus códigos IBGE podem ter zeros à esquerda e são strings (ex: "0100100")
-            # df_financeiro[coluna_ibge_financeiro] = df_financeiro[coluna_ibge_financeiro].astype(str)
-            # df_classificacao[coluna_ibge_classificacao] = df_classificacao[coluna_ibge_classificacao].astype(str)
-
-        except ValueError as e:
-            st.error(f"Erro ao converter colunas de código IBGE ('{coluna_ibge_financeiro}', '{coluna_ibge_classificacao}') para o tipo de merge: {e}. Verifique os dados.")
-            df_financeiro['Classificação do Município'] = "Não Classificado"
-            return df_financeiro
-
-        df_classificacao_selecionada = df_classificacao[[coluna_ibge_classificacao, 'Classificação do Município']].drop_duplicates(subset=[coluna_ibge_classificacao])
-
-        # Merge usando left_on e right_on
-        df_merged = pd.merge(
-            df_financeiro,
-            df_classificacao_selecionada,
-            left_on=coluna_ibge_financeiro,
-            right_on=coluna_ibge_classificacao,
-            how="left"
-        )
-
-        # Se a coluna 'IBGE' do df_classificacao foi adicionada ao df_merged e você não a quer, pode removê-la
-        # Isso acontece porque as colunas de junção têm nomes diferentes.
-        if coluna_ibge_classificacao in df_merged.columns and coluna_ibge_classificacao != coluna_ibge_financeiro:
-            df_merged = df_merged.drop(columns=[coluna_ibge_classificacao])
-        
-        if 'Classificação do Município' not in df_merged.columns:
-            st.warning("A coluna 'Classificação do Município' não foi adicionada após o merge. Verifique os códigos IBGE e os nomes das colunas.")
-            # Adiciona a coluna com um valor padrão para evitar quebras em outras partes do código
-            df_merged['Classificação do Município'] = "Não Classificado"
-        # else:
-            # st.success("Dados de classificação populacional carregados e integrados!") # Para debug
-
-        return df_merged
-
-    except Exception as e:
-        st.error(f"Erro ao carregar dados históricos: {str(e)}")
-        # Tenta retornar um DataFrame com a coluna de classificação padrão em caso de erro grave
-        # para que o resto da aplicação não quebre imediatamente.
-        # Isso é opcional e depende de como você quer lidar com falhas no carregamento.
-        df_fallback = pd.DataFrame()
-        df_fallback['Classificação do Município'] = "Erro no Carregamento"
-        return df_fallback # Ou return None e tratar o None em main()
+    """Dados de referência de 2022 com o porte ('Classificação do Município') de cada município, via código IBGE"""
+    df_financeiro = carregar_resultados([22])  # Cópia compartilhada do processo, já tipada
+    if df_financeiro.empty:
+        st.error("Erro ao carregar dados históricos: resultado_final22.xlsx não pôde ser carregado")
+        return pd.DataFrame(columns=['Classificação do Município'])
+
+    df_populacao = carregar_populacao()  # Avisa se a planilha de classificação não existir
+    if df_populacao.empty:
+        return df_financeiro
+    with medir("merge_classificacao_populacao"):
+        porte_por_id = df_populacao.set_index('id')['Classificação do Município']
+        return df_financeiro.assign(**{'Classificação do Município': df_financeiro['id'].map(porte_por_id)})
 
 def carregar_modelo():
-    """Carrega o modelo treinado"""
+    """Obtém o modelo compilado do registro do processo (carregado uma única vez)"""
     try:
-        return joblib.load(os.path.join(NOME_MODELO))
+        return carregar_floresta(NOME_MODELO)
     except Exception as e:
         st.error(f"Erro ao carregar o modelo: {str(e)}")
         return None
@@ -146,42 +78,172 @@ def formatar_numero(valor, prefixo='R$'):
         return "-"
     return f"{prefixo} {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
+def montar_dados_previsao(modelo, indicadores):
+    """Linha de entrada do modelo (ver `previsao.montar_features`), ou None se faltar alguma feature"""
+    try:
+        return montar_features(modelo, pd.DataFrame([indicadores]))
+    except ValueError as e:
+        st.error(f"Erro ao preparar dados para previsão: {str(e)}")
+        return None
+
 def fazer_previsao(modelo, indicadores):
     """Prepara os dados e faz a previsão garantindo a ordem correta das features"""
-    mapeamento_nomes = {
-        "Despesa com pessoal": "despesa_com_pessoal",
-        "Dívida Consolidada": "divida_consolidada",
-        "Operações de crédito": "operacoes_credito"
-    }
-    
-    try:
-        features_esperadas = modelo.feature_names_in_
-        dados_previsao = {}
-        for feature in features_esperadas:
-            if feature in indicadores:
-                dados_previsao[feature] = [indicadores[feature]]
-            elif feature in mapeamento_nomes.values():
-                for original, padronizado in mapeamento_nomes.items():
-                    if padronizado == feature and original in indicadores:
-                        dados_previsao[feature] = [indicadores[original]]
-                        break
-            # else: # Para debug, caso alguma feature esperada não seja encontrada
-            #     st.warning(f"Feature esperada pelo modelo não encontrada nos indicadores: {feature}")
-
-
-        # Verificar se todas as features esperadas foram preenchidas
-        if len(dados_previsao) != len(features_esperadas):
-            st.error(f"Nem todas as features esperadas pelo modelo foram fornecidas. Esperadas: {len(features_esperadas)}, Fornecidas: {len(dados_previsao)}")
-            # st.write("Features esperadas:", features_esperadas) # Debug
-            # st.write("Dados para previsão (parcial):", dados_previsao) # Debug
-            return None
-
-        df_previsao = pd.DataFrame(dados_previsao, columns=features_esperadas)
+    df_previsao = montar_dados_previsao(modelo, indicadores)
+    if df_previsao is None:
+        return None
+    with medir("previsao_individual", "previsao"):
         return modelo.predict(df_previsao)
+
+def exibir_explicacao(modelo, indicadores):
+    """Cascata das contribuições de cada variável para a previsão do cenário simulado"""
+    df_previsao = montar_dados_previsao(modelo, indicadores)
+    if df_previsao is None:
+        return
+    try:
+        with medir("explicacao_individual", "previsao"):
+            explicacao = carregar_explicador(NOME_MODELO).tabela(df_previsao).iloc[0]
+        with medir("cascata_explicacao", "figura"):
+            fig = figura_cascata(explicacao, list(modelo.feature_names_in_), "Por que o modelo classificou assim?")
     except Exception as e:
-        st.error(f"Erro ao preparar dados para previsão: {str(e)}")
-        return None
+        st.error(f"Erro ao explicar a previsão: {str(e)}")
+        return
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption("Cada barra mostra quanto o indicador afastou a probabilidade da média do modelo.")
     
+def ler_arquivo_cenarios(arquivo):
+    """Lê o CSV/XLSX enviado e converte as contas contábeis para numérico"""
+    if arquivo.name.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(arquivo)
+    else:
+        df = pd.read_csv(arquivo, sep=None, engine="python") # Detecta ',' ou ';'
+    for col in CAMPOS_CONTABEIS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    return df
+
+def exibir_simulacao_lote():
+    """Simulação em lote: indicadores e previsão de todos os cenários de um arquivo"""
+    st.markdown("### 📂 Simulação em Lote")
+    st.markdown(
+        "Envie um arquivo CSV ou XLSX com uma linha por cenário e uma coluna para cada conta contábil. "
+        "Colunas extras (ex.: `id`, `Municípios`, `cenario`) são mantidas no resultado."
+    )
+    modelo_csv = pd.DataFrame(columns=["cenario", "id", "Municípios"] + CAMPOS_CONTABEIS).to_csv(index=False).encode("utf-8")
+    st.download_button("Baixar modelo de arquivo (CSV)", data=modelo_csv, file_name="modelo_cenarios.csv", mime="text/csv")
+
+    arquivo = st.file_uploader("Arquivo de cenários", type=["csv", "xlsx"], key="arquivo_cenarios")
+    if arquivo is None:
+        return
+
+    try:
+        df_entradas = ler_arquivo_cenarios(arquivo)
+    except Exception as e:
+        st.error(f"Erro ao ler o arquivo de cenários: {str(e)}")
+        return
+
+    faltantes = [c for c in CAMPOS_CONTABEIS if c not in df_entradas.columns]
+    if faltantes:
+        st.error(f"Colunas obrigatórias ausentes no arquivo: {', '.join(faltantes)}")
+        return
+    if df_entradas.empty:
+        st.warning("O arquivo não contém cenários.")
+        return
+
+    invalidos = df_entradas[CAMPOS_CONTABEIS].isna().any(axis=1) | (df_entradas["populacao"] <= 0)
+    if invalidos.any():
+        st.warning(f"{int(invalidos.sum())} cenário(s) com valores ausentes/não numéricos ou população não positiva não serão classificados.")
+
+    if invalidos.all():
+        st.error("Nenhum cenário válido para classificar.")
+        return
+
+    modelo = carregar_modelo()
+    if modelo is None:
+        return
+
+    with st.spinner(f"Calculando indicadores e classificando {len(df_entradas)} cenários..."):
+        with medir("indicadores_lote"):
+            dados_modelo = contas_e_indicadores(df_entradas)
+        try:
+            with medir("previsao_lote", "previsao"):
+                previsoes = prever_lote(modelo, dados_modelo[~invalidos])
+        except Exception as e:
+            st.error(f"Erro na previsão em lote: {str(e)}")
+            return
+
+    colunas_extras = [c for c in df_entradas.columns if c not in CAMPOS_CONTABEIS]
+    df_resultado = pd.concat([df_entradas[colunas_extras], dados_modelo, previsoes], axis=1)
+    df_resultado["classe_prevista"] = df_resultado["classe_prevista"].fillna("-")
+
+    st.success(f"{len(previsoes)} cenário(s) classificados.")
+    contagem = df_resultado["classe_prevista"].value_counts()
+    cols = st.columns(len(contagem))
+    for col, (classe, n) in zip(cols, contagem.items()):
+        col.metric(f"Classe {classe}", int(n))
+    st.dataframe(df_resultado, use_container_width=True, hide_index=True)
+
+    col_csv, col_xlsx = st.columns(2)
+    with col_csv:
+        st.download_button("Baixar resultados (CSV)", data=df_resultado.to_csv(index=False).encode("utf-8"),
+                           file_name="resultado_cenarios.csv", mime="text/csv", use_container_width=True)
+    with col_xlsx:
+        buffer = io.BytesIO()
+        df_resultado.to_excel(buffer, index=False)
+        st.download_button("Baixar resultados (XLSX)", data=buffer.getvalue(), file_name="resultado_cenarios.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", use_container_width=True)
+
+def exibir_sensibilidade(dados):
+    """Tornado das contas que mais alteram a probabilidade prevista e seus pontos de virada"""
+    with st.expander("🔬 Análise de Sensibilidade"):
+        st.markdown("Varia cada conta contábil isoladamente em torno do valor informado e mostra quanto a probabilidade prevista muda. Contas zeradas não variam.")
+        col_amp, col_passos = st.columns(2)
+        amplitude = col_amp.slider("Variação (±%)", min_value=10, max_value=100, value=50, step=5, key="sens_amplitude") / 100
+        passos = col_passos.slider("Pontos por conta", min_value=5, max_value=41, value=21, step=2, key="sens_passos")
+
+        if not st.button("Executar análise de sensibilidade", use_container_width=True, key="sens_executar"):
+            return
+        if dados.get("populacao", 0) <= 0:
+            st.error("Por favor, informe a população do município para realizar a análise.")
+            return
+        modelo = carregar_modelo()
+        if modelo is None:
+            return
+
+        try:
+            with st.spinner(f"Classificando {len(CAMPOS_CONTABEIS) * passos} cenários..."):
+                with medir("sensibilidade", "previsao"):
+                    _, resumo = analise_sensibilidade(modelo, dados, amplitude, passos)
+        except Exception as e:
+            st.error(f"Erro na análise de sensibilidade: {str(e)}")
+            return
+
+        classe = modelo.classes_[0]
+        rotulos = [campo.replace("_", " ").title() for campo in resumo["campo"]]
+        with medir("grafico_sensibilidade", "figura"):
+            fig = go.Figure(go.Bar(
+                y=rotulos, x=resumo["prob_max"] - resumo["prob_min"], base=resumo["prob_min"],
+                orientation="h", marker_color="#4B9CD3",
+                hovertemplate="<b>%{y}</b><br>Mín: %{base:.1%}<br>Máx: %{customdata:.1%}<extra></extra>",
+                customdata=resumo["prob_max"]
+            ))
+            fig.add_vline(x=resumo["prob_base"].iloc[0], line_dash="dash", line_color="gray", annotation_text="Cenário informado")
+            fig.add_vline(x=0.5, line_dash="dot", line_color="red", annotation_text="Virada de classe", annotation_position="bottom right")
+            fig.update_layout(
+                title=f"Sensibilidade da Probabilidade de Classe {classe} (±{amplitude:.0%})",
+                xaxis=dict(title=f"Probabilidade de Classe {classe}", tickformat=".0%", range=[0, 1]),
+                yaxis=dict(autorange="reversed"), height=450, margin=dict(l=0, r=0, t=40, b=0)
+            )
+        st.plotly_chart(fig, use_container_width=True)
+
+        tabela = pd.DataFrame({
+            "Conta": rotulos,
+            "Valor Informado": resumo["valor_base"].map(lambda v: formatar_numero(v, prefixo='')),
+            "Valor de Virada": resumo["valor_virada"].map(lambda v: formatar_numero(v, prefixo='')),
+            "Variação Necessária": (resumo["valor_virada"] / resumo["valor_base"].where(resumo["valor_base"] != 0) - 1).map(lambda v: "-" if pd.isna(v) else f"{v:+.1%}"),
+        })
+        st.caption("Valor de virada: valor da conta (mantidas as demais) em que a classe prevista muda, dentro da faixa analisada.")
+        st.dataframe(tabela, use_container_width=True, hide_index=True)
+
 # Interface principal
 def main():
     df_referencia = carregar_dados_2022()
@@ -194,32 +256,18 @@ def main():
     Simule diferentes cenários financeiros utilizando nosso modelo preditivo.
     """)
 
+    modo = st.radio("Modo de simulação:", ["Cenário individual", "Lote de cenários"], horizontal=True, key="modo_simulacao")
+    if modo == "Lote de cenários":
+        exibir_simulacao_lote()
+        return
+
     col1, col2 = st.columns([1, 1]) # Mantive a proporção original, ajuste se necessário
 
     with col1:
         with st.container(border=True):
             st.markdown("### 💰 Informe os valores contábeis")
-            grupos = {
-                "📈 Receitas": [
-                    "receita_total", "receita_propria",
-                    "receita_transferencias", "populacao",
-                    "receita_corrente_liquida"
-                ],
-                "📉 Despesas": [
-                    "despesa_total", "despesa_com_pessoal",
-                    "gastos_operacionais"
-                ],
-                "💼 Ativos": [
-                    "disponibilidade_caixa", "ativo_circulante"
-                ],
-                "📋 Passivos": [
-                    "obrigacoes_curto_prazo", "divida_consolidada",
-                    "operacoes_credito"
-                ]
-            }
-
             dados = {}
-            for grupo, variaveis_grupo in grupos.items(): # Renomeei 'variaveis' para 'variaveis_grupo' para evitar conflito
+            for grupo, variaveis_grupo in GRUPOS_CONTABEIS.items(): # Renomeei 'variaveis' para 'variaveis_grupo' para evitar conflito
                 with st.expander(grupo):
                     for var in variaveis_grupo:
                         label = var.replace("_", " ").title()
@@ -244,7 +292,8 @@ def main():
 
 
         try:
-            indicadores = calcular_indicadores(dados)
+            with medir("indicadores"):
+                indicadores = calcular_indicadores(dados)
             # Passar os dados brutos para que 'exibir_referencia' possa usar a população para classificação
             ### ALTERAÇÃO: Passar porte_municipio_simulado ###
             exibir_referencia(df_referencia, indicadores, porte_municipio_simulado)
@@ -293,11 +342,14 @@ def main():
                             # Interpretar a previsão (ex: CAPAG A, B, C, D ou LRF OK/Alerta/Violado)
                             # Isso depende de como seu modelo foi treinado para retornar as classes
                             st.success(f"**Resultado da Previsão:** {previsao[0]}")
+                            exibir_explicacao(modelo, indicadores_para_modelo)
                         else:
                             st.warning("Previsão não pôde ser realizada. Verifique as mensagens de erro acima.")
                     except Exception as e:
                         st.error(f"Erro na previsão: {str(e)}")
 
+        exibir_sensibilidade(dados)
+
     with col2:
         if 'indicadores' in locals() and indicadores: # Verifica se indicadores existe e não é vazio
             exibir_indicadores(indicadores)
@@ -305,51 +357,6 @@ def main():
             st.warning("Preencha os dados na coluna esquerda para ver os indicadores e realizar a simulação.")
 
 
-def calcular_indicadores(dados):
-    indicadores = {}
-    populacao = dados.get("populacao", 0)
-    populacao_div = populacao if populacao > 0 else 1
-
-    receita_total = dados.get("receita_total", 0)
-    receita_propria = dados.get("receita_propria", 0)
-    receita_transferencias = dados.get("receita_transferencias", 0)
-    # Pegar a RCL dos dados de entrada
-    receita_corrente_liquida_input = dados.get("receita_corrente_liquida", 0) # <--- Pega o valor do input
-    despesa_total = dados.get("despesa_total", 0)
-    despesa_com_pessoal_input = dados.get("despesa_com_pessoal", 0)
-    gastos_operacionais = dados.get("gastos_operacionais", 0)
-    disponibilidade_caixa = dados.get("disponibilidade_caixa", 0)
-    ativo_circulante = dados.get("ativo_circulante", 0)
-    obrigacoes_curto_prazo = dados.get("obrigacoes_curto_prazo", 0)
-    divida_consolidada_input = dados.get("divida_consolidada", 0)
-    operacoes_credito_input = dados.get("operacoes_credito", 0)
-
-    # Adicionar RCL ao dicionário de indicadores
-    indicadores["receita_corrente_liquida"] = receita_corrente_liquida_input # <--- ADIÇÃO IMPORTANTE
-
-    # Cálculos principais - usando receita_corrente_liquida_input onde necessário
-    indicadores["receita_per_capita"] = receita_total / populacao_div
-    indicadores["representatividade_da_receita_propria"] = receita_propria / receita_total if receita_total != 0 else 0
-    indicadores["participacao_das_receitas_de_transferencias"] = receita_transferencias / receita_total if receita_total != 0 else 0
-    indicadores["participacao_dos_gastos_operacionais"] = gastos_operacionais / despesa_total if despesa_total != 0 else 0
-    indicadores["cobertura_de_despesas"] = receita_total / despesa_total if despesa_total != 0 else 0
-    indicadores["recursos_para_cobertura_de_queda_de_arrecadacao"] = disponibilidade_caixa / receita_total if receita_total != 0 else 0
-    indicadores["recursos_para_cobertura_de_obrigacoes_de_curto_prazo"] = disponibilidade_caixa / obrigacoes_curto_prazo if obrigacoes_curto_prazo != 0 else 0
-    indicadores["comprometimento_das_receitas_correntes_com_as_obrigacoes_de_curto_prazo"] = obrigacoes_curto_prazo / receita_corrente_liquida_input if receita_corrente_liquida_input != 0 else 0
-    indicadores["divida_per_capita"] = divida_consolidada_input / populacao_div
-    indicadores["comprometimento_das_receitas_correntes_com_o_endividamento"] = divida_consolidada_input / receita_corrente_liquida_input if receita_corrente_liquida_input != 0 else 0
-    
-    indicadores["Despesa com pessoal"] = despesa_com_pessoal_input
-    indicadores["Dívida Consolidada"] = divida_consolidada_input
-    indicadores["Operações de crédito"] = operacoes_credito_input
-
-    indicadores["poupanca_corrente"] = receita_total - despesa_total
-    indicadores["liquidez_relativa"] = obrigacoes_curto_prazo / disponibilidade_caixa if disponibilidade_caixa != 0 else 0
-    indicadores["indicador_de_liquidez"] = ativo_circulante / obrigacoes_curto_prazo if obrigacoes_curto_prazo != 0 else 0
-    indicadores["endividamento"] = (divida_consolidada_input + operacoes_credito_input) / receita_corrente_liquida_input if receita_corrente_liquida_input != 0 else 0
-
-    return indicadores
-
 def exibir_indicadores(indicadores):
     st.markdown("### 📊 Indicadores Financeiros Calculados")
     REGRAS_ALERTAS = {
@@ -514,6 +521,7 @@ def formatar_numero(valor, prefixo='R$'):
     return f"{prefixo} {val_num:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
 
+@medir("comparativo_referencia")
 def exibir_referencia(df_referencia_original, indicadores, porte_simulado):
     ano_referencia = 2022 # Conforme seu código original
 
@@ -748,3 +756,4 @@ if __name__ == "__main__":
         # st.warning("Módulo 'extra.variaveis' não encontrado. Algumas funcionalidades podem ser limitadas.")
         variaveis = None # Define como None para o código não quebrar se ele for referenciado.
     main()
+    painel_desempenho()
@@ -0,0 +1,147 @@
+import os
+import threading
+
+import pandas as pd
+
+from explicacoes import ExplicadorFloresta
+from floresta import amostra_paridade, compilar_floresta, verificar_paridade
+from instrumentacao import instrumentar_carregador, registrar_aviso, registrar_falta_cache
+from tardio import importar_tardio
+
+joblib = importar_tardio("joblib")  # O scikit-learn vem junto, ao desserializar o modelo
+
+NOME_MODELO = "random_forest_saude_municipios.pkl"
+
+# Registro de modelos do processo: {(caminho, mmap_mode): {"assinatura", "modelo"}}.
+# Módulos importados sobrevivem aos reruns do Streamlit, então o modelo é
+# desserializado uma vez por processo e compartilhado por todas as sessões.
+_registro = {}
+_trava = threading.Lock()
+
+
+def _assinatura(caminho):
+    """(mtime, tamanho) do arquivo, usados para detectar alterações em disco."""
+    info = os.stat(caminho)
+    return info.st_mtime_ns, info.st_size
+
+
+@instrumentar_carregador("carregar_modelo")
+def carregar_modelo(caminho=NOME_MODELO, mmap_mode=None):
+    """
+    Retorna o modelo treinado, carregando-o apenas uma vez por processo.
+
+    Se o arquivo `.pkl` mudar em disco, o modelo é recarregado na próxima
+    chamada. `mmap_mode` (ou a variável de ambiente `PREVISAO_MODELO_MMAP`,
+    ex.: "r") mapeia em memória os arrays das árvores, permitindo que workers
+    criados por fork compartilhem as mesmas páginas; só tem efeito em modelos
+    salvos com `joblib.dump` sem compressão.
+    """
+    caminho = os.path.abspath(caminho)
+    if mmap_mode is None:
+        mmap_mode = os.environ.get("PREVISAO_MODELO_MMAP") or None
+    assinatura = _assinatura(caminho)
+    chave = (caminho, mmap_mode)
+
+    with _trava:
+        entrada = _registro.get(chave)
+        if entrada is None or entrada["assinatura"] != assinatura:
+            registrar_falta_cache("carregar_modelo", arquivo=os.path.basename(caminho), mmap_mode=mmap_mode)
+            entrada = {"assinatura": assinatura, "modelo": joblib.load(caminho, mmap_mode=mmap_mode)}
+            _registro[chave] = entrada
+    return entrada["modelo"]
+
+
+def limpar_registro():
+    """Esvazia o registro: a próxima chamada relê (e recompila) o modelo do disco."""
+    with _trava:
+        _registro.clear()
+
+
+@instrumentar_carregador("carregar_floresta")
+def carregar_floresta(caminho=NOME_MODELO):
+    """
+    Modelo compilado em arrays NumPy (`floresta.FlorestaCompilada`), mesmas
+    probabilidades do modelo original e bem mais rápido por chamada.
+
+    Compilado uma vez por processo e recompilado se o `.pkl` mudar. A cada
+    compilação a paridade com o scikit-learn é conferida numa amostra das
+    divisões da floresta; se divergir, o aviso vai para o log e o modelo
+    original é usado no lugar do compilado.
+    """
+    modelo = carregar_modelo(caminho)
+    chave = (os.path.abspath(caminho), "compilado")
+    with _trava:
+        entrada = _registro.get(chave)
+        if entrada is None or entrada["modelo_original"] is not modelo:
+            registrar_falta_cache("carregar_floresta", arquivo=os.path.basename(caminho))
+            floresta = compilar_floresta(modelo)
+            try:
+                verificar_paridade(modelo, floresta, amostra_paridade(floresta))
+                uso = floresta
+            except AssertionError as e:
+                registrar_aviso("paridade_floresta", arquivo=os.path.basename(caminho), erro=str(e))
+                uso = modelo
+            entrada = {"modelo_original": modelo, "floresta": floresta, "modelo": uso}
+            _registro[chave] = entrada
+    return entrada["modelo"]
+
+
+@instrumentar_carregador("carregar_explicador")
+def carregar_explicador(caminho=NOME_MODELO):
+    """
+    `explicacoes.ExplicadorFloresta` do modelo compilado (contribuições por
+    variável de cada previsão), montado uma vez por processo.
+    """
+    carregar_floresta(caminho)  # Compila (e confere a paridade) se preciso
+    chave = (os.path.abspath(caminho), "explicador")
+    with _trava:
+        # A floresta compilada, mesmo se as previsões tiverem voltado ao modelo original
+        floresta = _registro[(os.path.abspath(caminho), "compilado")]["floresta"]
+        entrada = _registro.get(chave)
+        if entrada is None or entrada["floresta"] is not floresta:
+            registrar_falta_cache("carregar_explicador", arquivo=os.path.basename(caminho))
+            entrada = {"floresta": floresta, "modelo": ExplicadorFloresta(floresta)}
+            _registro[chave] = entrada
+    return entrada["modelo"]
+
+
+# Nomes dos indicadores na planilha/simulação -> nomes usados no treino
+MAPEAMENTO_FEATURES = {
+    "Despesa com pessoal": "despesa_com_pessoal",
+    "Dívida Consolidada": "divida_consolidada",
+    "Operações de crédito": "operacoes_credito"
+}
+
+
+def montar_features(modelo, dados):
+    """
+    Monta a matriz de entrada na ordem de `modelo.feature_names_in_`.
+
+    `dados` é um DataFrame com os indicadores (e, se o modelo usar, as contas
+    brutas como 'populacao'). Levanta ValueError se faltar alguma feature.
+    """
+    inverso = {padronizado: original for original, padronizado in MAPEAMENTO_FEATURES.items()}
+    colunas = {}
+    for feature in modelo.feature_names_in_:
+        if feature in dados.columns:
+            colunas[feature] = dados[feature]
+        elif inverso.get(feature) in dados.columns:
+            colunas[feature] = dados[inverso[feature]]
+    faltantes = [f for f in modelo.feature_names_in_ if f not in colunas]
+    if faltantes:
+        raise ValueError(f"Features esperadas pelo modelo não fornecidas: {', '.join(faltantes)}")
+    return pd.DataFrame(colunas, index=dados.index, columns=list(modelo.feature_names_in_))
+
+
+def prever_lote(modelo, dados):
+    """
+    Classifica todas as linhas de `dados` com uma única chamada a `predict_proba`.
+
+    Retorna um DataFrame (mesmo índice) com 'classe_prevista' e uma coluna
+    'prob_<classe>' por classe do modelo.
+    """
+    probabilidades = modelo.predict_proba(montar_features(modelo, dados))
+    resultado = pd.DataFrame(probabilidades, index=dados.index,
+                             columns=[f"prob_{classe}" for classe in modelo.classes_])
+    resultado.insert(0, "classe_prevista", modelo.classes_[probabilidades.argmax(axis=1)])
+    return resultado
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from indicadores import CAMPOS_CONTABEIS, INDICADORES, calcular_matriz_indicadores
+from previsao import montar_features
+
+
+def montar_grade(dados, amplitude=0.5, passos=21):
+    """
+    Monta a grade de cenários: cada conta contábil variada isoladamente.
+
+    Retorna (entradas, campo_idx, fatores), onde `entradas` é uma matriz
+    (len(CAMPOS_CONTABEIS) * passos, len(CAMPOS_CONTABEIS)) com todas as
+    contas no valor base, exceto a conta `campo_idx[i]`, multiplicada por
+    `fatores[i]`.
+    """
+    base = np.array([float(dados.get(campo, 0)) for campo in CAMPOS_CONTABEIS])
+    n_campos = len(CAMPOS_CONTABEIS)
+    grade_fatores = np.linspace(1 - amplitude, 1 + amplitude, passos)
+
+    campo_idx = np.repeat(np.arange(n_campos), passos)
+    fatores = np.tile(grade_fatores, n_campos)
+    entradas = np.tile(base, (n_campos * passos, 1))
+    linhas = np.arange(n_campos * passos)
+    entradas[linhas, campo_idx] = base[campo_idx] * fatores
+    return entradas, campo_idx, fatores
+
+
+def _ponto_de_virada(valores, probabilidades, valor_base, limiar=0.5):
+    """Valor (interpolado) mais próximo do base em que a probabilidade cruza o limiar."""
+    acima = probabilidades >= limiar
+    cruzamentos = np.flatnonzero(acima[1:] != acima[:-1])
+    if cruzamentos.size == 0:
+        return np.nan
+    p0, p1 = probabilidades[cruzamentos], probabilidades[cruzamentos + 1]
+    v0, v1 = valores[cruzamentos], valores[cruzamentos + 1]
+    pontos = v0 + (limiar - p0) * (v1 - v0) / (p1 - p0)
+    return pontos[np.argmin(np.abs(pontos - valor_base))]
+
+
+def analise_sensibilidade(modelo, dados, amplitude=0.5, passos=21):
+    """
+    Varia cada conta contábil em ±`amplitude` (em `passos` pontos) e classifica
+    toda a grade com uma única chamada a `predict_proba`.
+
+    Retorna (curvas, resumo):
+    - curvas: uma linha por cenário (campo, fator, valor, prob_<classe>);
+    - resumo: por campo, probabilidade mínima/máxima/base da primeira classe
+      do modelo e o valor de virada (onde a classe prevista muda), ordenado
+      pela amplitude do efeito.
+    """
+    entradas, campo_idx, fatores = montar_grade(dados, amplitude, passos)
+    base = np.array([float(dados.get(campo, 0)) for campo in CAMPOS_CONTABEIS])
+    entradas = np.vstack([entradas, base])  # Última linha: cenário base
+
+    matriz = pd.DataFrame(calcular_matriz_indicadores(dict(zip(CAMPOS_CONTABEIS, entradas.T))), columns=INDICADORES)
+    matriz["populacao"] = entradas[:, CAMPOS_CONTABEIS.index("populacao")]
+    probabilidades = modelo.predict_proba(montar_features(modelo, matriz))
+
+    classe = modelo.classes_[0]
+    coluna_prob = f"prob_{classe}"
+    prob_classe = probabilidades[:-1, 0]
+    prob_base = probabilidades[-1, 0]
+
+    curvas = pd.DataFrame({
+        "campo": np.array(CAMPOS_CONTABEIS)[campo_idx],
+        "fator": fatores,
+        "valor": entradas[np.arange(len(campo_idx)), campo_idx],
+        coluna_prob: prob_classe,
+    })
+
+    por_campo = prob_classe.reshape(len(CAMPOS_CONTABEIS), passos)
+    valores = curvas["valor"].to_numpy().reshape(len(CAMPOS_CONTABEIS), passos)
+    resumo = pd.DataFrame({
+        "campo": CAMPOS_CONTABEIS,
+        "valor_base": base,
+        "prob_min": por_campo.min(axis=1),
+        "prob_max": por_campo.max(axis=1),
+        "prob_base": prob_base,
+        "valor_virada": [
+            _ponto_de_virada(valores[i], por_campo[i], base[i]) for i in range(len(CAMPOS_CONTABEIS))
+        ],
+    })
+    resumo["amplitude"] = resumo["prob_max"] - resumo["prob_min"]
+    resumo = resumo.sort_values("amplitude", ascending=False, ignore_index=True)
+    return curvas, resumo
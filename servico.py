@@ -0,0 +1,289 @@
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from indicadores import CAMPOS_CONTABEIS, INDICADORES, contas_e_indicadores
+from instrumentacao import exportar_prometheus, medir
+from previsao import NOME_MODELO, carregar_floresta, prever_lote
+
+# Serviço local de classificação CAPAG+LRF, sem a interface do Streamlit:
+#   python servico.py servir --porta 8600
+#   curl -X POST localhost:8600/prever -H 'Content-Type: application/json' -d '{"populacao": 20000, ...}'
+#   curl -X POST localhost:8600/prever -H 'Content-Type: text/csv' --data-binary @cenarios.csv
+#   curl localhost:8600/metricas
+#   curl localhost:8600/metrics  (formato de texto do Prometheus)
+#   python servico.py pontuar cenarios.csv --saida resultado.csv
+# Requisições simultâneas são agrupadas em micro-lotes: um único cálculo de
+# indicadores e um único `predict_proba` por lote.
+TAMANHO_MAX_LOTE = 4096  # Linhas por lote
+ESPERA_MAX_LOTE = 0.005  # Segundos que o primeiro pedido da fila espera por outros
+ERRO_ENTRADA = "valores ausentes/não numéricos ou população não positiva"
+
+
+def preparar_entradas(dados):
+    """
+    Cenários (dict, lista de dicts ou DataFrame) como DataFrame numérico.
+
+    Contas não informadas valem 0, como no formulário da simulação; textos com
+    vírgula decimal são convertidos e valores inválidos viram NaN. Colunas
+    extras (ex.: `id`, `cenario`) são mantidas.
+    """
+    if isinstance(dados, dict):
+        dados = dados.get("cenarios", [dados])
+    df = dados.copy() if isinstance(dados, pd.DataFrame) else pd.DataFrame(list(dados))
+    for campo in CAMPOS_CONTABEIS:
+        if campo not in df.columns:
+            df[campo] = 0.0
+        elif df[campo].dtype == object:
+            df[campo] = pd.to_numeric(df[campo].astype(str).str.replace(',', '.', regex=False), errors="coerce")
+        else:
+            df[campo] = pd.to_numeric(df[campo], errors="coerce")
+    return df.reset_index(drop=True)
+
+
+def ler_cenarios(arquivo, nome=""):
+    """Lê cenários de um CSV (',' ou ';') ou XLSX (caminho ou buffer)."""
+    nome = nome or (arquivo if isinstance(arquivo, str) else "")
+    if nome.lower().endswith((".xlsx", ".xls")):
+        return preparar_entradas(pd.read_excel(arquivo))
+    return preparar_entradas(pd.read_csv(arquivo, sep=None, engine="python"))
+
+
+def pontuar(modelo, entradas):
+    """
+    Indicadores e classificação de todos os cenários de `entradas` (ver
+    `preparar_entradas`) com um único `predict_proba`.
+
+    Retorna as colunas extras da entrada, os indicadores, `classe_prevista`,
+    `prob_<classe>` e `erro` (preenchido nas linhas que não foram classificadas).
+    """
+    invalidos = entradas[CAMPOS_CONTABEIS].isna().any(axis=1) | (entradas["populacao"] <= 0)
+    dados_modelo = contas_e_indicadores(entradas)
+    if (~invalidos).any():
+        previsoes = prever_lote(modelo, dados_modelo[~invalidos])
+    else:
+        previsoes = pd.DataFrame(columns=["classe_prevista"] + [f"prob_{c}" for c in modelo.classes_])
+    extras = [c for c in entradas.columns if c not in CAMPOS_CONTABEIS]
+    resultado = pd.concat([entradas[extras], dados_modelo[INDICADORES], previsoes], axis=1)
+    resultado["erro"] = np.where(invalidos, ERRO_ENTRADA, None)
+    return resultado
+
+
+class MetricasServico:
+    """Contadores, latências (janela das últimas requisições) e tamanhos de lote."""
+
+    def __init__(self, janela=10_000):
+        self._trava = threading.Lock()
+        self.inicio = time.time()
+        self.requisicoes = self.linhas = self.lotes = self.erros = 0
+        self.latencias = deque(maxlen=janela)
+        self.tamanhos_lote = deque(maxlen=janela)
+        self.duracoes_lote = deque(maxlen=janela)
+
+    def registrar_requisicao(self, linhas, segundos, erro=False):
+        with self._trava:
+            self.requisicoes += 1
+            self.linhas += linhas
+            self.erros += int(erro)
+            self.latencias.append(segundos)
+
+    def registrar_lote(self, linhas, segundos):
+        with self._trava:
+            self.lotes += 1
+            self.tamanhos_lote.append(linhas)
+            self.duracoes_lote.append(segundos)
+
+    def resumo(self):
+        with self._trava:
+            latencias = np.array(self.latencias) * 1e3
+            tamanhos = np.array(self.tamanhos_lote)
+            duracoes = np.array(self.duracoes_lote) * 1e3
+            decorrido = max(time.time() - self.inicio, 1e-9)
+            return {
+                "requisicoes": self.requisicoes,
+                "linhas": self.linhas,
+                "lotes": self.lotes,
+                "erros": self.erros,
+                "segundos_no_ar": round(decorrido, 1),
+                "requisicoes_por_segundo": self.requisicoes / decorrido,
+                "linhas_por_segundo": self.linhas / decorrido,
+                "latencia_ms": {f"p{p}": float(np.percentile(latencias, p)) for p in (50, 95, 99)} if latencias.size else {},
+                "lote_medio_linhas": float(tamanhos.mean()) if tamanhos.size else 0.0,
+                "lote_max_linhas": int(tamanhos.max()) if tamanhos.size else 0,
+                "lote_medio_ms": float(duracoes.mean()) if duracoes.size else 0.0,
+            }
+
+
+class AgrupadorLotes:
+    """
+    Junta os cenários de requisições simultâneas em micro-lotes.
+
+    Cada `submeter` entra numa fila e devolve um Future. Uma thread única
+    espera até `espera_max` segundos (a contar do pedido mais antigo) ou até
+    `tamanho_max` linhas, pontua o lote inteiro de uma vez e distribui as
+    linhas de volta a cada pedido.
+    """
+
+    def __init__(self, modelo, tamanho_max=TAMANHO_MAX_LOTE, espera_max=ESPERA_MAX_LOTE, metricas=None):
+        self.modelo = modelo
+        self.tamanho_max = tamanho_max
+        self.espera_max = espera_max
+        self.metricas = metricas or MetricasServico()
+        self._fila = deque()  # (entradas, future, chegada)
+        self._linhas_na_fila = 0
+        self._condicao = threading.Condition()
+        threading.Thread(target=self._laco, name="agrupador-lotes", daemon=True).start()
+
+    def submeter(self, entradas):
+        futuro = Future()
+        with self._condicao:
+            self._fila.append((entradas, futuro, time.monotonic()))
+            self._linhas_na_fila += len(entradas)
+            self._condicao.notify()
+        return futuro
+
+    def _proximo_lote(self):
+        with self._condicao:
+            while not self._fila:
+                self._condicao.wait()
+            prazo = self._fila[0][2] + self.espera_max
+            while self._linhas_na_fila < self.tamanho_max and (restante := prazo - time.monotonic()) > 0:
+                self._condicao.wait(restante)
+            pedidos, linhas = [], 0
+            while self._fila and (not pedidos or linhas + len(self._fila[0][0]) <= self.tamanho_max):
+                entradas, futuro, _ = self._fila.popleft()
+                pedidos.append((entradas, futuro))
+                linhas += len(entradas)
+            self._linhas_na_fila -= linhas
+            return pedidos
+
+    def _laco(self):
+        while True:
+            pedidos = self._proximo_lote()
+            inicio = time.perf_counter()
+            try:
+                lote = pd.concat([entradas for entradas, _ in pedidos], ignore_index=True)
+                with medir("lote_servico", "previsao"):
+                    resultado = pontuar(self.modelo, lote)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    futuro.set_exception(e)
+                continue
+            self.metricas.registrar_lote(len(lote), time.perf_counter() - inicio)
+            posicao = 0
+            for entradas, futuro in pedidos:
+                # Cada pedido recebe só as próprias colunas extras
+                colunas = [c for c in resultado.columns if c in entradas.columns or c not in lote.columns]
+                futuro.set_result(resultado.iloc[posicao:posicao + len(entradas)][colunas].reset_index(drop=True))
+                posicao += len(entradas)
+
+
+def criar_manipulador(agrupador):
+    """Classe de requisições HTTP ligada ao `agrupador` (uma por servidor)."""
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo, tipo="application/json; charset=utf-8"):
+            corpo = corpo.encode("utf-8") if isinstance(corpo, str) else corpo
+            self.send_response(status)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _json(self, status, dados):
+            self._responder(status, json.dumps(dados, ensure_ascii=False))
+
+        def do_GET(self):
+            if self.path == "/metricas":
+                self._json(200, agrupador.metricas.resumo())
+            elif self.path == "/metrics":
+                self._responder(200, exportar_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+            elif self.path == "/saude":
+                self._json(200, {"status": "ok", "classes": [str(c) for c in agrupador.modelo.classes_]})
+            else:
+                self._json(404, {"erro": f"Caminho não encontrado: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/prever":
+                self._json(404, {"erro": f"Caminho não encontrado: {self.path}"})
+                return
+            inicio = time.perf_counter()
+            tipo = self.headers.get("Content-Type", "application/json")
+            corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            csv = "csv" in tipo
+            try:
+                entradas = ler_cenarios(io.BytesIO(corpo)) if csv else preparar_entradas(json.loads(corpo))
+            except Exception as e:
+                agrupador.metricas.registrar_requisicao(0, time.perf_counter() - inicio, erro=True)
+                self._json(400, {"erro": f"Entrada inválida: {e}"})
+                return
+            try:
+                resultado = agrupador.submeter(entradas).result() if len(entradas) else pontuar(agrupador.modelo, entradas)
+            except Exception as e:
+                agrupador.metricas.registrar_requisicao(len(entradas), time.perf_counter() - inicio, erro=True)
+                self._json(500, {"erro": f"Erro na previsão: {e}"})
+                return
+            if csv:
+                self._responder(200, resultado.to_csv(index=False), "text/csv; charset=utf-8")
+            else:
+                self._responder(200, '{"resultados": ' + resultado.to_json(orient="records", force_ascii=False) + "}")
+            agrupador.metricas.registrar_requisicao(len(entradas), time.perf_counter() - inicio)
+
+        def log_message(self, formato, *args):  # Sem log por requisição; use /metricas
+            pass
+
+    return Manipulador
+
+
+class ServidorPrevisao(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # O padrão (5) recusa conexões em rajadas de clientes simultâneos
+
+
+def servir(host="127.0.0.1", porta=8600, tamanho_max=TAMANHO_MAX_LOTE, espera_max=ESPERA_MAX_LOTE, caminho_modelo=NOME_MODELO):
+    agrupador = AgrupadorLotes(carregar_floresta(caminho_modelo), tamanho_max, espera_max)
+    servidor = ServidorPrevisao((host, porta), criar_manipulador(agrupador))
+    print(f"Servindo previsões em http://{host}:{porta}/prever (métricas em /metricas)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classificação CAPAG+LRF a partir das contas contábeis.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p_servir = comandos.add_parser("servir", help="Sobe o serviço HTTP local")
+    p_servir.add_argument("--host", default="127.0.0.1")
+    p_servir.add_argument("--porta", type=int, default=8600)
+    p_servir.add_argument("--lote", type=int, default=TAMANHO_MAX_LOTE, help="Máximo de linhas por micro-lote")
+    p_servir.add_argument("--espera-ms", type=float, default=ESPERA_MAX_LOTE * 1e3, help="Espera máxima para formar um lote")
+    p_pontuar = comandos.add_parser("pontuar", help="Classifica um arquivo CSV/XLSX de cenários")
+    p_pontuar.add_argument("arquivo")
+    p_pontuar.add_argument("--saida", default=None, help="CSV de saída (padrão: stdout)")
+    for p in (p_servir, p_pontuar):
+        p.add_argument("--modelo", default=NOME_MODELO)
+    args = parser.parse_args(argv)
+
+    if args.comando == "servir":
+        servir(args.host, args.porta, args.lote, args.espera_ms / 1e3, args.modelo)
+        return
+    resultado = pontuar(carregar_floresta(args.modelo), ler_cenarios(args.arquivo))
+    resultado.to_csv(args.saida or sys.stdout, index=False)
+    if args.saida:
+        print(f"{resultado['erro'].isna().sum()} de {len(resultado)} cenários classificados -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import importlib
+import sys
+import threading
+import time
+
+from instrumentacao import medir
+
+# Importação tardia das dependências pesadas (plotly, geopandas, shapely,
+# joblib, PIL): o módulo só é importado no primeiro acesso a um atributo, e
+# o tempo dessa importação vira um trecho da categoria "importacao" (aparece
+# no "⏱ Perf" da página e no arquivo do Prometheus). Uso:
+#   px = importar_tardio("plotly.express")
+#   fig = px.line(...)  # importa plotly.express aqui, uma única vez
+_trava = threading.RLock()
+_fachadas = {}  # nome do módulo -> ModuloTardio
+_tempos = {}  # nome do módulo -> ms gastos na importação feita pela fachada
+
+
+class ModuloTardio:
+    """Substituto de um módulo ainda não importado; repassa os atributos ao módulo real."""
+
+    def __init__(self, nome):
+        self.__dict__["_nome"] = nome
+        self.__dict__["_modulo"] = sys.modules.get(nome)
+
+    def _carregar(self):
+        modulo = self.__dict__["_modulo"]
+        if modulo is None:
+            with _trava:
+                modulo = self.__dict__["_modulo"]
+                if modulo is None:
+                    nome = self.__dict__["_nome"]
+                    inicio = time.perf_counter()
+                    with medir(nome, "importacao"):
+                        modulo = importlib.import_module(nome)
+                    _tempos[nome] = (time.perf_counter() - inicio) * 1e3
+                    self.__dict__["_modulo"] = modulo
+        return modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._carregar(), atributo)
+
+    def __setattr__(self, atributo, valor):
+        setattr(self._carregar(), atributo, valor)
+
+    def __dir__(self):
+        return dir(self._carregar())
+
+    def __repr__(self):
+        estado = "importado" if self.__dict__["_modulo"] is not None else "não importado"
+        return f"<módulo tardio {self.__dict__['_nome']!r} ({estado})>"
+
+
+def importar_tardio(nome):
+    """Fachada de importação tardia de `nome` (uma por módulo, compartilhada entre as páginas)."""
+    with _trava:
+        if nome not in _fachadas:
+            _fachadas[nome] = ModuloTardio(nome)
+        return _fachadas[nome]
+
+
+def tempos_importacao():
+    """{módulo: ms} das importações feitas pela fachada neste processo."""
+    with _trava:
+        return dict(_tempos)
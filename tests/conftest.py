@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos ficam na raiz do repositório e as páginas leem caminhos relativos a ela
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(autouse=True)
+def na_raiz(monkeypatch):
+    monkeypatch.chdir(RAIZ)
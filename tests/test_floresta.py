@@ -0,0 +1,35 @@
+import joblib
+import numpy as np
+import pytest
+
+from floresta import LINHAS_SCIKIT_LEARN, amostra_paridade, compilar_floresta, verificar_paridade
+from previsao import NOME_MODELO
+
+
+@pytest.fixture(scope="module")
+def modelo_e_floresta():
+    modelo = joblib.load(NOME_MODELO)
+    return modelo, compilar_floresta(modelo)
+
+
+def test_amostra_cobre_limiares_e_ausentes(modelo_e_floresta):
+    _, floresta = modelo_e_floresta
+    X = amostra_paridade(floresta)
+    limiares = set(floresta.limiar[~floresta.folha].tolist())
+    assert np.isnan(X).any()
+    assert any(valor in limiares for valor in X[~np.isnan(X)].tolist())
+
+
+def test_predict_proba_compilado_igual_ao_pickle(modelo_e_floresta):
+    modelo, floresta = modelo_e_floresta
+    X = amostra_paridade(floresta)
+    assert len(X) < LINHAS_SCIKIT_LEARN  # Passa pelo percurso compilado, não pelo scikit-learn
+    np.testing.assert_array_equal(floresta.predict_proba(X), modelo.predict_proba(floresta._quadro(X)))
+    np.testing.assert_array_equal(floresta.predict(X), modelo.predict(floresta._quadro(X)))
+
+
+def test_percurso_compilado_igual_ao_pickle_em_lote_grande(modelo_e_floresta):
+    modelo, floresta = modelo_e_floresta
+    X = amostra_paridade(floresta, n=2 * LINHAS_SCIKIT_LEARN, semente=1)
+    assert verificar_paridade(modelo, floresta, X) == 0
+    np.testing.assert_array_equal(floresta.predict_proba(X), modelo.predict_proba(floresta._quadro(X)))
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from conftest import RAIZ
+from indicadores import CAMPOS_CONTABEIS
+
+
+def test_lote_classifica_cenarios_sem_colunas_repetidas():
+    entradas = pd.DataFrame([{c: 1000.0 + i for i, c in enumerate(CAMPOS_CONTABEIS)}] * 3)
+    entradas.insert(0, "cenario", ["base", "otimista", "invalido"])
+    entradas["populacao"] = [20000, 20000, 0]  # População não positiva: não é classificado
+
+    at = AppTest.from_file(os.path.join(RAIZ, "pages", "simulacao.py"), default_timeout=300).run()
+    at.radio(key="modo_simulacao").set_value("Lote de cenários").run()
+    at.file_uploader(key="arquivo_cenarios").set_value(
+        ("cenarios.csv", entradas.to_csv(index=False).encode("utf-8"), "text/csv")).run()
+
+    assert not at.exception
+    resultado = at.dataframe[0].value
+    assert resultado.columns.is_unique
+    assert {"cenario", *CAMPOS_CONTABEIS, "classe_prevista"} <= set(resultado.columns)
+    assert list(resultado["cenario"]) == ["base", "otimista", "invalido"]
+    assert resultado["classe_prevista"].iloc[-1] == "-"
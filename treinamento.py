@@ -0,0 +1,385 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import classification_report, log_loss
+from sklearn.tree import plot_tree
+
+from dados import PASTA_RESULTADOS, PREFIXOS_JANELA
+from explicacoes import explicar_resultados
+from extra import variaveis
+from previsao import NOME_MODELO
+
+# Pipeline de treino: gera a árvore `<saida>/<janela>/<ano>/` com os mesmos
+# nomes de arquivo de `resultados/` e, opcionalmente, o modelo da simulação
+# (`<saida>/random_forest_saude_municipios.pkl`). Uso:
+#   python treinamento.py --saida treino_novo                   # todos os anos e janelas
+#   python treinamento.py --saida treino_novo --base painel.parquet --anos 22 --workers 4
+# A saída tem de ser uma pasta fora de `resultados/`: os artefatos publicados
+# (e o modelo da simulação) não são sobrescritos por modelos refeitos; para
+# publicar, revise a saída e copie-a para `resultados/`.
+# Dados: a base original de treino não está no repositório. Sem --base, o
+# painel é remontado das planilhas `resultado_final` publicadas, que trazem os
+# indicadores e o `y_real` de cada município e ano (o `y_previsto` é
+# descartado); isso reproduz o treino, mas só para os municípios que entraram
+# nos testes publicados.
+# Cada pasta janela/ano guarda em `<prefixo>dependencias<ano>.json` os hashes
+# do que a gerou (dados dos anos usados, hiperparâmetros e código); só são
+# refeitas as pastas cujas dependências mudaram (use --forcar para refazer tudo).
+SEMENTE = 42
+HIPERPARAMETROS = {"n_estimators": 100, "max_features": "sqrt", "random_state": SEMENTE}
+PROFUNDIDADES_PERDA = range(1, 21)  # max_depth avaliados na curva de perda
+COLUNAS_BASE = ["id", "Ano", *variaveis, "y_real", "Municípios", "v21"]
+COLUNAS_RESULTADO = ["id", *variaveis, "y_real", "y_previsto", "Municípios", "v21"]
+# Módulos cujo código entra nos artefatos: o treino, as explicações (e a
+# floresta compilada que elas usam) e a lista de variáveis
+MODULOS_CODIGO = ["treinamento.py", "explicacoes.py", "floresta.py", "extra.py"]
+# Planilhas geradas por tarefa (as imagens dependem do matplotlib e não contam)
+ARTEFATOS = ["resultado_final", "classification_report", "feature_importances", "loss_curve", "explicacoes"]
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_DISPONIVEL = True
+except ImportError:  # As imagens (.png) são opcionais
+    MATPLOTLIB_DISPONIVEL = False
+
+
+def anos_de_treino(janela, ano, anos_disponiveis):
+    """
+    Anos usados para treinar o modelo que prevê `ano`.
+
+    Janela fixa: só o ano anterior. Janela estendida: todos os anos anteriores
+    disponíveis na base.
+    """
+    if janela == "janela_fixa":
+        return [ano - 1] if ano - 1 in anos_disponiveis else []
+    return sorted(a for a in anos_disponiveis if a < ano)
+
+
+def caminho_artefato(pasta, janela, ano, nome_base, extensao):
+    """Caminho de um artefato, com o prefixo da janela (ex.: ext_loss_curve22.xlsx)."""
+    return os.path.join(pasta, janela, str(ano), f"{PREFIXOS_JANELA[janela]}{nome_base}{ano}.{extensao}")
+
+
+def montar_base(pasta=PASTA_RESULTADOS):
+    """
+    Painel (id, Ano, indicadores, y_real, Municípios, v21) reconstruído a partir
+    das planilhas `resultado_final` já publicadas, com uma linha por município
+    e ano (as duas janelas trazem os mesmos indicadores).
+
+    É um substituto da base original, que não acompanha o repositório: as
+    planilhas são saídas do treino anterior, das quais só se aproveitam as
+    entradas (indicadores e `y_real`); o `y_previsto` publicado é ignorado.
+    """
+    partes = []
+    for janela in PREFIXOS_JANELA:
+        pasta_janela = os.path.join(pasta, janela)
+        if not os.path.isdir(pasta_janela):
+            continue
+        for nome in sorted(os.listdir(pasta_janela)):
+            caminho = caminho_artefato(pasta, janela, nome, "resultado_final", "xlsx")
+            if nome.isdigit() and os.path.exists(caminho):
+                partes.append(pd.read_excel(caminho).assign(Ano=int(nome)))
+    if not partes:
+        raise FileNotFoundError(f"Nenhuma planilha resultado_final encontrada em '{pasta}'.")
+    base = pd.concat(partes, ignore_index=True).drop_duplicates(subset=["id", "Ano"], keep="first")
+    return base[COLUNAS_BASE].sort_values(["Ano", "id"], ignore_index=True)
+
+
+def dentro_de_publicados(pasta):
+    """True se `pasta` for `resultados/` (os artefatos publicados) ou estiver dentro dela."""
+    publicados = os.path.abspath(PASTA_RESULTADOS)
+    return os.path.commonpath([publicados, os.path.abspath(pasta)]) == publicados
+
+
+def ler_base(caminho):
+    """Lê um painel novo (.parquet, .csv ou .xlsx) com as colunas de `COLUNAS_BASE`."""
+    if caminho.endswith(".parquet"):
+        base = pd.read_parquet(caminho)
+    elif caminho.endswith(".csv"):
+        base = pd.read_csv(caminho)
+    else:
+        base = pd.read_excel(caminho)
+    faltando = [c for c in COLUNAS_BASE if c not in base.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes na base '{caminho}': {faltando}")
+    base = base[COLUNAS_BASE].copy()
+    base["Ano"] = base["Ano"].astype(int) % 100  # Aceita 2022 ou 22, como nas pastas
+    return base
+
+
+def _novo_modelo(n_jobs, **parametros):
+    return RandomForestClassifier(**HIPERPARAMETROS, n_jobs=n_jobs, **parametros)
+
+
+def curva_de_perda(X_treino, y_treino, X_teste, y_teste, n_jobs=1):
+    """Log-loss de treino e teste para cada `max_depth` em `PROFUNDIDADES_PERDA`."""
+    linhas = []
+    for profundidade in PROFUNDIDADES_PERDA:
+        modelo = _novo_modelo(n_jobs, max_depth=profundidade).fit(X_treino, y_treino)
+        linhas.append({
+            "max_depth": profundidade,
+            "train_loss": log_loss(y_treino, modelo.predict_proba(X_treino), labels=modelo.classes_),
+            "test_loss": log_loss(y_teste, modelo.predict_proba(X_teste), labels=modelo.classes_),
+        })
+    return pd.DataFrame(linhas)
+
+
+def _salvar_excel(df, caminho, index=False):
+    temporario = f"{caminho}.{os.getpid()}.tmp.xlsx"
+    df.to_excel(temporario, index=index, engine="openpyxl")
+    os.replace(temporario, caminho)
+
+
+def _salvar_imagens(pasta, janela, ano, modelo, importancias, perda):
+    fig, ax = plt.subplots(figsize=(20, 10))
+    plot_tree(modelo.estimators_[0], max_depth=3, feature_names=variaveis,
+              class_names=[str(c) for c in modelo.classes_], filled=True, ax=ax)
+    fig.savefig(caminho_artefato(pasta, janela, ano, "arvore", "png"), bbox_inches="tight")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    ordenadas = importancias.sort_values("importance")
+    ax.barh(ordenadas["feature"], ordenadas["importance"])
+    ax.set_title(f"Importância das variáveis - 20{ano}")
+    fig.savefig(caminho_artefato(pasta, janela, ano, "feature_importances", "png"), bbox_inches="tight")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.plot(perda["max_depth"], perda["train_loss"], marker="o", label="Treino")
+    ax.plot(perda["max_depth"], perda["test_loss"], marker="o", label="Teste")
+    ax.set_xlabel("max_depth")
+    ax.set_ylabel("Log-loss")
+    ax.legend()
+    fig.savefig(caminho_artefato(pasta, janela, ano, "loss", "png"), bbox_inches="tight")
+    plt.close(fig)
+
+
+def ajustar_modelo(janela, ano, base, n_jobs=1):
+    """
+    Treina o modelo que prevê `ano` na janela. Retorna (modelo, treino, teste)
+    ou None se não houver dados de treino ou de teste. O treino só usa linhas
+    com `y_real`; o teste traz todas as linhas do ano (as sem `y_real` também
+    são previstas, só não entram nas métricas).
+    """
+    anos_disponiveis = set(base["Ano"].unique())
+    treino = base[base["Ano"].isin(anos_de_treino(janela, ano, anos_disponiveis))].dropna(subset=["y_real"])
+    teste = base[base["Ano"] == ano]
+    if treino.empty or teste.empty:
+        return None
+    modelo = _novo_modelo(n_jobs).fit(treino[variaveis], treino["y_real"].astype(str))
+    return modelo, treino, teste
+
+
+def salvar_explicacoes(tabela, pasta, janela, ano):
+    """Grava a tabela de `explicacoes.explicar_resultados` ao lado do `resultado_final`."""
+    _salvar_excel(tabela, caminho_artefato(pasta, janela, ano, "explicacoes", "xlsx"))
+
+
+def treinar_ano(janela, ano, base, pasta=PASTA_RESULTADOS, n_jobs=1):
+    """
+    Treina o modelo de uma janela e ano e grava todos os artefatos da pasta
+    `<pasta>/<janela>/<ano>/`. Retorna um resumo (janela, ano, linhas, acurácia)
+    ou None se não houver dados de treino ou de teste.
+    """
+    inicio = time.perf_counter()
+    ajuste = ajustar_modelo(janela, ano, base, n_jobs)
+    if ajuste is None:
+        return None
+    modelo, treino, teste = ajuste
+    # O resultado_final guarda todas as linhas do ano: descartar as sem y_real mudaria o hash
+    # da base remontada dessas planilhas e forçaria um novo treino na execução seguinte
+    resultado = teste.assign(y_previsto=modelo.predict(teste[variaveis]))[COLUNAS_RESULTADO]
+    rotulado = resultado.dropna(subset=["y_real"])
+    X_treino, y_treino = treino[variaveis], treino["y_real"].astype(str)
+    X_teste, y_teste = rotulado[variaveis], rotulado["y_real"].astype(str)
+    previsto = rotulado["y_previsto"].to_numpy()
+    if y_teste.empty:
+        return None
+
+    os.makedirs(os.path.join(pasta, janela, str(ano)), exist_ok=True)
+    _salvar_excel(resultado, caminho_artefato(pasta, janela, ano, "resultado_final", "xlsx"))
+    salvar_explicacoes(explicar_resultados(modelo, resultado), pasta, janela, ano)
+    relatorio = pd.DataFrame(classification_report(y_teste, previsto, output_dict=True, zero_division=0)).T
+    _salvar_excel(relatorio, caminho_artefato(pasta, janela, ano, "classification_report", "xlsx"), index=True)
+    importancias = pd.DataFrame({"feature": variaveis, "importance": modelo.feature_importances_})
+    _salvar_excel(importancias, caminho_artefato(pasta, janela, ano, "feature_importances", "xlsx"))
+    perda = curva_de_perda(X_treino, y_treino, X_teste, y_teste, n_jobs)
+    _salvar_excel(perda, caminho_artefato(pasta, janela, ano, "loss_curve", "xlsx"))
+    if MATPLOTLIB_DISPONIVEL:
+        _salvar_imagens(pasta, janela, ano, modelo, importancias, perda)
+
+    return {"janela": janela, "ano": ano, "treino": len(treino), "teste": len(rotulado),
+            "acuracia": float(np.mean(previsto == y_teste.to_numpy())), "segundos": time.perf_counter() - inicio}
+
+
+def hashes_por_ano(base):
+    """Hash (SHA-256) das linhas de cada ano da base, independente da ordem das linhas."""
+    return {
+        int(ano): hashlib.sha256(
+            df_ano[COLUNAS_BASE].sort_values("id").to_csv(index=False).encode("utf-8")
+        ).hexdigest()
+        for ano, df_ano in base.groupby("Ano", sort=True)
+    }
+
+
+def versao_codigo():
+    """
+    Hash de cada módulo de `MODULOS_CODIGO`, a lista de variáveis e a versão
+    do scikit-learn: tudo no código que muda os artefatos. As quebras de linha
+    são normalizadas, para o hash não depender do checkout (CRLF ou LF).
+    """
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    modulos = {}
+    for nome in MODULOS_CODIGO:
+        with open(os.path.join(pasta, nome), "rb") as f:
+            modulos[nome] = hashlib.sha256(f.read().replace(b"\r\n", b"\n")).hexdigest()
+    return {"modulos": modulos, "variaveis": list(variaveis), "scikit-learn": sklearn.__version__}
+
+
+def dependencias(janela, ano, hashes):
+    """
+    Tudo de que os artefatos de (janela, ano) dependem, em forma comparável.
+
+    Com a janela estendida, um ano novo na base só entra nas dependências dos
+    anos posteriores a ele; os anos anteriores continuam em dia.
+    """
+    anos_dados = anos_de_treino(janela, ano, set(hashes)) + [ano]
+    return {
+        "janela": janela,
+        "ano": ano,
+        "dados": {str(a): hashes[a] for a in anos_dados},
+        "hiperparametros": {**HIPERPARAMETROS, "profundidades_perda": list(PROFUNDIDADES_PERDA)},
+        "codigo": versao_codigo(),
+    }
+
+
+def _caminho_dependencias(pasta, janela, ano):
+    return caminho_artefato(pasta, janela, ano, "dependencias", "json")
+
+
+def desatualizada(janela, ano, deps, pasta=PASTA_RESULTADOS):
+    """True se faltar algum artefato ou se as dependências gravadas forem outras."""
+    if not all(os.path.exists(caminho_artefato(pasta, janela, ano, nome, "xlsx")) for nome in ARTEFATOS):
+        return True
+    try:
+        with open(_caminho_dependencias(pasta, janela, ano), encoding="utf-8") as f:
+            return json.load(f) != deps
+    except (OSError, ValueError):
+        return True
+
+
+def planejar(base, anos=None, janelas=tuple(PREFIXOS_JANELA), pasta=PASTA_RESULTADOS, forcar=False):
+    """
+    Monta o plano de treino: (tarefas, em_dia).
+
+    `tarefas` lista (janela, ano, dependencias) das pastas a refazer e `em_dia`
+    as (janela, ano) que podem ser mantidas. Anos sem dados de treino (o
+    primeiro da base) são ignorados. Sem `anos`, usa todos os anos da base.
+    """
+    hashes = hashes_por_ano(base)
+    anos = sorted(hashes) if anos is None else anos
+    tarefas, em_dia = [], []
+    for janela in janelas:
+        for ano in anos:
+            if ano not in hashes or not anos_de_treino(janela, ano, set(hashes)):
+                continue
+            deps = dependencias(janela, ano, hashes)
+            if forcar or desatualizada(janela, ano, deps, pasta):
+                tarefas.append((janela, ano, deps))
+            else:
+                em_dia.append((janela, ano))
+    return tarefas, em_dia
+
+
+def _treinar_tarefa(argumentos):
+    janela, ano, base, pasta, n_jobs, deps = argumentos
+    resumo = treinar_ano(janela, ano, base, pasta, n_jobs)
+    if resumo is not None:  # Grava as dependências só depois de todos os artefatos
+        caminho = _caminho_dependencias(pasta, janela, ano)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(deps, f, indent=1, ensure_ascii=False)
+        os.replace(temporario, caminho)
+    return resumo
+
+
+def treinar_grade(base, tarefas, pasta=PASTA_RESULTADOS, workers=None):
+    """
+    Executa as `tarefas` de `planejar`, distribuídas num pool de processos.
+
+    Cada floresta usa `n_jobs = núcleos // workers`, para ocupar a máquina sem
+    sobrescrever núcleos. Com `SEMENTE` fixa o resultado não depende de
+    `workers`. Retorna a lista de resumos (ver `treinar_ano`).
+    """
+    if not tarefas:
+        return []
+    nucleos = os.cpu_count() or 1
+    workers = max(1, min(workers or nucleos, len(tarefas)))
+    n_jobs = max(1, nucleos // workers)
+    argumentos = [(janela, ano, base, pasta, n_jobs, deps) for janela, ano, deps in tarefas]
+    if workers == 1:
+        resumos = [_treinar_tarefa(a) for a in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            resumos = list(executor.map(_treinar_tarefa, argumentos))
+    return [r for r in resumos if r is not None]
+
+
+def treinar_modelo_final(base, caminho=NOME_MODELO, n_jobs=-1):
+    """Treina o modelo da simulação com todos os anos da base e o grava em `caminho`."""
+    dados = base.dropna(subset=["y_real"])
+    modelo = _novo_modelo(n_jobs).fit(dados[variaveis], dados["y_real"].astype(str))
+    modelo.n_jobs = None  # A simulação prevê poucas linhas por vez
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    joblib.dump(modelo, temporario)
+    os.replace(temporario, caminho)
+    return modelo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera os artefatos janela × ano (mesmo formato de resultados/) numa pasta nova.")
+    parser.add_argument("--anos", type=int, nargs="+", default=None,
+                        help="Anos com dois dígitos (ex.: 21 22); padrão: todos os anos da base")
+    parser.add_argument("--janelas", nargs="+", choices=list(PREFIXOS_JANELA), default=list(PREFIXOS_JANELA))
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: núcleos)")
+    parser.add_argument("--saida", required=True, help="Pasta de saída, fora de resultados/")
+    parser.add_argument("--base", default=None,
+                        help="Painel de dados; padrão: entradas remontadas dos resultado_final publicados")
+    parser.add_argument("--forcar", action="store_true", help="Refaz também as pastas em dia")
+    parser.add_argument("--modelo", action="store_true", help=f"Também treina <saida>/{NOME_MODELO}")
+    args = parser.parse_args(argv)
+    if dentro_de_publicados(args.saida):
+        parser.error(f"--saida '{args.saida}' está em {PASTA_RESULTADOS}/: os artefatos publicados não são "
+                     "sobrescritos; use uma pasta nova e copie o que for aprovado.")
+
+    base = ler_base(args.base) if args.base else montar_base()
+    if not MATPLOTLIB_DISPONIVEL:
+        print("matplotlib não instalado: as imagens (.png) não serão geradas.", file=sys.stderr)
+    inicio = time.perf_counter()
+    tarefas, em_dia = planejar(base, args.anos, args.janelas, args.saida, args.forcar)
+    print(f"{len(em_dia)} pastas em dia, {len(tarefas)} a treinar")
+    for r in treinar_grade(base, tarefas, args.saida, args.workers):
+        print(f"{r['janela']:>16} 20{r['ano']}: treino={r['treino']:>5} teste={r['teste']:>4} "
+              f"acurácia={r['acuracia']:.4f} ({r['segundos']:.1f}s)")
+    if args.modelo:
+        os.makedirs(args.saida, exist_ok=True)
+        caminho_modelo = os.path.join(args.saida, os.path.basename(NOME_MODELO))
+        treinar_modelo_final(base, caminho_modelo)
+        print(f"Modelo gravado em {caminho_modelo}")
+    print(f"Concluído em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()